@@ -0,0 +1,124 @@
+"""
+Debt aging: how long each unpaid dollar has been outstanding.
+
+A player's debts are their losing games, plus payouts they received
+(negative payments).  Everything in their favour, payments made and games
+won, pays those debts off oldest first, the way a payment is applied to the
+oldest open invoice.  Whatever is left of each debt is bucketed by its age.
+
+With every player's debts sorted by date, the running total of a player's
+debts minus everything in their favour says how much of each debt is still
+unpaid.  So all players are matched at once with one sort and one
+cumulative sum, with no per-player loop.  The unpaid amounts add up to what
+the ledger shows as owed (a negative remaining payment).
+"""
+import numpy as np
+
+# (label, first day, last day) of each age bucket
+BUCKETS = (('0-7', 0, 7), ('8-30', 8, 30), ('31-90', 31, 90), ('90+', 91, None))
+_UPPER_EDGES = np.array([last for _, _, last in BUCKETS if last is not None])
+
+# Unpaid amounts below this are rounding noise
+EPSILON = 0.005
+
+
+class AgingReport:
+    """Unpaid debt per player and age bucket, as of one day."""
+
+    def __init__(self, player_ids, unpaid, oldest, average_age, as_of):
+        self.player_ids = player_ids      # sorted, players who owe something
+        self.unpaid = unpaid              # (players, buckets) dollars
+        self.oldest = oldest              # ordinal of the oldest unpaid debt
+        self.average_age = average_age    # dollar-weighted age in days
+        self.as_of = as_of
+        self._index = {pid: i for i, pid in enumerate(player_ids.tolist())}
+
+    def totals(self):
+        """Dollars outstanding in each bucket across all players."""
+        return dict(zip([label for label, _, _ in BUCKETS], self.unpaid.sum(axis=0).tolist()))
+
+    def _row(self, i):
+        return {
+            'player_id': int(self.player_ids[i]),
+            'buckets': dict(zip([label for label, _, _ in BUCKETS], self.unpaid[i].tolist())),
+            'outstanding': float(self.unpaid[i].sum()),
+            'oldest_ordinal': int(self.oldest[i]),
+            'oldest_days': int(self.as_of - self.oldest[i]),
+            'average_age': float(self.average_age[i]),
+        }
+
+    def for_player(self, player_id):
+        """One player's row, or None if they owe nothing."""
+        i = self._index.get(player_id)
+        return self._row(i) if i is not None else None
+
+    def rows(self):
+        """Every player who owes something, oldest unpaid debt first."""
+        order = np.lexsort((-self.unpaid.sum(axis=1), self.oldest))
+        return [self._row(i) for i in order.tolist()]
+
+    def __len__(self):
+        return len(self.player_ids)
+
+
+def age_debts(games, payments, as_of):
+    """
+    Match credits to debts FIFO and bucket what's left by age.
+
+    ``games`` and ``payments`` are (player_ids, date_ordinals, amounts)
+    arrays: game nets and payment amounts as the ledger stores them.  Rows
+    after ``as_of`` (a date ordinal) are ignored, so past dates work too.
+    """
+    g_pid, g_day, g_net = (np.asarray(a) for a in games)
+    p_pid, p_day, p_amount = (np.asarray(a) for a in payments)
+    g_pid, g_day, g_net = g_pid.astype(np.int64), g_day.astype(np.int64), g_net.astype(np.float64)
+    p_pid, p_day, p_amount = p_pid.astype(np.int64), p_day.astype(np.int64), p_amount.astype(np.float64)
+    g_keep, p_keep = g_day <= as_of, p_day <= as_of
+    g_pid, g_day, g_net = g_pid[g_keep], g_day[g_keep], g_net[g_keep]
+    p_pid, p_day, p_amount = p_pid[p_keep], p_day[p_keep], p_amount[p_keep]
+
+    # Debts: games lost and payouts received.  Credits: the rest.
+    g_debt, p_debt = g_net < 0, p_amount < 0
+    debt_pid = np.concatenate([g_pid[g_debt], p_pid[p_debt]])
+    debt_day = np.concatenate([g_day[g_debt], p_day[p_debt]])
+    debt = np.concatenate([-g_net[g_debt], -p_amount[p_debt]])
+    credit_pid = np.concatenate([g_pid[~g_debt], p_pid[~p_debt]])
+    credit_amount = np.concatenate([g_net[~g_debt], p_amount[~p_debt]])
+
+    players = np.unique(debt_pid)
+    empty = AgingReport(players[:0], np.zeros((0, len(BUCKETS))), players[:0], np.zeros(0), as_of)
+    if not len(players):
+        return empty
+    in_debtors = np.isin(credit_pid, players)
+    credit = np.bincount(np.searchsorted(players, credit_pid[in_debtors]),
+                         weights=credit_amount[in_debtors], minlength=len(players))
+
+    # Each player's debts oldest first; cumulative sum restarting per player
+    slot = np.searchsorted(players, debt_pid)
+    order = np.lexsort((debt_day, slot))
+    slot, debt_day, debt = slot[order], debt_day[order], debt[order]
+    running = np.cumsum(debt)
+    starts = np.searchsorted(slot, np.arange(len(players)))
+    before = np.where(starts > 0, running[np.maximum(starts - 1, 0)], 0.0)
+    owed_through = running - before[slot]
+
+    # Credit pays off the oldest debts; the rest of each debt is unpaid
+    unpaid = np.clip(owed_through - credit[slot], 0.0, debt)
+    unpaid[unpaid < EPSILON] = 0.0
+    age = np.maximum(as_of - debt_day, 0)
+    bucket = np.searchsorted(_UPPER_EDGES, age, side='left')
+    table = np.bincount(slot * len(BUCKETS) + bucket, weights=unpaid,
+                        minlength=len(players) * len(BUCKETS)).reshape(len(players), len(BUCKETS))
+
+    owing = table.sum(axis=1) >= EPSILON
+    if not owing.any():
+        return empty
+    open_debts = np.flatnonzero(unpaid > 0)
+    # Debts are sorted by date within each player, so the first open one is the oldest
+    owing_slots, first = np.unique(slot[open_debts], return_index=True)
+    oldest = np.zeros(len(players), dtype=np.int64)
+    oldest[owing_slots] = debt_day[open_debts[first]]
+    weighted_age = np.bincount(slot, weights=unpaid * age, minlength=len(players))
+    average_age = weighted_age / np.maximum(table.sum(axis=1), EPSILON)
+
+    return AgingReport(players[owing], table[owing], oldest[owing], average_age[owing], as_of)
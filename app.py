@@ -1,11 +1,30 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-import pandas as pd
+from datetime import datetime, date
+import math
 import os
+import random
+import time
+import uuid
 from werkzeug.utils import secure_filename
 from functools import wraps
+from sqlalchemy.exc import IntegrityError, OperationalError
 from config import config
+from fuzzy_match import NameIndex
+from settlement import plan_settlement
+from cache import VersionedCache
+from profiling import init_profiling
+from sqlite_tuning import init_sqlite_tuning
+from db_pool import engine_options, init_pool_health
+from jobs import init_jobs
+from live_updates import init_live_updates
+from journal import init_journal
+import archive
+# pandas and the NumPy-backed helpers (player_stats, leaderboard,
+# balance_history) are imported where they are used, so workers boot
+# without loading them
 
 # Get configuration based on environment
 config_name = os.environ.get('FLASK_ENV', 'development')
@@ -18,8 +37,28 @@ ADMIN_PASSWORD = app.config['ADMIN_PASSWORD']
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Workers load compiled templates instead of each compiling them again
+if app.config.get('JINJA_BYTECODE_CACHE_DIR'):
+    os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+# Pool sizing, pre-ping, recycle and statement timeout
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
 db = SQLAlchemy(app)
 
+# Per-request timing, SQL query counts and /metrics
+init_profiling(app)
+
+# WAL, pragmas and a single writer lane when running on SQLite
+init_sqlite_tuning(app, db)
+
+# Pool checkout latency and saturation at /health
+init_pool_health(app, db)
+
+# Change notifications for open ledger and game pages at /live
+live_updates = init_live_updates(app, db)
+
 # Admin decorator
 def admin_required(f):
     @wraps(f)
@@ -37,20 +76,45 @@ class Player(db.Model):
     preferred_payment_method = db.Column(db.String(50), nullable=True)  # Cash, Venmo, Zelle, etc.
     payment_id = db.Column(db.String(100), nullable=True)  # Venmo ID, phone number, email, etc.
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Data version of the last commit that changed this player's ledger row
+    row_version = db.Column(db.Integer, nullable=False, default=0)
     
     # Relationships
     ledger_entries = db.relationship('LedgerEntry', backref='player', lazy=True)
     payments = db.relationship('Payment', backref='player', lazy=True)
 
+class Game(db.Model):
+    # One uploaded game session; a date can hold several, numbered by sequence
+    id = db.Column(db.Integer, primary_key=True)
+    game_date = db.Column(db.Date, nullable=False)
+    sequence = db.Column(db.Integer, nullable=False, default=1)
+    session_start_at = db.Column(db.DateTime, nullable=True)  # earliest sit-down in the CSV
+    session_end_at = db.Column(db.DateTime, nullable=True)  # latest cash-out in the CSV
+    player_count = db.Column(db.Integer, nullable=False, default=0)
+    total_buy_in = db.Column(db.Float, nullable=True)  # NULL for games uploaded without buy-ins
+    total_buy_out = db.Column(db.Float, nullable=True)
+    total_net = db.Column(db.Float, nullable=False, default=0.0)
+    upload_token = db.Column(db.String(32), nullable=True, unique=True, index=True)  # the review it was confirmed from
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    entries = db.relationship('LedgerEntry', backref='game', lazy=True)
+    
+    # Also the index for calendar and game-date lookups
+    __table_args__ = (db.UniqueConstraint('game_date', 'sequence', name='_game_date_sequence_uc'),)
+
 class LedgerEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
-    game_date = db.Column(db.Date, nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=True, index=True)
+    game_date = db.Column(db.Date, nullable=False)  # the game's date, kept here for the balance queries
     net_profit = db.Column(db.Float, default=0.0)
     running_balance = db.Column(db.Float, default=0.0)
+    buy_in = db.Column(db.Float, nullable=True)  # dollars, from the upload CSV
+    buy_out = db.Column(db.Float, nullable=True)
+    stack = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('player_id', 'game_date', name='_player_game_uc'),)
+    __table_args__ = (db.UniqueConstraint('player_id', 'game_id', name='_player_game_uc'),)
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -59,6 +123,36 @@ class Payment(db.Model):
     payment_date = db.Column(db.Date, nullable=False)
     payment_method = db.Column(db.String(50), nullable=True)  # Track how payment was made
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    transfer_id = db.Column(db.Integer, db.ForeignKey('transfer.id'), nullable=True, index=True)
+
+class Transfer(db.Model):
+    # One player paying another.  Links the payer's +amount and the
+    # recipient's -amount Payment legs; indexed both ways for netting queries.
+    id = db.Column(db.Integer, primary_key=True)
+    payer_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)  # NULL once cleared
+    recipient_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)  # NULL once cleared
+    amount = db.Column(db.Float, nullable=False)
+    transfer_date = db.Column(db.Date, nullable=False)
+    payment_method = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    legs = db.relationship('Payment', backref='transfer', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_transfer_payer_recipient', 'payer_id', 'recipient_id', 'amount'),
+        db.Index('ix_transfer_recipient_payer', 'recipient_id', 'payer_id', 'amount'),
+    )
+
+class PlayerAlias(db.Model):
+    # CSV nicknames that an admin has matched to an existing player
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False, index=True)
+    alias = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    player = db.relationship('Player', backref=db.backref('aliases', lazy=True))
+    
+    __table_args__ = (db.UniqueConstraint('player_id', 'alias', name='_player_alias_uc'),)
 
 class LedgerHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -67,6 +161,798 @@ class LedgerHistory(db.Model):
     cleared_date = db.Column(db.Date, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class ArchivedLedger(db.Model):
+    # A cleared player's games and payments, compressed (see archive.py)
+    id = db.Column(db.Integer, primary_key=True)
+    history_id = db.Column(db.Integer, db.ForeignKey('ledger_history.id'), nullable=False, unique=True)
+    player_id = db.Column(db.Integer, nullable=False)  # the id the player had
+    game_count = db.Column(db.Integer, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    first_game = db.Column(db.Date, nullable=True)
+    last_game = db.Column(db.Date, nullable=True)
+    ledger_entries = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    payments = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    history = db.relationship('LedgerHistory', backref=db.backref('archive', uselist=False))
+
+class MonthlyRollup(db.Model):
+    # Per-player totals for one calendar month, kept in sync with LedgerEntry
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    month = db.Column(db.Integer, nullable=False)  # year * 12 + month - 1
+    net_profit = db.Column(db.Float, nullable=False, default=0.0)
+    games = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('player_id', 'month', name='_player_month_uc'),)
+
+class DataVersion(db.Model):
+    # Single-row counter bumped by every commit that changes ledger data
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaState(db.Model):
+    # Which schema version and deploy the one-time startup bootstrap last ran for
+    id = db.Column(db.Integer, primary_key=True)
+    schema_version = db.Column(db.String(64), nullable=False)
+    deploy_id = db.Column(db.String(100), nullable=True)
+    bootstrapped_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    # A background upload parse, export or import (see jobs.py)
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    message = db.Column(db.String(200), nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    owner = db.Column(db.String(100), nullable=True)  # host:pid of the worker running it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class JournalEvent(db.Model):
+    # Append-only record of every balance change (see journal.py); never
+    # updated, and kept when a player is cleared, so no foreign keys
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # game, payment, transfer, edit, undo, clear, merge, rebase
+    player_id = db.Column(db.Integer, nullable=True, index=True)
+    counterparty_id = db.Column(db.Integer, nullable=True)  # transfer recipient, merged-away player
+    event_date = db.Column(db.Date, nullable=True)  # game or payment date
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    data = db.Column(db.Text, nullable=True)  # JSON: names, old and new values
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class JournalSnapshot(db.Model):
+    # Every player's balances as of one journal event
+    id = db.Column(db.Integer, primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, index=True)
+    balances = db.Column(db.Text, nullable=False)  # JSON {player_id: [name, balance, payments, latest_game]}
+    source = db.Column(db.String(20), nullable=False)  # journal (replayed) or tables (rebase)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+db.event.listen(
+    DataVersion.__table__, 'after_create',
+    db.DDL("INSERT INTO data_version (id, version) VALUES (1, 0)")
+)
+
+# Background jobs and their progress at /jobs/<id>
+jobs = init_jobs(app, db, Job)
+
+# Event journal and balance snapshots
+journal = init_journal(app, db, JournalEvent, JournalSnapshot)
+
+# Models whose changes invalidate cached stats and reports
+VERSIONED_MODELS = (Player, LedgerEntry, Payment, MonthlyRollup, Game)
+# Models whose changes show up in a player's ledger row
+PLAYER_ROW_MODELS = (Player, LedgerEntry, Payment)
+
+@db.event.listens_for(db.session, 'before_flush')
+def _track_data_changes(session, flush_context, instances):
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, VERSIONED_MODELS) for obj in changed):
+        session.info['data_changed'] = True
+
+@db.event.listens_for(db.session, 'after_flush')
+def _track_changed_players(session, flush_context):
+    # After the flush so new players have their ids
+    changed = session.info.setdefault('changed_players', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Player):
+            changed.add(obj.id)
+        elif isinstance(obj, (LedgerEntry, Payment)) and obj.player_id is not None:
+            changed.add(obj.player_id)
+
+@db.event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_changes(orm_execute_state):
+    # Query.delete() / Query.update() and bulk insert() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mappers = orm_execute_state.all_mappers
+        if any(m.class_ in VERSIONED_MODELS for m in mappers):
+            orm_execute_state.session.info['data_changed'] = True
+        if any(m.class_ in PLAYER_ROW_MODELS for m in mappers):
+            # Callers name the players they touch with
+            # .execution_options(player_ids=[...]); otherwise it could be anyone
+            player_ids = orm_execute_state.execution_options.get('player_ids')
+            if player_ids is None:
+                orm_execute_state.session.info['all_players_changed'] = True
+            else:
+                orm_execute_state.session.info.setdefault('changed_players', set()).update(player_ids)
+
+@db.event.listens_for(db.session, 'before_commit')
+def _bump_data_version(session):
+    session.flush()
+    if session.info.pop('data_changed', False):
+        session.execute(
+            db.update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1)
+        )
+        _stamp_changed_players(session)
+    session.info.pop('changed_players', None)
+    session.info.pop('all_players_changed', None)
+
+def _stamp_changed_players(session):
+    # Give changed players the new data version so their cached ledger rows
+    # go stale; the Core table update skips the ORM change tracking
+    changed = session.info.get('changed_players', set())
+    everyone = session.info.get('all_players_changed', False)
+    if not changed and not everyone:
+        return
+    version = session.execute(db.select(DataVersion.version).where(DataVersion.id == 1)).scalar()
+    stamp = db.update(Player.__table__).values(row_version=version)
+    if not everyone:
+        stamp = stamp.where(Player.__table__.c.id.in_(sorted(changed)))
+    session.execute(stamp)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _reset_data_changes(session):
+    session.info.pop('data_changed', None)
+    session.info.pop('changed_players', None)
+    session.info.pop('all_players_changed', None)
+
+def get_data_version():
+    return db.session.query(DataVersion.version).filter_by(id=1).scalar() or 0
+
+data_cache = VersionedCache()
+# Rendered ledger rows, keyed by player id and admin view, at the player's row_version
+ledger_row_cache = VersionedCache()
+
+def get_all_player_stats():
+    def compute():
+        rows = db.session.query(
+            LedgerEntry.player_id, LedgerEntry.game_date, LedgerEntry.net_profit
+        ).all()
+        player_ids = [row[0] for row in rows]
+        game_dates = [row[1].toordinal() for row in rows]
+        net_profits = [row[2] or 0.0 for row in rows]
+        from player_stats import compute_player_stats
+        return compute_player_stats(player_ids, game_dates, net_profits)
+    return data_cache.get('player_stats', get_data_version(), compute)
+
+def month_bounds(month):
+    # First day of the month and first day of the next month
+    year, month0 = divmod(month, 12)
+    next_year, next_month0 = divmod(month + 1, 12)
+    return date(year, month0 + 1, 1), date(next_year, next_month0 + 1, 1)
+
+def refresh_rollups(player_ids, months):
+    # Recompute the rollup rows for these players in these months from LedgerEntry
+    player_ids = list(set(player_ids))
+    for month in set(months):
+        start, end = month_bounds(month)
+        totals = db.session.query(
+            LedgerEntry.player_id,
+            db.func.sum(LedgerEntry.net_profit),
+            db.func.count(LedgerEntry.id)
+        ).filter(
+            LedgerEntry.player_id.in_(player_ids),
+            LedgerEntry.game_date >= start,
+            LedgerEntry.game_date < end
+        ).group_by(LedgerEntry.player_id).all()
+        totals = {player_id: (net or 0.0, games) for player_id, net, games in totals}
+        
+        existing = {r.player_id: r for r in MonthlyRollup.query.filter(
+            MonthlyRollup.player_id.in_(player_ids),
+            MonthlyRollup.month == month
+        ).all()}
+        for player_id in player_ids:
+            rollup = existing.get(player_id)
+            if player_id not in totals:
+                if rollup:
+                    db.session.delete(rollup)
+                continue
+            net, games = totals[player_id]
+            if rollup is None:
+                rollup = MonthlyRollup(player_id=player_id, month=month)
+                db.session.add(rollup)
+            rollup.net_profit = net
+            rollup.games = games
+
+def refresh_game_totals(game_ids):
+    # Recompute these games' totals from their entries; games left without
+    # entries are deleted so they drop off the calendar
+    game_ids = list(set(game_ids))
+    if not game_ids:
+        return
+    totals = {row.game_id: row for row in db.session.query(
+        LedgerEntry.game_id,
+        db.func.count(LedgerEntry.id).label('players'),
+        db.func.sum(LedgerEntry.net_profit).label('net'),
+        db.func.sum(LedgerEntry.buy_in).label('buy_in'),
+        db.func.sum(LedgerEntry.buy_out).label('buy_out')
+    ).filter(LedgerEntry.game_id.in_(game_ids)).group_by(LedgerEntry.game_id).all()}
+    for game in Game.query.filter(Game.id.in_(game_ids)).all():
+        row = totals.get(game.id)
+        if row is None:
+            db.session.delete(game)
+            continue
+        game.player_count = row.players
+        game.total_net = row.net or 0.0
+        game.total_buy_in = row.buy_in
+        game.total_buy_out = row.buy_out
+
+def rebuild_rollups():
+    # Recompute every rollup row, used to backfill an existing database
+    year = db.extract('year', LedgerEntry.game_date)
+    month = db.extract('month', LedgerEntry.game_date)
+    totals = db.session.query(
+        LedgerEntry.player_id, year, month,
+        db.func.sum(LedgerEntry.net_profit),
+        db.func.count(LedgerEntry.id)
+    ).group_by(LedgerEntry.player_id, year, month).all()
+    
+    MonthlyRollup.query.delete()
+    db.session.bulk_insert_mappings(MonthlyRollup, [
+        {'player_id': player_id, 'month': int(y) * 12 + int(m) - 1,
+         'net_profit': net or 0.0, 'games': games}
+        for player_id, y, m, net, games in totals
+    ])
+    db.session.commit()
+
+def rebuild_player_rollups(player_ids):
+    # Recompute every rollup row of these players from one grouped query
+    player_ids = sorted(set(player_ids))
+    if not player_ids:
+        return
+    year = db.extract('year', LedgerEntry.game_date)
+    month = db.extract('month', LedgerEntry.game_date)
+    totals = db.session.query(
+        LedgerEntry.player_id, year, month,
+        db.func.sum(LedgerEntry.net_profit),
+        db.func.count(LedgerEntry.id)
+    ).filter(LedgerEntry.player_id.in_(player_ids)).group_by(LedgerEntry.player_id, year, month).all()
+    
+    MonthlyRollup.query.filter(MonthlyRollup.player_id.in_(player_ids)).delete(synchronize_session=False)
+    if totals:
+        db.session.execute(db.insert(MonthlyRollup), [
+            {'player_id': player_id, 'month': int(y) * 12 + int(m) - 1,
+             'net_profit': net or 0.0, 'games': games}
+            for player_id, y, m, net, games in totals
+        ])
+
+def ensure_rollups():
+    if MonthlyRollup.query.first() is None and LedgerEntry.query.first() is not None:
+        print("Backfilling monthly rollups...")
+        rebuild_rollups()
+
+def journal_state_from_tables():
+    # Journal-shaped balances computed from the ledger tables
+    names = dict(db.session.query(Player.id, Player.name).all())
+    return {
+        player_id: [names[player_id], summary['current_balance'], summary['total_payments'],
+                    summary['latest_game'].isoformat() if summary['latest_game'] else None]
+        for player_id, summary in get_player_balances().items()
+    }
+
+def ensure_journal():
+    # The journal starts from a snapshot of whatever the tables hold
+    if JournalSnapshot.query.first() is None:
+        print("Starting the event journal...")
+        journal.rebase(journal_state_from_tables(), 'baseline')
+
+def get_rollup_index():
+    def compute():
+        from leaderboard import RollupIndex
+        return RollupIndex(db.session.query(
+            MonthlyRollup.player_id, MonthlyRollup.month,
+            MonthlyRollup.net_profit, MonthlyRollup.games
+        ).all())
+    return data_cache.get('rollup_index', get_data_version(), compute)
+
+def get_balance_timeline():
+    def compute():
+        entries = db.session.query(
+            LedgerEntry.player_id, LedgerEntry.game_date, LedgerEntry.running_balance
+        ).order_by(LedgerEntry.id).all()  # a day's later games come last
+        payments = db.session.query(
+            Payment.player_id, Payment.payment_date, Payment.amount
+        ).all()
+        from balance_history import BalanceTimeline
+        return BalanceTimeline(
+            ((pid, d.toordinal(), balance or 0.0) for pid, d, balance in entries),
+            ((pid, d.toordinal(), amount) for pid, d, amount in payments)
+        )
+    return data_cache.get('balance_timeline', get_data_version(), compute)
+
+def get_aging_report(as_of, player_id=None):
+    # Unpaid debt by age; the all-players report is cached per data version
+    # and day, a single player's is cheap enough to compute on the spot
+    def compute():
+        from aging import age_debts
+        games = db.session.query(LedgerEntry.player_id, LedgerEntry.game_date, LedgerEntry.net_profit)
+        payments = db.session.query(Payment.player_id, Payment.payment_date, Payment.amount)
+        if player_id is not None:
+            games = games.filter(LedgerEntry.player_id == player_id)
+            payments = payments.filter(Payment.player_id == player_id)
+        columns = lambda rows: ([pid for pid, _, _ in rows], [d.toordinal() for _, d, _ in rows],
+                                [amount or 0.0 for _, _, amount in rows])
+        return age_debts(columns(games.all()), columns(payments.all()), as_of.toordinal())
+    if player_id is not None:
+        return compute()
+    return data_cache.get(('aging', as_of), get_data_version(), compute)
+
+# Fuzzy name index, rebuilt only when players or aliases change
+_name_index_cache = {'signature': None, 'index': None}
+
+def get_name_index():
+    signature = (
+        db.session.query(db.func.count(Player.id), db.func.max(Player.id)).one(),
+        db.session.query(db.func.count(PlayerAlias.id), db.func.max(PlayerAlias.id)).one(),
+    )
+    signature = tuple(tuple(row) for row in signature)
+    if _name_index_cache['signature'] != signature:
+        entries = db.session.query(Player.id, Player.name).all()
+        entries += db.session.query(PlayerAlias.player_id, PlayerAlias.alias).all()
+        _name_index_cache['index'] = NameIndex(entries)
+        _name_index_cache['signature'] = signature
+    return _name_index_cache['index']
+
+def record_alias(player, alias):
+    # Remember a CSV nickname so future uploads can suggest this player
+    alias = alias.strip()
+    if not alias or alias.lower() == player.name.lower():
+        return
+    exists = PlayerAlias.query.filter(
+        PlayerAlias.player_id == player.id,
+        db.func.lower(PlayerAlias.alias) == alias.lower()
+    ).first()
+    if not exists:
+        db.session.add(PlayerAlias(player_id=player.id, alias=alias))
+
+def get_player_balances():
+    # Balance summary for every player in two aggregate queries
+    latest_dates = db.session.query(
+        LedgerEntry.player_id,
+        db.func.max(LedgerEntry.game_date).label('game_date')
+    ).group_by(LedgerEntry.player_id).subquery()
+    latest_entries = db.session.query(
+        LedgerEntry.player_id, LedgerEntry.running_balance, LedgerEntry.game_date
+    ).join(
+        latest_dates,
+        db.and_(LedgerEntry.player_id == latest_dates.c.player_id,
+                LedgerEntry.game_date == latest_dates.c.game_date)
+    ).order_by(LedgerEntry.id).all()  # the day's last game wins below
+    payment_totals = dict(db.session.query(
+        Payment.player_id, db.func.sum(Payment.amount)
+    ).group_by(Payment.player_id).all())
+    
+    balances = {}
+    for player_id, running_balance, game_date in latest_entries:
+        balances[player_id] = (running_balance, game_date)
+    
+    summary = {}
+    for (player_id,) in db.session.query(Player.id).all():
+        current_balance, latest_game = balances.get(player_id, (0.0, None))
+        total_payments = payment_totals.get(player_id) or 0.0
+        remaining_payment = current_balance + total_payments
+        if abs(remaining_payment) < 0.01:
+            remaining_payment = 0.0
+        summary[player_id] = {
+            'current_balance': current_balance,
+            'total_payments': total_payments,
+            'remaining_payment': remaining_payment,
+            'latest_game': latest_game
+        }
+    return summary
+
+# Concurrent balance updates.  On PostgreSQL, writers lock the Player rows
+# whose balances they chain (in id order, so they can't deadlock each other)
+# and uploads lock their game date; writers touching different players run
+# in parallel.  SQLite runs one writer at a time (see sqlite_tuning.py).
+GAME_DATE_LOCK = 7256311  # advisory lock namespace
+WRITE_ATTEMPTS = 4
+# Serialization failure, deadlock, lock not available
+RETRYABLE_SQLSTATES = {'40001', '40P01', '55P03'}
+
+def lock_players(player_ids):
+    player_ids = sorted(set(player_ids))
+    if player_ids and db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            db.select(Player.id).where(Player.id.in_(player_ids)).order_by(Player.id).with_for_update()
+        ).all()
+
+def lock_game_date(game_date):
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('SELECT pg_advisory_xact_lock(:namespace, :day)'),
+                           {'namespace': GAME_DATE_LOCK, 'day': game_date.toordinal()})
+
+# Unique constraints two concurrent writers can both pass the "already
+# exists" check for: a new player's name, an alias, a player's entry in a
+# game and an upload review.  The retry sees the winner's rows and takes
+# the normal path.  PostgreSQL names the constraint, SQLite its columns.
+RACE_CONSTRAINTS = {
+    'player_name_key', '_player_alias_uc', '_player_game_uc', 'ix_game_upload_token',
+    'player.name', 'player_alias.player_id, player_alias.alias',
+    'ledger_entry.player_id, ledger_entry.game_id', 'game.upload_token',
+}
+
+def violated_unique_constraint(error):
+    # The unique constraint an IntegrityError broke, or None for NOT NULL,
+    # CHECK and foreign key failures
+    code = getattr(error.orig, 'pgcode', None) or getattr(error.orig, 'sqlstate', None)
+    if code == '23505':
+        return getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+    message = str(error.orig)
+    if message.startswith('UNIQUE constraint failed: '):
+        return message.split(': ', 1)[1].splitlines()[0].strip()
+    return None
+
+def is_retryable(error):
+    if isinstance(error, IntegrityError):
+        # Any other constraint failure would fail the same way again
+        return violated_unique_constraint(error) in RACE_CONSTRAINTS
+    code = getattr(error.orig, 'pgcode', None) or getattr(error.orig, 'sqlstate', None)
+    return code in RETRYABLE_SQLSTATES or 'database is locked' in str(error.orig)
+
+def run_with_retries(operation, attempts=WRITE_ATTEMPTS):
+    # Run a write transaction, starting over after lock conflicts
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except (IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            if attempt == attempts or not is_retryable(e):
+                raise
+            print(f"Write conflict ({type(e.orig).__name__}), retrying ({attempt}/{attempts - 1})")
+            time.sleep(0.05 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+def chain_game_balances(game_id, player_ids):
+    # Chain a just-added game's entries onto each player's balance before
+    # it (including earlier games that day), then move the entries recorded
+    # after it by its nets: two UPDATEs whatever the number of players.
+    # Run with the players locked, so the chain stays a cumulative sum
+    # whatever order concurrent uploads commit in.
+    previous = db.aliased(LedgerEntry)
+    balance_before = db.select(previous.running_balance).where(
+        previous.player_id == LedgerEntry.player_id,
+        db.or_(previous.game_date < LedgerEntry.game_date,
+               db.and_(previous.game_date == LedgerEntry.game_date, previous.id < LedgerEntry.id))
+    ).order_by(previous.game_date.desc(), previous.id.desc()).limit(1).scalar_subquery()
+    db.session.execute(
+        db.update(LedgerEntry).where(LedgerEntry.game_id == game_id).values(
+            running_balance=db.func.coalesce(balance_before, 0.0) + db.func.coalesce(LedgerEntry.net_profit, 0.0)
+        ).execution_options(player_ids=sorted(set(player_ids)), synchronize_session=False)
+    )
+    shift_later_balances([game_id], player_ids)
+
+def shift_later_balances(game_ids, player_ids, sign=1):
+    # Move every entry recorded after these games by the games' nets (sign
+    # 1 once they are added, -1 before they are removed), for all their
+    # players in one UPDATE.  The games must share a date.
+    if not game_ids:
+        return
+    changed = db.select(
+        LedgerEntry.player_id,
+        db.func.sum(db.func.coalesce(LedgerEntry.net_profit, 0.0)).label('net'),
+        db.func.min(LedgerEntry.game_date).label('game_date'),
+        db.func.min(LedgerEntry.id).label('first_id')
+    ).where(LedgerEntry.game_id.in_(game_ids)).group_by(LedgerEntry.player_id).subquery()
+    db.session.execute(
+        db.update(LedgerEntry).where(
+            LedgerEntry.player_id == changed.c.player_id,
+            db.or_(LedgerEntry.game_id.is_(None), LedgerEntry.game_id.notin_(game_ids)),
+            db.or_(LedgerEntry.game_date > changed.c.game_date,
+                   db.and_(LedgerEntry.game_date == changed.c.game_date, LedgerEntry.id > changed.c.first_id))
+        ).values(running_balance=LedgerEntry.running_balance + sign * changed.c.net)
+        .execution_options(player_ids=sorted(set(player_ids)), synchronize_session=False)
+    )
+
+def games_to_replace(game_date, replace):
+    # The games an upload replaces: none, every game on its date ('all') or
+    # one game's id.  None when there is nothing left to replace.
+    if not replace:
+        return []
+    query = Game.query.filter_by(game_date=game_date)
+    if replace != 'all':
+        query = query.filter_by(id=int(replace))
+    return query.order_by(Game.sequence).all() or None
+
+def remove_games(games):
+    # Take these games (all on one date) off the ledger in the current
+    # transaction: later balances move back by their nets, their entries and
+    # rows go, and each removed result is journaled.  Returns the players.
+    from leaderboard import month_index
+    game_ids = [game.id for game in games]
+    if not game_ids:
+        return []
+    game_date = games[0].game_date
+    player_ids = sorted({pid for (pid,) in db.session.query(LedgerEntry.player_id).filter(
+        LedgerEntry.game_id.in_(game_ids)).all()})
+    lock_players(player_ids)
+    removed = db.session.query(LedgerEntry.player_id, Player.name, LedgerEntry.game_id, LedgerEntry.net_profit).join(
+        Player, Player.id == LedgerEntry.player_id).filter(LedgerEntry.game_id.in_(game_ids)).all()
+
+    shift_later_balances(game_ids, player_ids, sign=-1)
+    LedgerEntry.query.filter(LedgerEntry.game_id.in_(game_ids)).execution_options(
+        player_ids=player_ids).delete(synchronize_session=False)
+    Game.query.filter(Game.id.in_(game_ids)).delete()
+    refresh_rollups(player_ids, [month_index(game_date)])
+
+    latest_games = dict(db.session.query(LedgerEntry.player_id, db.func.max(LedgerEntry.game_date)).filter(
+        LedgerEntry.player_id.in_(player_ids)).group_by(LedgerEntry.player_id).all())
+    journal.record_many([
+        {'kind': 'undo', 'player_id': pid, 'event_date': game_date, 'amount': -(net or 0.0),
+         'data': {'name': name, 'game_id': game_id, 'latest_game': latest_games.get(pid)}}
+        for pid, name, game_id, net in removed
+    ])
+    return player_ids
+
+def rebuild_running_balances(player_ids):
+    # Recompute these players' whole balance chains in one UPDATE: each
+    # entry's balance is the sum of the player's nets up to and including
+    # it, in game date and then upload order
+    player_ids = sorted(set(player_ids))
+    if not player_ids:
+        return
+    balances = db.select(
+        LedgerEntry.id,
+        db.func.sum(db.func.coalesce(LedgerEntry.net_profit, 0.0)).over(
+            partition_by=LedgerEntry.player_id,
+            order_by=(LedgerEntry.game_date, LedgerEntry.id)
+        ).label('balance')
+    ).where(LedgerEntry.player_id.in_(player_ids)).subquery()
+    db.session.execute(
+        db.update(LedgerEntry).where(LedgerEntry.id == balances.c.id).values(running_balance=balances.c.balance)
+        .execution_options(player_ids=player_ids, synchronize_session=False)
+    )
+
+def announce_change(kind, player_ids=(), game_date=None):
+    # Tell open ledger and game pages what a just-committed change touched
+    try:
+        live_updates.publish(kind, get_data_version(), player_ids, game_date)
+    except OSError as e:
+        print(f"LIVE: could not publish {kind} change: {e}")
+
+def upload_player_ids(form):
+    # Existing players a confirmed upload will add games for
+    player_ids = []
+    for i, player_data in enumerate(form.getlist('new_players')):
+        if player_data and form.get(f'action_{i}') == 'match' and form.get(f'match_player_{i}'):
+            player_ids.append(int(form.get(f'match_player_{i}')))
+    for i, player_data in enumerate(form.getlist('existing_players')):
+        if player_data:
+            player_ids.append(int(player_data.split('|')[2]))
+            if form.get(f'existing_action_{i}') == 'fix' and form.get(f'fix_match_player_{i}'):
+                player_ids.append(int(form.get(f'fix_match_player_{i}')))
+    return player_ids
+
+# Optional upload CSV columns kept on each ledger entry, in cents
+STAKE_COLUMNS = ('buy_in', 'buy_out', 'stack')
+
+def stake_field(data):
+    # A player's buy_in|buy_out|stack for the confirm form; blank if not in the CSV
+    return '|'.join('' if data.get(column) is None else repr(data[column]) for column in STAKE_COLUMNS)
+
+def parse_stakes(value):
+    # LedgerEntry keyword arguments from a stake_field() value
+    values = (value or '').split('|')
+    return {column: float(values[i]) if i < len(values) and values[i] else None
+            for i, column in enumerate(STAKE_COLUMNS)}
+
+def parse_session_time(value):
+    # A session_start_at / session_end_at form value, or None
+    return datetime.fromisoformat(value) if value else None
+
+def parse_upload(job, upload_path, game_date_str, replace=None):
+    # Background job behind upload_csv: match the CSV's players for the
+    # confirm page.  ``replace`` is passed through for a re-upload.
+    import pandas as pd
+    
+    try:
+        # Read CSV file
+        job.update(0.0, 'Reading CSV', force=True)
+        df = pd.read_csv(upload_path)
+    finally:
+        os.remove(upload_path)
+    required_columns = ['player_nickname', 'net']
+    
+    if not all(col in df.columns for col in required_columns):
+        raise ValueError('CSV must contain player_nickname and net columns')
+    
+    # Session times and chip counts, when the CSV has them, go on the Game
+    # and its entries; amounts are in cents like net
+    session = {'session_start_at': None, 'session_end_at': None}
+    for column, first_or_last in (('session_start_at', 'min'), ('session_end_at', 'max')):
+        if column in df.columns:
+            # Times as written; the columns are naive, so drop any UTC offset
+            local = df[column].astype(str).str.strip().str.replace(r'(Z|[+-]\d\d:?\d\d)$', '', regex=True)
+            when = getattr(pd.to_datetime(local, errors='coerce', format='mixed'), first_or_last)()
+            session[column] = None if pd.isna(when) else when.isoformat(sep=' ')
+    stake_columns = [column for column in STAKE_COLUMNS if column in df.columns]
+    stakes = pd.DataFrame({column: pd.to_numeric(df[column], errors='coerce') / 100.0
+                           for column in stake_columns})
+    
+    # Consolidate duplicate players in the CSV
+    consolidated_data = {}
+    for row_number, (player_name, net_cents) in enumerate(zip(df['player_nickname'], df['net'])):
+        player_name = player_name.strip()
+        net_profit_dollars = float(net_cents) / 100.0
+        row_stakes = {column: stakes[column].iat[row_number] for column in stake_columns}
+        
+        # Convert to lowercase for case-insensitive comparison
+        player_key = player_name.lower()
+        
+        if player_key in consolidated_data:
+            # Add to existing player's net profit
+            consolidated_data[player_key]['net'] += net_profit_dollars
+            consolidated_data[player_key]['original_names'].add(player_name)
+            for column, amount in row_stakes.items():
+                consolidated_data[player_key][column] += 0.0 if pd.isna(amount) else float(amount)
+        else:
+            # Create new player entry
+            consolidated_data[player_key] = {
+                'name': player_name,  # Use first occurrence as display name
+                'net': net_profit_dollars,
+                'original_names': {player_name}
+            }
+            for column, amount in row_stakes.items():
+                consolidated_data[player_key][column] = 0.0 if pd.isna(amount) else float(amount)
+        job.update(0.5 * (row_number + 1) / len(df), f'Read {row_number + 1} of {len(df)} rows')
+    
+    # Match players case-insensitively, with one query for the whole CSV
+    players_by_name = {}
+    for player_id, name in db.session.query(Player.id, Player.name).order_by(Player.id):
+        players_by_name.setdefault(name.lower(), (player_id, name))
+    
+    # Process consolidated data
+    new_players = []
+    existing_players = []
+    
+    for player_key, data in consolidated_data.items():
+        player_name = data['name']
+        net_profit_dollars = data['net']
+        
+        if player_key in players_by_name:
+            player_id, matched_name = players_by_name[player_key]
+            existing_players.append({
+                'name': player_name,
+                'net': net_profit_dollars,
+                'player_id': player_id,
+                'matched_name': matched_name,
+                'stakes': stake_field(data)
+            })
+        else:
+            new_players.append({
+                'name': player_name,
+                'net': net_profit_dollars,
+                'suggestions': [],
+                'stakes': stake_field(data)
+            })
+    
+    # Suggest likely matches for names we couldn't match exactly
+    if new_players:
+        name_index = get_name_index()
+        player_names = {player_id: name for player_id, name in players_by_name.values()}
+        for i, new_player in enumerate(new_players):
+            for suggestion in name_index.search(new_player['name']):
+                suggestion['name'] = player_names.get(suggestion['player_id'])
+                if suggestion['name']:
+                    new_player['suggestions'].append(suggestion)
+            job.update(0.5 + 0.5 * (i + 1) / len(new_players), f'Matched {i + 1} of {len(new_players)} new names')
+    
+    # Show consolidation info if there were duplicates
+    consolidation_info = []
+    for player_key, data in consolidated_data.items():
+        if len(data['original_names']) > 1:
+            consolidation_info.append({
+                'final_name': data['name'],
+                'original_names': list(data['original_names']),
+                'total_net': data['net']
+            })
+    
+    game_date = datetime.strptime(game_date_str, '%Y-%m-%d').date()
+    games_that_day = Game.query.filter_by(game_date=game_date).count()
+    replacing = [game.sequence for game in games_to_replace(game_date, replace) or []]
+    
+    return {'new_players': new_players, 'existing_players': existing_players,
+            'game_date': game_date_str, 'consolidation_info': consolidation_info,
+            'session': session, 'games_that_day': games_that_day,
+            'replace': replace if replacing else None, 'replacing': replacing}
+
+def export_ledger(job):
+    # Background job behind /export: write the current ledger to a CSV file
+    balances = get_player_balances()
+    players = db.session.query(Player.id, Player.name, Player.preferred_payment_method,
+                               Player.payment_id).order_by(Player.id).all()
+    job.update(0.5, f'Exporting {len(players)} players', force=True)
+    export_data = []
+    
+    for player in players:
+        summary = balances[player.id]
+        latest_game = summary['latest_game']
+        export_data.append({
+            'Player Name': player.name,
+            'Preferred Payment Method': player.preferred_payment_method or 'Not set',
+            'Payment ID': player.payment_id or 'Not set',
+            'Current Balance': summary['current_balance'],
+            'Total Payments': summary['total_payments'],
+            'Remaining Payment': summary['current_balance'] - summary['total_payments'],
+            'Last Game': latest_game.strftime('%Y-%m-%d') if latest_game else 'N/A'
+        })
+    
+    # Convert to DataFrame and save as CSV
+    import pandas as pd
+    df = pd.DataFrame(export_data)
+    export_path = os.path.join(app.config['UPLOAD_FOLDER'], f'ledger_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
+    df.to_csv(export_path, index=False)
+    
+    return {'file': export_path, 'rows': len(export_data)}
+
+def import_export_files(job):
+    # Background job behind /admin/import: load the newest database_export/ files
+    from import_data import import_data
+    summary = import_data(job=job)
+    if summary is None:
+        raise ValueError('No player export files found in database_export/')
+    return summary
+
+def parse_payment_import(job, upload_path, default_date_str, default_method):
+    # Background job behind import_payments: match a payment statement to
+    # players for the review page
+    import reconcile
+
+    default_date = datetime.strptime(default_date_str, '%Y-%m-%d').date() if default_date_str else None
+    try:
+        job.update(0.0, 'Reading CSV', force=True)
+        rows = reconcile.read_statement(upload_path, default_date, default_method)
+    finally:
+        os.remove(upload_path)
+
+    job.update(0.3, f'Matching {len(rows)} payments', force=True)
+    directory = reconcile.player_directory(
+        db.session.query(Player.id, Player.name, Player.payment_id).all(),
+        db.session.query(PlayerAlias.player_id, PlayerAlias.alias).all()
+    )
+    dates = rows['date'].dropna()
+    existing = db.session.query(Payment.player_id, Payment.payment_date, Payment.amount).filter(
+        Payment.payment_date >= dates.min(), Payment.payment_date <= dates.max()
+    ).all() if len(dates) else []
+    rows = reconcile.match_statement(rows, directory, existing)
+    summary = reconcile.summarize(rows)
+
+    job.update(0.6, 'Suggesting players for unmatched names', force=True)
+    player_names = dict(db.session.query(Player.id, Player.name).all())
+    records = []
+    for row in rows.astype(object).where(rows.notna(), None).to_dict('records'):
+        for column in ('player_id', 'recipient_id'):
+            row[column] = int(row[column]) if row[column] is not None else None
+        row['date'] = row['date'].isoformat() if row['date'] is not None else None
+        row['player_name'] = player_names.get(row['player_id'])
+        row['recipient_player_name'] = player_names.get(row['recipient_id'])
+        row['suggestions'] = []
+        records.append(row)
+    unmatched = [row for row in records if row['status'] == 'unmatched' and row['player_id'] is None]
+    if unmatched:
+        name_index = get_name_index()
+        for row in unmatched:
+            for suggestion in name_index.search(row['name']):
+                suggestion['name'] = player_names.get(suggestion['player_id'])
+                if suggestion['name']:
+                    row['suggestions'].append(suggestion)
+
+    return {'rows': records, 'summary': summary, 'default_method': default_method}
+
 # Routes
 @app.route('/')
 def index():
@@ -87,95 +973,23 @@ def upload_csv():
         
         if file and file.filename.endswith('.csv'):
             try:
-                # Read CSV file
-                df = pd.read_csv(file)
-                required_columns = ['player_nickname', 'net']
-                
-                if not all(col in df.columns for col in required_columns):
-                    flash('CSV must contain player_nickname and net columns', 'error')
-                    return redirect(request.url)
-                
                 # Get game date from form
                 game_date_str = request.form.get('game_date')
                 if not game_date_str:
                     flash('Game date is required', 'error')
                     return redirect(request.url)
                 
-                game_date = datetime.strptime(game_date_str, '%Y-%m-%d').date()
-                
-                # Check if this game date already has entries
-                existing_entries = LedgerEntry.query.filter_by(game_date=game_date).first()
-                if existing_entries:
-                    flash(f'Game data for {game_date_str} already exists. Please use a different date or clear existing entries.', 'error')
-                    return redirect(request.url)
-                
-                # Consolidate duplicate players in the CSV
-                consolidated_data = {}
-                for _, row in df.iterrows():
-                    player_name = row['player_nickname'].strip()
-                    net_profit_cents = float(row['net'])
-                    net_profit_dollars = net_profit_cents / 100.0
-                    
-                    # Convert to lowercase for case-insensitive comparison
-                    player_key = player_name.lower()
-                    
-                    if player_key in consolidated_data:
-                        # Add to existing player's net profit
-                        consolidated_data[player_key]['net'] += net_profit_dollars
-                        consolidated_data[player_key]['original_names'].add(player_name)
-                    else:
-                        # Create new player entry
-                        consolidated_data[player_key] = {
-                            'name': player_name,  # Use first occurrence as display name
-                            'net': net_profit_dollars,
-                            'original_names': {player_name}
-                        }
-                
-                # Process consolidated data
-                new_players = []
-                existing_players = []
-                
-                for player_key, data in consolidated_data.items():
-                    player_name = data['name']
-                    net_profit_dollars = data['net']
-                    
-                    # Check if player exists (case insensitive)
-                    existing_player = Player.query.filter(
-                        db.func.lower(Player.name) == db.func.lower(player_name)
-                    ).first()
-                    
-                    if existing_player:
-                        existing_players.append({
-                            'name': player_name,
-                            'net': net_profit_dollars,
-                            'player_id': existing_player.id,
-                            'matched_name': existing_player.name
-                        })
-                    else:
-                        new_players.append({
-                            'name': player_name,
-                            'net': net_profit_dollars
-                        })
+                # A date can hold several games; the confirm page says
+                # which one this upload adds
+                datetime.strptime(game_date_str, '%Y-%m-%d')
                 
-                # Show consolidation info if there were duplicates
-                consolidation_info = []
-                for player_key, data in consolidated_data.items():
-                    if len(data['original_names']) > 1:
-                        consolidation_info.append({
-                            'final_name': data['name'],
-                            'original_names': list(data['original_names']),
-                            'total_net': data['net']
-                        })
-                
-                # Get all existing players for dropdown
-                all_existing_players = Player.query.order_by(Player.name).all()
-                
-                return render_template('confirm_upload.html', 
-                                     new_players=new_players, 
-                                     existing_players=existing_players,
-                                     game_date=game_date_str,
-                                     consolidation_info=consolidation_info,
-                                     all_existing_players=all_existing_players)
+                # Parse in the background; the review page waits for the job
+                upload_path = os.path.join(app.config['UPLOAD_FOLDER'],
+                                           f'upload_{uuid.uuid4().hex}_{secure_filename(file.filename)}')
+                file.save(upload_path)
+                job_id = jobs.submit('parse_upload', parse_upload, upload_path, game_date_str,
+                                     request.form.get('replace') or None)
+                return redirect(url_for('upload_review', job_id=job_id))
                 
             except Exception as e:
                 flash(f'Error processing file: {str(e)}', 'error')
@@ -184,7 +998,39 @@ def upload_csv():
             flash('Please upload a CSV file', 'error')
             return redirect(request.url)
     
-    return render_template('upload.html')
+    # Re-uploading from a game page replaces that date's games, or one game
+    replace_date = request.args.get('date')
+    replace = request.args.get('replace') if replace_date else None
+    replacing = []
+    if replace:
+        replacing = games_to_replace(datetime.strptime(replace_date, '%Y-%m-%d').date(), replace) or []
+        if not replacing:
+            flash('There is no game to replace on that date.', 'error')
+            return redirect(url_for('calendar'))
+    return render_template('upload.html', replace=replace if replacing else None,
+                           replace_date=replace_date, replacing=replacing)
+
+@app.route('/upload/<job_id>')
+@admin_required
+def upload_review(job_id):
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'parse_upload':
+        flash('Upload not found. Please upload the file again.', 'error')
+        return redirect(url_for('upload_csv'))
+    if job['status'] == 'failed':
+        flash(f"Error processing file: {job['error']}", 'error')
+        return redirect(url_for('upload_csv'))
+    if job['status'] != 'done':
+        return render_template('job_progress.html', job=job, title='Processing CSV')
+    
+    # Get all existing players for dropdown
+    all_existing_players = Player.query.order_by(Player.name).all()
+    
+    # The parse job's id marks this review, so confirming it twice is caught
+    return render_template('confirm_upload.html', 
+                         all_existing_players=all_existing_players,
+                         upload_token=job_id,
+                         **job['result'])
 
 @app.route('/confirm_upload', methods=['POST'])
 @admin_required
@@ -192,157 +1038,210 @@ def confirm_upload():
     game_date = datetime.strptime(request.form.get('game_date'), '%Y-%m-%d').date()
     
     try:
-        # Double-check that no entries exist for this game date
-        existing_entries = LedgerEntry.query.filter_by(game_date=game_date).first()
-        if existing_entries:
-            flash(f'Game data for {game_date.strftime("%Y-%m-%d")} already exists. Please use a different date.', 'error')
-            return redirect(url_for('upload_csv'))
-        
-        print("=== DEBUG: Processing upload ===")
-        print(f"Game date: {game_date}")
-        
-        # Process new players with their actions
-        new_players_data = request.form.getlist('new_players')
-        print(f"New players data: {new_players_data}")
-        
-        processed_players = set()  # Track processed players to avoid duplicates
-        
-        for i, player_data in enumerate(new_players_data):
-            if player_data:
-                name, net = player_data.split('|')
-                name = name.strip()
-                
-                # Check if we've already processed this player
-                if name in processed_players:
-                    print(f"WARNING: Duplicate player '{name}' found in new_players_data")
-                    continue
-                
-                processed_players.add(name)
-                print(f"Processing new player: {name} with net: {net}")
-                
-                # Get the action chosen for this player
-                action = request.form.get(f'action_{i}')
-                print(f"Action for {name}: {action}")
-                
-                if action == 'match':
-                    # Match to existing player
-                    match_player_id = request.form.get(f'match_player_{i}')
-                    if match_player_id:
-                        existing_player = Player.query.get(int(match_player_id))
-                        if existing_player:
-                            print(f"Matching '{name}' to existing player '{existing_player.name}' (ID: {existing_player.id})")
+        def record_upload():
+            # Uploads of the same date queue behind each other; the loser
+            # then finds the date taken
+            lock_game_date(game_date)
+            # A review confirmed twice (a double click, a resubmitted form)
+            # is one game, with or without session times
+            upload_token = request.form.get('upload_token') or None
+            if upload_token and Game.query.filter_by(upload_token=upload_token).first():
+                flash('This upload has already been confirmed.', 'error')
+                return redirect(url_for('upload_csv'))
+            # A re-upload first takes the games it replaces off the ledger,
+            # in the same transaction as the new results
+            replaced = games_to_replace(game_date, request.form.get('replace'))
+            if replaced is None:
+                flash('The game to replace is no longer on the ledger.', 'error')
+                return redirect(url_for('upload_csv'))
+            removed_player_ids = remove_games(replaced)
+            
+            # The same session uploaded twice is a mistake, not a second game
+            session_start_at = parse_session_time(request.form.get('session_start_at'))
+            if session_start_at and Game.query.filter_by(game_date=game_date, session_start_at=session_start_at).first():
+                flash(f'The game that started {session_start_at.strftime("%Y-%m-%d %H:%M")} has already been uploaded.', 'error')
+                return redirect(url_for('upload_csv'))
+            
+            if replaced and request.form.get('replace') != 'all':
+                sequence = replaced[0].sequence
+            else:
+                sequence = (db.session.query(db.func.max(Game.sequence)).filter(Game.game_date == game_date).scalar() or 0) + 1
+            game = Game(game_date=game_date, sequence=sequence, session_start_at=session_start_at,
+                        session_end_at=parse_session_time(request.form.get('session_end_at')),
+                        upload_token=upload_token)
+            db.session.add(game)
+            db.session.flush()  # Get the ID
+            
+            lock_players(upload_player_ids(request.form))
+            
+            print("=== DEBUG: Processing upload ===")
+            print(f"Game date: {game_date}")
+            
+            # Process new players with their actions
+            new_players_data = request.form.getlist('new_players')
+            new_stakes = request.form.getlist('new_player_stakes')
+            print(f"New players data: {new_players_data}")
+            
+            processed_players = set()  # Track processed players to avoid duplicates
+            
+            for i, player_data in enumerate(new_players_data):
+                if player_data:
+                    name, net = player_data.split('|')
+                    name = name.strip()
+                    
+                    # Check if we've already processed this player
+                    if name in processed_players:
+                        print(f"WARNING: Duplicate player '{name}' found in new_players_data")
+                        continue
+                    
+                    processed_players.add(name)
+                    print(f"Processing new player: {name} with net: {net}")
+                    
+                    # Get the action chosen for this player
+                    action = request.form.get(f'action_{i}')
+                    print(f"Action for {name}: {action}")
+                    
+                    if action == 'match':
+                        # Match to existing player
+                        match_player_id = request.form.get(f'match_player_{i}')
+                        if match_player_id:
+                            existing_player = Player.query.get(int(match_player_id))
+                            if existing_player:
+                                print(f"Matching '{name}' to existing player '{existing_player.name}' (ID: {existing_player.id})")
+                                record_alias(existing_player, name)
+                                
+                                # Add ledger entry to existing player
+                                entry = LedgerEntry(
+                                    player_id=existing_player.id,
+                                    game_id=game.id,
+                                    game_date=game_date,
+                                    net_profit=float(net),
+                                    running_balance=float(net),  # chained below
+                                    **parse_stakes(new_stakes[i] if i < len(new_stakes) else None)
+                                )
+                                db.session.add(entry)
+                            else:
+                                print(f"ERROR: Could not find existing player with ID {match_player_id}")
+                                flash(f'Error: Could not find existing player for {name}', 'error')
+                                return redirect(url_for('upload_csv'))
+                        else:
+                            print(f"ERROR: No match player selected for {name}")
+                            flash(f'Error: Please select an existing player to match {name} to', 'error')
+                            return redirect(url_for('upload_csv'))
+                            
+                    elif action == 'create':
+                        # Create new player with custom name
+                        create_name = request.form.get(f'create_name_{i}', name).strip()
+                        if create_name:
+                            print(f"Creating new player '{create_name}' (from CSV name '{name}')")
                             
-                            # Add ledger entry to existing player
-                            last_entry = LedgerEntry.query.filter_by(player_id=existing_player.id).order_by(LedgerEntry.game_date.desc()).first()
-                            current_balance = last_entry.running_balance if last_entry else 0.0
+                            # Check if the new name already exists
+                            existing_player = Player.query.filter(
+                                db.func.lower(Player.name) == db.func.lower(create_name)
+                            ).first()
                             
+                            if existing_player:
+                                print(f"ERROR: Player '{create_name}' already exists")
+                                flash(f'Error: Player "{create_name}" already exists. Please choose a different name or match to existing player.', 'error')
+                                return redirect(url_for('upload_csv'))
+                            
+                            # Create new player
+                            player = Player(name=create_name)
+                            db.session.add(player)
+                            db.session.flush()  # Get the ID
+                            print(f"Created player '{create_name}' with ID {player.id}")
+                            
+                            # Add ledger entry
                             entry = LedgerEntry(
-                                player_id=existing_player.id,
+                                player_id=player.id,
+                                game_id=game.id,
                                 game_date=game_date,
                                 net_profit=float(net),
-                                running_balance=current_balance + float(net)
+                                running_balance=float(net),
+                                **parse_stakes(new_stakes[i] if i < len(new_stakes) else None)
                             )
                             db.session.add(entry)
                         else:
-                            print(f"ERROR: Could not find existing player with ID {match_player_id}")
-                            flash(f'Error: Could not find existing player for {name}', 'error')
-                            return redirect(url_for('upload_csv'))
-                    else:
-                        print(f"ERROR: No match player selected for {name}")
-                        flash(f'Error: Please select an existing player to match {name} to', 'error')
-                        return redirect(url_for('upload_csv'))
-                        
-                elif action == 'create':
-                    # Create new player with custom name
-                    create_name = request.form.get(f'create_name_{i}', name).strip()
-                    if create_name:
-                        print(f"Creating new player '{create_name}' (from CSV name '{name}')")
-                        
-                        # Check if the new name already exists
-                        existing_player = Player.query.filter(
-                            db.func.lower(Player.name) == db.func.lower(create_name)
-                        ).first()
-                        
-                        if existing_player:
-                            print(f"ERROR: Player '{create_name}' already exists")
-                            flash(f'Error: Player "{create_name}" already exists. Please choose a different name or match to existing player.', 'error')
+                            print(f"ERROR: No name provided for new player from {name}")
+                            flash(f'Error: Please provide a name for the new player from {name}', 'error')
                             return redirect(url_for('upload_csv'))
-                        
-                        # Create new player
-                        player = Player(name=create_name)
-                        db.session.add(player)
-                        db.session.flush()  # Get the ID
-                        print(f"Created player '{create_name}' with ID {player.id}")
-                        
-                        # Add ledger entry
-                        entry = LedgerEntry(
-                            player_id=player.id,
-                            game_date=game_date,
-                            net_profit=float(net),
-                            running_balance=float(net)
-                        )
-                        db.session.add(entry)
                     else:
-                        print(f"ERROR: No name provided for new player from {name}")
-                        flash(f'Error: Please provide a name for the new player from {name}', 'error')
+                        print(f"ERROR: Invalid action '{action}' for {name}")
+                        flash(f'Error: Invalid action for {name}', 'error')
                         return redirect(url_for('upload_csv'))
-                else:
-                    print(f"ERROR: Invalid action '{action}' for {name}")
-                    flash(f'Error: Invalid action for {name}', 'error')
-                    return redirect(url_for('upload_csv'))
-        
-        # Process existing players
-        existing_players_data = request.form.getlist('existing_players')
-        print(f"Existing players data: {existing_players_data}")
-        
-        for i, player_data in enumerate(existing_players_data):
-            if player_data:
-                name, net, original_player_id = player_data.split('|')
-                name = name.strip()
-                
-                if name in processed_players:
-                    print(f"WARNING: Player '{name}' already processed, skipping")
-                    continue
-                
-                processed_players.add(name)
-                print(f"Processing existing player: {name} (Original ID: {original_player_id}) with net: {net}")
-                
-                # Check if user wants to fix the match
-                existing_action = request.form.get(f'existing_action_{i}')
-                print(f"Existing action for {name}: {existing_action}")
-                
-                if existing_action == 'fix':
-                    # User wants to fix the match
-                    fix_player_id = request.form.get(f'fix_match_player_{i}')
-                    if fix_player_id and fix_player_id != original_player_id:
-                        target_player_id = int(fix_player_id)
-                        print(f"Fixing match for '{name}' from player ID {original_player_id} to {target_player_id}")
+            
+            # Process existing players
+            existing_players_data = request.form.getlist('existing_players')
+            existing_stakes = request.form.getlist('existing_player_stakes')
+            print(f"Existing players data: {existing_players_data}")
+            
+            for i, player_data in enumerate(existing_players_data):
+                if player_data:
+                    name, net, original_player_id = player_data.split('|')
+                    name = name.strip()
+                    
+                    if name in processed_players:
+                        print(f"WARNING: Player '{name}' already processed, skipping")
+                        continue
+                    
+                    processed_players.add(name)
+                    print(f"Processing existing player: {name} (Original ID: {original_player_id}) with net: {net}")
+                    
+                    # Check if user wants to fix the match
+                    existing_action = request.form.get(f'existing_action_{i}')
+                    print(f"Existing action for {name}: {existing_action}")
+                    
+                    if existing_action == 'fix':
+                        # User wants to fix the match
+                        fix_player_id = request.form.get(f'fix_match_player_{i}')
+                        if fix_player_id and fix_player_id != original_player_id:
+                            target_player_id = int(fix_player_id)
+                            print(f"Fixing match for '{name}' from player ID {original_player_id} to {target_player_id}")
+                            fixed_player = Player.query.get(target_player_id)
+                            if fixed_player:
+                                record_alias(fixed_player, name)
+                        else:
+                            target_player_id = int(original_player_id)
+                            print(f"Keeping original match for '{name}' (player ID: {original_player_id})")
                     else:
+                        # Keep the original match
                         target_player_id = int(original_player_id)
                         print(f"Keeping original match for '{name}' (player ID: {original_player_id})")
-                else:
-                    # Keep the original match
-                    target_player_id = int(original_player_id)
-                    print(f"Keeping original match for '{name}' (player ID: {original_player_id})")
-                
-                # Get current running balance for the target player
-                last_entry = LedgerEntry.query.filter_by(player_id=target_player_id).order_by(LedgerEntry.game_date.desc()).first()
-                current_balance = last_entry.running_balance if last_entry else 0.0
-                
-                # Add ledger entry to the target player
-                entry = LedgerEntry(
-                    player_id=target_player_id,
-                    game_date=game_date,
-                    net_profit=float(net),
-                    running_balance=current_balance + float(net)
-                )
-                db.session.add(entry)
+                    
+                    # Add ledger entry to the target player
+                    entry = LedgerEntry(
+                        player_id=target_player_id,
+                        game_id=game.id,
+                        game_date=game_date,
+                        net_profit=float(net),
+                        running_balance=float(net),  # chained below
+                        **parse_stakes(existing_stakes[i] if i < len(existing_stakes) else None)
+                    )
+                    db.session.add(entry)
+            
+            # Keep monthly leaderboard rollups in sync with the new entries
+            from leaderboard import month_index
+            db.session.flush()
+            uploaded = db.session.query(LedgerEntry.player_id, Player.name, LedgerEntry.net_profit).join(
+                Player, Player.id == LedgerEntry.player_id).filter(LedgerEntry.game_id == game.id).all()
+            uploaded_player_ids = [pid for pid, _, _ in uploaded]
+            chain_game_balances(game.id, uploaded_player_ids)
+            refresh_rollups(uploaded_player_ids, [month_index(game_date)])
+            refresh_game_totals([game.id])
+            for pid, name, net in uploaded:
+                journal.record('game', pid, game_date, net, name=name, game_id=game.id)
+            
+            print("=== DEBUG: About to commit ===")
+            db.session.commit()
+            print("=== DEBUG: Commit successful ===")
+            announce_change('upload', sorted(set(uploaded_player_ids) | set(removed_player_ids)), game_date)
+            if replaced:
+                flash(f'Replaced {len(replaced)} game{"s" if len(replaced) != 1 else ""} on {game_date.strftime("%Y-%m-%d")} with the uploaded results!', 'success')
+            else:
+                flash('CSV data uploaded successfully!', 'success')
+            return redirect(url_for('ledger'))
         
-        print("=== DEBUG: About to commit ===")
-        db.session.commit()
-        print("=== DEBUG: Commit successful ===")
-        flash('CSV data uploaded successfully!', 'success')
-        return redirect(url_for('ledger'))
+        return run_with_retries(record_upload)
         
     except Exception as e:
         print(f"=== DEBUG: Error occurred: {str(e)} ===")
@@ -350,15 +1249,18 @@ def confirm_upload():
         flash(f'Error uploading data: {str(e)}', 'error')
         return redirect(url_for('upload_csv'))
 
-@app.route('/ledger')
-def ledger():
-    # Get all players with their current ledger status
-    players = Player.query.all()
+def ledger_rows(players):
+    # Current ledger status for each of the given players
+    if len(players) > 20:
+        # Cheaper as two aggregate queries than two queries per player
+        balances = get_player_balances()
+        return [dict(balances[player.id], player=player) for player in players]
+    
     ledger_data = []
     
     for player in players:
         # Get latest ledger entry
-        latest_entry = LedgerEntry.query.filter_by(player_id=player.id).order_by(LedgerEntry.game_date.desc()).first()
+        latest_entry = LedgerEntry.query.filter_by(player_id=player.id).order_by(LedgerEntry.game_date.desc(), LedgerEntry.id.desc()).first()
         
         # Calculate total payments
         total_payments = db.session.query(db.func.sum(Payment.amount)).filter_by(player_id=player.id).scalar() or 0.0
@@ -380,15 +1282,55 @@ def ledger():
             'remaining_payment': remaining_payment,
             'latest_game': latest_entry.game_date if latest_entry else None
         })
-    
-    return render_template('ledger.html', ledger_data=ledger_data)
+    return ledger_data
+
+def rendered_ledger_rows(player_ids=None):
+    # Ledger row HTML by player id, in id order.  A row is rendered once per
+    # player row_version and reused until that player's entries or payments
+    # change, so after one payment only that player's row is rebuilt.
+    query = db.session.query(Player.id, Player.row_version)
+    if player_ids is not None:
+        query = query.filter(Player.id.in_(player_ids))
+    versions = query.order_by(Player.id).all()
+    is_admin = bool(session.get('is_admin'))
+    rows, stale = {}, {}
+    for player_id, row_version in versions:
+        rows[player_id] = ledger_row_cache.lookup((player_id, is_admin), row_version)
+        if rows[player_id] is None:
+            stale[player_id] = row_version
+    if stale:
+        if len(stale) > 500:
+            players = [p for p in Player.query.all() if p.id in stale]
+        else:
+            players = Player.query.filter(Player.id.in_(stale)).all()
+        for data in ledger_rows(players):
+            player_id = data['player'].id
+            html = Markup(render_template('_ledger_row.html', data=data))
+            ledger_row_cache.put((player_id, is_admin), stale[player_id], html)
+            rows[player_id] = html
+    return {player_id: html for player_id, html in rows.items() if html is not None}
+
+@app.route('/ledger')
+def ledger():
+    # Get all players with their current ledger status
+    rows = rendered_ledger_rows()
+    return render_template('ledger.html', ledger_rows=list(rows.values()), live_version=get_data_version())
+
+@app.route('/ledger/rows')
+def ledger_row_fragments():
+    # Re-rendered rows for the live ledger page; null for removed players
+    player_ids = [int(pid) for pid in request.args.getlist('player_id')]
+    rows = {pid: None for pid in player_ids}
+    if player_ids:
+        rows.update(rendered_ledger_rows(player_ids))
+    return jsonify({'rows': rows})
 
 @app.route('/player/<int:player_id>')
 def player_detail(player_id):
     player = Player.query.get_or_404(player_id)
     
     # Get all ledger entries
-    ledger_entries = LedgerEntry.query.filter_by(player_id=player_id).order_by(LedgerEntry.game_date.desc()).all()
+    ledger_entries = LedgerEntry.query.filter_by(player_id=player_id).order_by(LedgerEntry.game_date.desc(), LedgerEntry.id.desc()).all()
     
     # Get all payments with recipient information
     payments = Payment.query.filter_by(player_id=player_id).order_by(Payment.payment_date.desc()).all()
@@ -396,7 +1338,18 @@ def player_detail(player_id):
     # Calculate total net profit from games only
     total_net_profit = sum(entry.net_profit for entry in ledger_entries)
     
-    return render_template('player_detail.html', player=player, ledger_entries=ledger_entries, payments=payments, total_net_profit=total_net_profit)
+    stats = get_all_player_stats().get(player_id)
+    aging = get_aging_report(datetime.utcnow().date(), player_id).for_player(player_id)
+    
+    return render_template('player_detail.html', player=player, ledger_entries=ledger_entries, payments=payments, total_net_profit=total_net_profit, stats=stats, counterparties=counterparties(player_id), aging=aging)
+
+@app.route('/stats')
+def stats():
+    all_stats = get_all_player_stats()
+    players = Player.query.all()
+    stats_data = [{'player': p, 'stats': all_stats[p.id]} for p in players if p.id in all_stats]
+    stats_data.sort(key=lambda x: x['stats']['total'], reverse=True)
+    return render_template('stats.html', stats_data=stats_data)
 
 @app.route('/edit_player', methods=['POST'])
 @admin_required
@@ -413,6 +1366,52 @@ def edit_player():
     flash('Player information updated successfully!', 'success')
     return redirect(url_for('player_detail', player_id=player_id))
 
+def record_transfer(payer_id, recipient_id, amount, transfer_date, payment_method=None):
+    # The payer's balance goes up by amount and the recipient's down by it
+    transfer = Transfer(payer_id=payer_id, recipient_id=recipient_id, amount=amount,
+                        transfer_date=transfer_date, payment_method=payment_method)
+    db.session.add(transfer)
+    db.session.add_all([
+        Payment(player_id=payer_id, amount=amount, payment_date=transfer_date,
+                payment_method=payment_method, transfer=transfer),
+        Payment(player_id=recipient_id, amount=-amount, payment_date=transfer_date,
+                payment_method=payment_method, transfer=transfer)
+    ])
+    journal.record('transfer', payer_id, transfer_date, amount, recipient_id, method=payment_method)
+    return transfer
+
+def pairwise_flow(player_id, other_id):
+    # Transfers between two players in each direction, from the transfer indexes
+    rows = db.session.query(
+        Transfer.payer_id, db.func.coalesce(db.func.sum(Transfer.amount), 0.0), db.func.count()
+    ).filter(db.or_(
+        db.and_(Transfer.payer_id == player_id, Transfer.recipient_id == other_id),
+        db.and_(Transfer.payer_id == other_id, Transfer.recipient_id == player_id)
+    )).group_by(Transfer.payer_id).all()
+    totals = {payer: (total, count) for payer, total, count in rows}
+    paid, paid_count = totals.get(player_id, (0.0, 0))
+    received, received_count = totals.get(other_id, (0.0, 0))
+    return {'paid': paid, 'received': received, 'net': paid - received,
+            'transfers': paid_count + received_count}
+
+def counterparties(player_id):
+    # Everyone a player has paid or been paid by, with totals each way
+    flows = {}
+    for column, other, key in ((Transfer.payer_id, Transfer.recipient_id, 'paid'),
+                               (Transfer.recipient_id, Transfer.payer_id, 'received')):
+        for other_id, total, count in db.session.query(
+                other, db.func.sum(Transfer.amount), db.func.count()
+        ).filter(column == player_id).group_by(other).all():
+            flow = flows.setdefault(other_id, {'paid': 0.0, 'received': 0.0, 'transfers': 0})
+            flow[key] = total or 0.0
+            flow['transfers'] += count
+    names = dict(db.session.query(Player.id, Player.name).filter(
+        Player.id.in_([pid for pid in flows if pid is not None])).all()) if flows else {}
+    result = [dict(flow, player_id=other_id, player_name=names.get(other_id, 'Cleared player'),
+                   net=flow['paid'] - flow['received'])
+              for other_id, flow in flows.items()]
+    return sorted(result, key=lambda flow: -abs(flow['net']))
+
 @app.route('/add_payment', methods=['POST'])
 @admin_required
 def add_payment():
@@ -422,26 +1421,22 @@ def add_payment():
     payment_date = datetime.strptime(request.form.get('payment_date'), '%Y-%m-%d').date()
     payment_method = request.form.get('payment_method')
     
-    # Create payment record for the payer
-    payment = Payment(
-        player_id=int(player_id),
-        amount=amount,
-        payment_date=payment_date,
-        payment_method=payment_method
-    )
-    db.session.add(payment)
-    
-    # If this is a transfer to another player, create a corresponding negative payment record for the recipient
     if transfer_to_player_id:
-        recipient_payment = Payment(
-            player_id=int(transfer_to_player_id),
-            amount=-amount,  # Negative amount for the recipient
+        # Payer and recipient legs linked by one Transfer
+        record_transfer(int(player_id), int(transfer_to_player_id), amount, payment_date, payment_method)
+    else:
+        # Create payment record for the payer
+        payment = Payment(
+            player_id=int(player_id),
+            amount=amount,
             payment_date=payment_date,
             payment_method=payment_method
         )
-        db.session.add(recipient_payment)
+        db.session.add(payment)
+        journal.record('payment', int(player_id), payment_date, amount, method=payment_method)
     
     db.session.commit()
+    announce_change('payment', [int(player_id)] + ([int(transfer_to_player_id)] if transfer_to_player_id else []))
     
     if transfer_to_player_id:
         payer = Player.query.get(int(player_id))
@@ -452,6 +1447,360 @@ def add_payment():
     
     return redirect(url_for('player_detail', player_id=player_id))
 
+def record_payments(items):
+    # Many payments and transfers in the current transaction, with one batched
+    # insert per table rather than a flush per row.  Items are dicts with
+    # player_id, amount, payment_date, payment_method and optional recipient_id.
+    player_ids = sorted({item['player_id'] for item in items} |
+                        {item['recipient_id'] for item in items if item.get('recipient_id')})
+    lock_players(player_ids)
+    now = datetime.utcnow()
+    transfers = [item for item in items if item.get('recipient_id')]
+    transfer_ids = iter(db.session.execute(
+        db.insert(Transfer).returning(Transfer.id, sort_by_parameter_order=True),
+        [{'payer_id': item['player_id'], 'recipient_id': item['recipient_id'], 'amount': item['amount'],
+          'transfer_date': item['payment_date'], 'payment_method': item['payment_method'], 'created_at': now}
+         for item in transfers]
+    ).scalars().all() if transfers else [])
+
+    rows, events = [], []
+    for item in items:
+        leg = {'player_id': item['player_id'], 'amount': item['amount'], 'payment_date': item['payment_date'],
+               'payment_method': item['payment_method'], 'created_at': now, 'transfer_id': None}
+        event = {'kind': 'payment', 'player_id': item['player_id'], 'event_date': item['payment_date'],
+                 'amount': item['amount'], 'data': {'method': item['payment_method']} if item['payment_method'] else None}
+        if item.get('recipient_id'):
+            # Same two linked legs as record_transfer()
+            leg['transfer_id'] = next(transfer_ids)
+            rows += [leg, dict(leg, player_id=item['recipient_id'], amount=-item['amount'])]
+            event.update(kind='transfer', counterparty_id=item['recipient_id'])
+        else:
+            rows.append(leg)
+        events.append(event)
+    journal.record_many(events)
+    db.session.execute(db.insert(Payment).execution_options(player_ids=player_ids), rows)
+    return player_ids
+
+@app.route('/api/payments/bulk', methods=['POST'])
+@admin_required
+def api_bulk_payments():
+    # All or nothing: a JSON list of {player_id, amount, payment_date,
+    # payment_method, recipient_id}, recorded in one transaction
+    payload = request.get_json(silent=True)
+    items = payload.get('payments') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'expected a non-empty list of payments'}), 400
+    try:
+        items = [{
+            'player_id': int(item['player_id']),
+            'amount': round(float(item['amount']), 2),
+            'payment_date': datetime.strptime(item['payment_date'], '%Y-%m-%d').date(),
+            'payment_method': item.get('payment_method') or None,
+            'recipient_id': int(item['recipient_id']) if item.get('recipient_id') else None
+        } for item in items]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'invalid payment: {e}'}), 400
+    for i, item in enumerate(items):
+        # float() takes 'nan', 'inf' and '1e400'; none of them is a payment
+        if not math.isfinite(item['amount']) or item['amount'] == 0:
+            return jsonify({'error': 'invalid payment: amount must be a finite, non-zero number', 'index': i}), 400
+        if item['recipient_id'] == item['player_id']:
+            return jsonify({'error': 'invalid payment: a player cannot pay themselves', 'index': i}), 400
+
+    referenced = {item['player_id'] for item in items} | {item['recipient_id'] for item in items if item['recipient_id']}
+    unknown = referenced - {pid for (pid,) in db.session.query(Player.id).filter(Player.id.in_(referenced))}
+    if unknown:
+        return jsonify({'error': 'unknown players', 'player_ids': sorted(unknown)}), 400
+
+    def record_bulk():
+        player_ids = record_payments(items)
+        db.session.commit()
+        return player_ids
+
+    try:
+        player_ids = run_with_retries(record_bulk)
+    except (IntegrityError, OperationalError) as e:
+        # Nothing was recorded; a constraint failure is the request's fault,
+        # a database that stayed busy through the retries is not
+        db.session.rollback()
+        status = 409 if isinstance(e, IntegrityError) else 503
+        return jsonify({'error': f'payments not recorded: {str(e.orig).splitlines()[0]}'}), status
+    announce_change('payment', player_ids)
+    return jsonify({'recorded': len(items), 'total': round(sum(item['amount'] for item in items), 2),
+                    'player_ids': player_ids}), 201
+
+@app.route('/payments/import', methods=['GET', 'POST'])
+@admin_required
+def import_payments():
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            flash('No file selected', 'error')
+            return redirect(request.url)
+        if not file.filename.endswith('.csv'):
+            flash('Please upload a CSV file', 'error')
+            return redirect(request.url)
+
+        # Match in the background; the review page waits for the job
+        upload_path = os.path.join(app.config['UPLOAD_FOLDER'],
+                                   f'payments_{uuid.uuid4().hex}_{secure_filename(file.filename)}')
+        file.save(upload_path)
+        job_id = jobs.submit('parse_payments', parse_payment_import, upload_path,
+                             request.form.get('payment_date') or None, request.form.get('payment_method') or None)
+        return redirect(url_for('payment_import_review', job_id=job_id))
+
+    return render_template('import_payments.html')
+
+@app.route('/payments/import/<job_id>')
+@admin_required
+def payment_import_review(job_id):
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'parse_payments':
+        flash('Import not found. Please upload the file again.', 'error')
+        return redirect(url_for('import_payments'))
+    if job['status'] == 'failed':
+        flash(f"Error processing file: {job['error']}", 'error')
+        return redirect(url_for('import_payments'))
+    if job['status'] != 'done':
+        return render_template('job_progress.html', job=job, title='Matching Payments')
+
+    all_players = db.session.query(Player.id, Player.name).order_by(Player.name).all()
+    return render_template('confirm_payments.html', job_id=job_id, all_players=all_players, **job['result'])
+
+@app.route('/payments/import/confirm', methods=['POST'])
+@admin_required
+def confirm_payment_import():
+    job_id = request.form.get('job_id', '')
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'parse_payments' or job['status'] != 'done':
+        flash('Import not found. Please upload the file again.', 'error')
+        return redirect(url_for('import_payments'))
+    review = redirect(url_for('payment_import_review', job_id=job_id))
+
+    include = set(request.form.getlist('include', type=int))
+    known = {pid for (pid,) in db.session.query(Player.id).all()}
+    items, chosen = [], []
+    for row in job['result']['rows']:
+        if row['row'] not in include or row['status'] == 'invalid':
+            continue
+        player_id = request.form.get(f"player_{row['row']}", type=int) or row['player_id']
+        recipient_id = (request.form.get(f"recipient_{row['row']}", type=int) or row['recipient_id']) if row['recipient'] else None
+        if player_id not in known or (row['recipient'] and recipient_id not in known):
+            flash(f"Row {row['row']} ({row['name']}): choose a player or untick the row.", 'error')
+            return review
+        if player_id != row['player_id']:
+            chosen.append((player_id, row['name']))
+        items.append({'row': row['row'], 'status': row['status'], 'player_id': player_id,
+                      'recipient_id': recipient_id, 'amount': round(row['amount'], 2),
+                      'payment_date': date.fromisoformat(row['date']), 'payment_method': row['method'] or None})
+    if not items:
+        flash('No payments selected.', 'error')
+        return review
+
+    try:
+        def record_import():
+            import pandas as pd
+            import reconcile
+
+            lock_players([item['player_id'] for item in items])
+            # Rows that have gone in since the review (a resubmitted form or a
+            # second import of the same statement) aren't recorded twice.  The
+            # check pairs the whole statement again, ticked or not, the rows
+            # matched at review first, so the n-th repeat of a payment pairs
+            # as it did on the review page; rows already flagged as recorded
+            # there were ticked on purpose
+            ticked = {item['row']: item for item in items}
+            check = pd.DataFrame([{'row': row['row'], 'reviewed': row['status'],
+                                   'player_id': ticked[row['row']]['player_id'] if row['row'] in ticked else row['player_id'],
+                                   'date': date.fromisoformat(row['date']), 'amount': round(row['amount'], 2),
+                                   'unmatched': row['status'] == 'unmatched', 'status': 'ready'}
+                                  for row in job['result']['rows']
+                                  if row['status'] != 'invalid' and (row['row'] in ticked or row['player_id'])])
+            check = check.sort_values(['unmatched', 'row'])
+            existing = db.session.query(Payment.player_id, Payment.payment_date, Payment.amount).filter(
+                Payment.player_id.in_({int(pid) for pid in check['player_id']}),
+                Payment.payment_date >= check['date'].min(), Payment.payment_date <= check['date'].max()
+            ).all()
+            paired = reconcile.mark_recorded(check, existing)
+            duplicates = (paired['row'].isin(ticked) & (paired['reviewed'] != 'recorded')
+                          & (paired['status'] == 'recorded')).sum()
+            if duplicates:
+                flash(f'{duplicates} of the selected payments are already in the ledger; '
+                      'this statement may have been imported already. Please review it again.', 'error')
+                return review
+
+            for player_id, name in chosen:
+                record_alias(Player.query.get(player_id), name)
+            player_ids = record_payments(items)
+            db.session.commit()
+            announce_change('payment', player_ids)
+            flash(f"Recorded {len(items)} payments totalling ${sum(item['amount'] for item in items):,.2f}.", 'success')
+            return redirect(url_for('ledger'))
+
+        return run_with_retries(record_import)
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error recording payments: {str(e)}', 'error')
+        return review
+
+LEADERBOARD_WINDOWS = {
+    'month': 'This Month',
+    'year': 'This Year',
+    'last_n': 'Last N Games',
+    'all': 'All Time'
+}
+
+@app.route('/leaderboard')
+def leaderboard():
+    window = request.args.get('window', 'month')
+    if window not in LEADERBOARD_WINDOWS:
+        window = 'month'
+    n_games = request.args.get('n', 10, type=int)
+    n_games = max(1, min(n_games or 10, 1000))
+    from leaderboard import month_index, rank
+    
+    def compute():
+        rollups = get_rollup_index()
+        today = datetime.utcnow().date()
+        current_month = month_index(today)
+        
+        if window == 'month':
+            return rank(*rollups.window(current_month, current_month))
+        if window == 'year':
+            return rank(*rollups.window(month_index(date(today.year, 1, 1)), current_month))
+        if window == 'all':
+            return rank(*rollups.window())
+        
+        # Last N games: whole months after the cutoff come from the rollups,
+        # only the cutoff month itself is summed from LedgerEntry
+        recent_games = db.session.query(Game.game_date, Game.sequence).order_by(
+            Game.game_date.desc(), Game.sequence.desc()).limit(n_games).all()
+        if not recent_games:
+            return []
+        cutoff, cutoff_sequence = recent_games[-1]
+        cutoff_month = month_index(cutoff)
+        player_ids, net, games = rollups.window(cutoff_month + 1, None)
+        totals = {pid: [n, g] for pid, n, g in zip(player_ids.tolist(), net.tolist(), games.tolist())}
+        _, month_end = month_bounds(cutoff_month)
+        partial = db.session.query(
+            LedgerEntry.player_id,
+            db.func.sum(LedgerEntry.net_profit),
+            db.func.count(LedgerEntry.id)
+        ).join(Game, Game.id == LedgerEntry.game_id).filter(
+            db.or_(LedgerEntry.game_date > cutoff,
+                   db.and_(LedgerEntry.game_date == cutoff, Game.sequence >= cutoff_sequence)),
+            LedgerEntry.game_date < month_end
+        ).group_by(LedgerEntry.player_id).all()
+        for player_id, partial_net, partial_games in partial:
+            total = totals.setdefault(player_id, [0.0, 0])
+            total[0] += partial_net or 0.0
+            total[1] += partial_games
+        return rank(list(totals), [t[0] for t in totals.values()], [t[1] for t in totals.values()])
+    
+    cache_key = ('leaderboard', window, n_games if window == 'last_n' else None, datetime.utcnow().date())
+    rankings = data_cache.get(cache_key, get_data_version(), compute)
+    
+    players = {p.id: p for p in Player.query.filter(Player.id.in_([r['player_id'] for r in rankings])).all()}
+    leaderboard_data = [dict(r, player=players[r['player_id']]) for r in rankings if r['player_id'] in players]
+    
+    return render_template('leaderboard.html',
+                           leaderboard_data=leaderboard_data,
+                           window=window,
+                           windows=LEADERBOARD_WINDOWS,
+                           n_games=n_games)
+
+def aging_as_of():
+    # ?as_of=YYYY-MM-DD, default today; ValueError on a bad date
+    date_str = request.args.get('as_of')
+    return datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else datetime.utcnow().date()
+
+@app.route('/aging')
+def aging():
+    from aging import BUCKETS
+    try:
+        as_of = aging_as_of()
+    except ValueError:
+        flash('Invalid date, expected YYYY-MM-DD', 'error')
+        return redirect(url_for('aging'))
+    
+    report = get_aging_report(as_of)
+    rows = report.rows()
+    players = {p.id: p for p in Player.query.filter(Player.id.in_([r['player_id'] for r in rows])).all()} if rows else {}
+    aging_data = [dict(r, player=players[r['player_id']], oldest=date.fromordinal(r['oldest_ordinal']))
+                  for r in rows if r['player_id'] in players]
+    
+    return render_template('aging.html',
+                           aging_data=aging_data,
+                           totals=report.totals(),
+                           buckets=[label for label, _, _ in BUCKETS],
+                           as_of=as_of)
+
+@app.route('/settle')
+def settle():
+    respect_methods = request.args.get('respect_methods') == '1'
+    # Read before the balances, so a change in between makes the plan stale
+    data_version = get_data_version()
+    players = {p.id: p for p in Player.query.all()}
+    balances = get_player_balances()
+    remaining = {pid: data['remaining_payment'] for pid, data in balances.items()}
+    methods = {pid: p.preferred_payment_method for pid, p in players.items()}
+    
+    transfers, unsettled = plan_settlement(remaining, methods, respect_methods=respect_methods)
+    settlement_data = [{
+        'payer': players[t.payer_id],
+        'recipient': players[t.recipient_id],
+        'amount': t.amount,
+        'method': t.method
+    } for t in transfers]
+    
+    return render_template('settle.html',
+                           transfers=settlement_data,
+                           unsettled=unsettled,
+                           respect_methods=respect_methods,
+                           data_version=data_version,
+                           today=datetime.utcnow().date())
+
+@app.route('/settle/record', methods=['POST'])
+@admin_required
+def record_settlement():
+    transfers_data = request.form.getlist('transfers')
+    payment_date = datetime.strptime(request.form.get('payment_date'), '%Y-%m-%d').date()
+    
+    try:
+        # The plan is only good for the balances it was built from; any
+        # commit since, including this plan recorded once already (a double
+        # click, a resubmitted form), bumps the data version.  POSTs on
+        # SQLite run one at a time, and FOR UPDATE queues them on PostgreSQL.
+        current_version = db.session.execute(
+            db.select(DataVersion.version).where(DataVersion.id == 1).with_for_update()
+        ).scalar() or 0
+        if request.form.get('data_version') != str(current_version):
+            db.session.rollback()
+            flash('Balances have changed since this settlement plan was made, please review it again.', 'error')
+            return redirect(url_for('settle'))
+        known_ids = {pid for (pid,) in db.session.query(Player.id).all()}
+        touched = []
+        for transfer_data in transfers_data:
+            payer_id, recipient_id, amount, method = transfer_data.split('|')
+            payer_id, recipient_id, amount = int(payer_id), int(recipient_id), float(amount)
+            if payer_id not in known_ids or recipient_id not in known_ids:
+                flash('Settlement plan is out of date, please review it again.', 'error')
+                return redirect(url_for('settle'))
+            # Same linked record as a transfer made through add_payment
+            record_transfer(payer_id, recipient_id, amount, payment_date, method or None)
+            touched += [payer_id, recipient_id]
+        
+        db.session.commit()
+        announce_change('payment', touched)
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error recording settlement: {str(e)}', 'error')
+        return redirect(url_for('settle'))
+    
+    flash(f'Recorded {len(transfers_data)} settlement transfers!', 'success')
+    return redirect(url_for('ledger'))
+
 @app.route('/edit_ledger_entry', methods=['POST'])
 @admin_required
 def edit_ledger_entry():
@@ -459,11 +1808,12 @@ def edit_ledger_entry():
     net_profit = float(request.form.get('net_profit'))
     
     entry = LedgerEntry.query.get_or_404(int(entry_id))
+    lock_players([entry.player_id])
     old_net = entry.net_profit
     entry.net_profit = net_profit
     
     # Recalculate running balance for this entry and all subsequent entries
-    player_entries = LedgerEntry.query.filter_by(player_id=entry.player_id).order_by(LedgerEntry.game_date).all()
+    player_entries = LedgerEntry.query.filter_by(player_id=entry.player_id).order_by(LedgerEntry.game_date, LedgerEntry.id).all()
     
     running_balance = 0.0
     for e in player_entries:
@@ -473,7 +1823,15 @@ def edit_ledger_entry():
             running_balance += e.net_profit
         e.running_balance = running_balance
     
+    from leaderboard import month_index
+    db.session.flush()
+    refresh_rollups([entry.player_id], [month_index(entry.game_date)])
+    refresh_game_totals([entry.game_id])
+    journal.record('edit', entry.player_id, entry.game_date, net_profit - (old_net or 0.0),
+                   old_net=old_net, new_net=net_profit)
+    
     db.session.commit()
+    announce_change('edit', [entry.player_id], entry.game_date)
     flash('Ledger entry updated successfully!', 'success')
     return redirect(url_for('player_detail', player_id=entry.player_id))
 
@@ -482,9 +1840,10 @@ def edit_ledger_entry():
 def clear_ledger():
     player_id = request.form.get('player_id')
     player = Player.query.get_or_404(int(player_id))
+    lock_players([player.id])
     
     # Get current balance
-    latest_entry = LedgerEntry.query.filter_by(player_id=player.id).order_by(LedgerEntry.game_date.desc()).first()
+    latest_entry = LedgerEntry.query.filter_by(player_id=player.id).order_by(LedgerEntry.game_date.desc(), LedgerEntry.id.desc()).first()
     final_balance = latest_entry.running_balance if latest_entry else 0.0
     
     # Add to history
@@ -494,59 +1853,189 @@ def clear_ledger():
         cleared_date=datetime.utcnow().date()
     )
     db.session.add(history_entry)
+    journal.record('clear', player.id, history_entry.cleared_date, final_balance, name=player.name)
+    archive_player(player, history_entry)
     
     # Delete all ledger entries and payments for this player
-    LedgerEntry.query.filter_by(player_id=player.id).delete()
-    Payment.query.filter_by(player_id=player.id).delete()
+    game_ids = [game_id for (game_id,) in db.session.query(LedgerEntry.game_id).filter_by(player_id=player.id).all()]
+    LedgerEntry.query.filter_by(player_id=player.id).execution_options(player_ids=[player.id]).delete()
+    Payment.query.filter_by(player_id=player.id).execution_options(player_ids=[player.id]).delete()
+    # Counterparties keep their side of the player's transfers
+    Transfer.query.filter_by(payer_id=player.id).update({Transfer.payer_id: None}, synchronize_session=False)
+    Transfer.query.filter_by(recipient_id=player.id).update({Transfer.recipient_id: None}, synchronize_session=False)
+    PlayerAlias.query.filter_by(player_id=player.id).delete()
+    MonthlyRollup.query.filter_by(player_id=player.id).delete()
+    refresh_game_totals(game_ids)
     
     # Delete the player
     db.session.delete(player)
     db.session.commit()
+    announce_change('clear', [int(player_id)])
     
     flash(f'Ledger cleared for {player.name}!', 'success')
     return redirect(url_for('ledger'))
 
+def archive_player(player, history_entry):
+    # Pack the player's games and payments into the cold archive before
+    # they are deleted from the hot tables
+    entries = db.session.query(*[getattr(LedgerEntry, f) for f in archive.ENTRY_FIELDS]).filter(
+        LedgerEntry.player_id == player.id).order_by(LedgerEntry.game_date, LedgerEntry.id).all()
+    payments = db.session.query(*[getattr(Payment, f) for f in archive.PAYMENT_FIELDS]).filter(
+        Payment.player_id == player.id).order_by(Payment.payment_date, Payment.id).all()
+    db.session.add(ArchivedLedger(
+        history=history_entry,
+        player_id=player.id,
+        game_count=len(entries),
+        payment_count=len(payments),
+        first_game=entries[0].game_date if entries else None,
+        last_game=entries[-1].game_date if entries else None,
+        ledger_entries=archive.pack(entries, archive.ENTRY_FIELDS),
+        payments=archive.pack(payments, archive.PAYMENT_FIELDS)
+    ))
+
+def summed(a, b):
+    # a + b, treating NULL as 0 unless both are NULL
+    return db.case((db.and_(a.is_(None), b.is_(None)), None),
+                   else_=db.func.coalesce(a, 0.0) + db.func.coalesce(b, 0.0))
+
+def merge_player_into(source, target):
+    # Fold the duplicate player ``source`` into ``target`` with bulk
+    # statements: games both played are summed into target's entry, every
+    # other row is re-pointed, then target's balance chain is rebuilt
+    player_ids = [source.id, target.id]
+    lock_players(player_ids)
+
+    source_balance = db.session.query(LedgerEntry.running_balance).filter_by(player_id=source.id).order_by(
+        LedgerEntry.game_date.desc(), LedgerEntry.id.desc()).limit(1).scalar() or 0.0
+    clash = db.aliased(LedgerEntry)
+    shared_games = [game_id for (game_id,) in db.session.query(LedgerEntry.game_id).filter(
+        LedgerEntry.player_id == target.id, LedgerEntry.game_id.isnot(None),
+        LedgerEntry.game_id.in_(db.select(clash.game_id).where(clash.player_id == source.id))
+    ).all()]
+
+    # Games both played: one entry per player per game, so add source's
+    # result to target's and drop source's
+    if shared_games:
+        db.session.execute(
+            db.update(LedgerEntry).where(
+                LedgerEntry.player_id == target.id, LedgerEntry.game_id.in_(shared_games),
+                clash.player_id == source.id, clash.game_id == LedgerEntry.game_id
+            ).values(
+                net_profit=summed(LedgerEntry.net_profit, clash.net_profit),
+                buy_in=summed(LedgerEntry.buy_in, clash.buy_in),
+                buy_out=summed(LedgerEntry.buy_out, clash.buy_out),
+                stack=summed(LedgerEntry.stack, clash.stack)
+            ).execution_options(player_ids=player_ids, synchronize_session=False)
+        )
+        LedgerEntry.query.filter(
+            LedgerEntry.player_id == source.id, LedgerEntry.game_id.in_(shared_games)
+        ).execution_options(player_ids=player_ids).delete(synchronize_session=False)
+
+    moved = {
+        'games': LedgerEntry.query.filter_by(player_id=source.id).execution_options(player_ids=player_ids).update(
+            {LedgerEntry.player_id: target.id}, synchronize_session=False),
+        'payments': Payment.query.filter_by(player_id=source.id).execution_options(player_ids=player_ids).update(
+            {Payment.player_id: target.id}, synchronize_session=False),
+        'shared_games': len(shared_games),
+    }
+
+    # Transfers between the two are now a player paying themselves; their
+    # legs stay as payments that cancel out, without the transfer
+    between = db.select(Transfer.id).where(db.or_(
+        db.and_(Transfer.payer_id == source.id, Transfer.recipient_id == target.id),
+        db.and_(Transfer.payer_id == target.id, Transfer.recipient_id == source.id)))
+    Payment.query.filter(Payment.transfer_id.in_(between)).execution_options(player_ids=player_ids).update(
+        {Payment.transfer_id: None}, synchronize_session=False)
+    Transfer.query.filter(Transfer.id.in_(between)).delete(synchronize_session=False)
+    Transfer.query.filter_by(payer_id=source.id).update({Transfer.payer_id: target.id}, synchronize_session=False)
+    Transfer.query.filter_by(recipient_id=source.id).update({Transfer.recipient_id: target.id}, synchronize_session=False)
+
+    # Source's nicknames, and its name, now suggest target
+    target_aliases = db.select(db.func.lower(PlayerAlias.alias)).where(PlayerAlias.player_id == target.id)
+    PlayerAlias.query.filter(
+        PlayerAlias.player_id == source.id, db.func.lower(PlayerAlias.alias).in_(target_aliases)
+    ).delete(synchronize_session=False)
+    PlayerAlias.query.filter_by(player_id=source.id).update({PlayerAlias.player_id: target.id}, synchronize_session=False)
+    record_alias(target, source.name)
+    target.preferred_payment_method = target.preferred_payment_method or source.preferred_payment_method
+    target.payment_id = target.payment_id or source.payment_id
+
+    rebuild_running_balances([target.id])
+    rebuild_player_rollups(player_ids)
+    refresh_game_totals(shared_games)
+    journal.record('merge', target.id, datetime.utcnow().date(), source_balance, source.id,
+                   name=target.name, merged_name=source.name, **moved)
+    db.session.delete(source)
+    return moved
+
+@app.route('/players/merge', methods=['POST'])
+@admin_required
+def merge_players():
+    target = Player.query.get_or_404(request.form.get('target_id', type=int))
+    source = Player.query.get_or_404(request.form.get('source_id', type=int))
+    if source.id == target.id:
+        flash('Choose a different player to merge.', 'error')
+        return redirect(url_for('player_detail', player_id=target.id))
+    source_id, source_name, target_id = source.id, source.name, target.id
+
+    def merge():
+        moved = merge_player_into(Player.query.get(source_id), Player.query.get(target_id))
+        db.session.commit()
+        return moved
+
+    try:
+        moved = run_with_retries(merge)
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error merging players: {str(e)}', 'error')
+        return redirect(url_for('player_detail', player_id=target_id))
+    announce_change('merge', [source_id, target_id])
+    flash(f"Merged {source_name} into {Player.query.get(target_id).name}: moved {moved['games']} games and "
+          f"{moved['payments']} payments, and combined {moved['shared_games']} games they both played.", 'success')
+    return redirect(url_for('player_detail', player_id=target_id))
+
 @app.route('/history')
 def history():
     history_entries = LedgerHistory.query.order_by(LedgerHistory.cleared_date.desc()).all()
-    return render_template('history.html', history_entries=history_entries)
+    # Just the archive summaries; the packed rows load on the detail page
+    archives = {row.history_id: row for row in db.session.query(
+        ArchivedLedger.history_id, ArchivedLedger.game_count, ArchivedLedger.payment_count,
+        ArchivedLedger.first_game, ArchivedLedger.last_game
+    ).all()}
+    return render_template('history.html', history_entries=history_entries, archives=archives)
+
+@app.route('/history/<int:history_id>')
+def history_detail(history_id):
+    history_entry = LedgerHistory.query.get_or_404(history_id)
+    archived = history_entry.archive
+    ledger_entries = archive.unpack(archived.ledger_entries) if archived else []
+    payments = archive.unpack(archived.payments) if archived else []
+    ledger_entries.reverse()
+    payments.reverse()
+    return render_template('history_detail.html', history_entry=history_entry, archived=archived,
+                           ledger_entries=ledger_entries, payments=payments,
+                           total_net_profit=sum(e['net_profit'] or 0.0 for e in ledger_entries),
+                           total_payments=sum(p['amount'] for p in payments))
 
 @app.route('/export')
 def export_data():
-    # Export current ledger data
-    players = Player.query.all()
-    export_data = []
-    
-    for player in players:
-        latest_entry = LedgerEntry.query.filter_by(player_id=player.id).order_by(LedgerEntry.game_date.desc()).first()
-        total_payments = db.session.query(db.func.sum(Payment.amount)).filter_by(player_id=player.id).scalar() or 0.0
-        
-        current_balance = latest_entry.running_balance if latest_entry else 0.0
-        remaining_payment = current_balance - total_payments
-        
-        export_data.append({
-            'Player Name': player.name,
-            'Preferred Payment Method': player.preferred_payment_method or 'Not set',
-            'Payment ID': player.payment_id or 'Not set',
-            'Current Balance': current_balance,
-            'Total Payments': total_payments,
-            'Remaining Payment': remaining_payment,
-            'Last Game': latest_entry.game_date.strftime('%Y-%m-%d') if latest_entry else 'N/A'
-        })
-    
-    # Convert to DataFrame and save as CSV
-    df = pd.DataFrame(export_data)
-    export_path = os.path.join(app.config['UPLOAD_FOLDER'], f'ledger_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
-    df.to_csv(export_path, index=False)
-    
-    return jsonify({'success': True, 'file': export_path})
+    # Runs as a background job; poll status_url for the file
+    job_id = jobs.submit('export_ledger', export_ledger)
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+@app.route('/admin/import', methods=['POST'])
+@admin_required
+def admin_import():
+    # Restore the newest export in database_export/ (see import_data.py)
+    job_id = jobs.submit('import_data', import_export_files)
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
 
 @app.route('/debug_player/<int:player_id>')
 def debug_player(player_id):
     player = Player.query.get_or_404(player_id)
     
     # Get all ledger entries
-    ledger_entries = LedgerEntry.query.filter_by(player_id=player_id).order_by(LedgerEntry.game_date.desc()).all()
+    ledger_entries = LedgerEntry.query.filter_by(player_id=player_id).order_by(LedgerEntry.game_date.desc(), LedgerEntry.id.desc()).all()
     
     # Get all payments
     payments = Payment.query.filter_by(player_id=player_id).order_by(Payment.payment_date.desc()).all()
@@ -598,11 +2087,118 @@ def api_players():
     players = Player.query.all()
     return jsonify([{'id': p.id, 'name': p.name} for p in players])
 
+@app.route('/api/balance_as_of')
+def api_balance_as_of():
+    date_str = request.args.get('date')
+    try:
+        as_of = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, expected YYYY-MM-DD'}), 400
+    
+    timeline = get_balance_timeline()
+    player_id = request.args.get('player_id', type=int)
+    
+    if player_id is not None:
+        player = Player.query.get_or_404(player_id)
+        balance = timeline.as_of(player.id, as_of.toordinal())
+        last_game = balance.pop('last_game_ordinal')
+        return jsonify(dict(
+            balance,
+            player_id=player.id,
+            player_name=player.name,
+            as_of=as_of.isoformat(),
+            last_game=date.fromordinal(last_game).isoformat() if last_game else None
+        ))
+    
+    players = dict(db.session.query(Player.id, Player.name).all())
+    balances = timeline.all_as_of(as_of.toordinal(), players)
+    return jsonify({
+        'as_of': as_of.isoformat(),
+        'players': [
+            dict(balances[pid], player_id=pid, player_name=name)
+            for pid, name in sorted(players.items(), key=lambda item: item[1].lower())
+        ]
+    })
+
+@app.route('/api/aging')
+def api_aging():
+    from aging import BUCKETS
+    try:
+        as_of = aging_as_of()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, expected YYYY-MM-DD'}), 400
+    
+    player_id = request.args.get('player_id', type=int)
+    if player_id is not None:
+        player_id = Player.query.get_or_404(player_id).id
+    report = get_aging_report(as_of, player_id)
+    rows = report.rows()
+    names = dict(db.session.query(Player.id, Player.name).filter(
+        Player.id.in_([r['player_id'] for r in rows])).all()) if rows else {}
+    players = []
+    for row in rows:
+        oldest = row.pop('oldest_ordinal')
+        players.append(dict(row, player_name=names.get(row['player_id']),
+                            oldest_unpaid=date.fromordinal(oldest).isoformat(),
+                            buckets={label: round(amount, 2) for label, amount in row['buckets'].items()},
+                            outstanding=round(row['outstanding'], 2), average_age=round(row['average_age'], 1)))
+    totals = report.totals()
+    return jsonify({
+        'as_of': as_of.isoformat(),
+        'buckets': [label for label, _, _ in BUCKETS],
+        'totals': {label: round(amount, 2) for label, amount in totals.items()},
+        'players': players
+    })
+
+@app.route('/api/transfers/net')
+def api_transfer_net():
+    # Net flow between two players: positive when player_id has paid other_id more
+    player_id = request.args.get('player_id', type=int)
+    other_id = request.args.get('other_id', type=int)
+    if player_id is None or other_id is None:
+        return jsonify({'error': 'player_id and other_id are required'}), 400
+    return jsonify(dict(pairwise_flow(player_id, other_id), player_id=player_id, other_id=other_id))
+
+@app.route('/api/players/<int:player_id>/counterparties')
+def api_counterparties(player_id):
+    player = Player.query.get_or_404(player_id)
+    return jsonify({'player_id': player.id, 'player_name': player.name,
+                    'counterparties': counterparties(player.id)})
+
+@app.route('/api/journal')
+@admin_required
+def api_journal():
+    # Audit trail: events after ?after=<id>, optionally for one player
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    events = journal.history(request.args.get('after', 0, type=int), limit,
+                             request.args.get('player_id', type=int))
+    return jsonify({'events': events, 'next_after': events[-1]['id'] if events else None})
+
+@app.route('/api/journal/state')
+@admin_required
+def api_journal_state():
+    # Every player's balances after ?event_id=N or as of ?at=<ISO timestamp>, replayed from the journal
+    at = request.args.get('at')
+    try:
+        at = datetime.fromisoformat(at) if at else None
+    except ValueError:
+        return jsonify({'error': 'Invalid timestamp, expected ISO 8601'}), 400
+    state = journal.state(request.args.get('event_id', type=int), at)
+    players = state.pop('players')
+    state['players'] = [
+        {'player_id': pid, 'player_name': name, 'current_balance': round(balance, 2),
+         'total_payments': round(payments, 2), 'remaining_payment': round(balance + payments, 2),
+         'latest_game': latest_game}
+        for pid, (name, balance, payments, latest_game) in sorted(players.items())
+    ]
+    return jsonify(state)
+
 @app.route('/calendar')
 def calendar():
-    # Get all unique game dates
-    game_dates = db.session.query(LedgerEntry.game_date).distinct().order_by(LedgerEntry.game_date.desc()).all()
-    game_dates = [date[0] for date in game_dates]
+    # Game dates and how many games each had, from the game table
+    games_on = dict(db.session.query(Game.game_date, db.func.count(Game.id)).group_by(
+        Game.game_date).order_by(Game.game_date.desc()).all())
+    game_dates = list(games_on)
     
     # Group dates by year and month for easier display
     calendar_data = {}
@@ -615,7 +2211,8 @@ def calendar():
             calendar_data[year][month] = []
         calendar_data[year][month].append(date)
     
-    return render_template('calendar.html', calendar_data=calendar_data)
+    return render_template('calendar.html', calendar_data=calendar_data, games_on=games_on,
+                           total_games=sum(games_on.values()))
 
 @app.route('/game/<date>')
 def game_detail(date):
@@ -625,27 +2222,80 @@ def game_detail(date):
         flash('Invalid date format', 'error')
         return redirect(url_for('calendar'))
     
-    # Get all players who played on this date
-    entries = LedgerEntry.query.filter_by(game_date=game_date).all()
-    
-    if not entries:
+    games = Game.query.filter_by(game_date=game_date).order_by(Game.sequence).all()
+    if not games:
         flash(f'No game data found for {date}', 'error')
         return redirect(url_for('calendar'))
     
-    # Get player details for each entry
+    return render_template('game_detail.html', game_date=game_date, games=games,
+                           game_data=game_rows(game_date), live_version=get_data_version())
+
+@app.route('/game/<date>/remove', methods=['POST'])
+@admin_required
+def remove_game(date):
+    # Undo a wrong upload: every game on the date, or the one in game_id
+    try:
+        game_date = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date format', 'error')
+        return redirect(url_for('calendar'))
+    replace = request.form.get('game_id') or 'all'
+    
+    def remove():
+        lock_game_date(game_date)
+        games = games_to_replace(game_date, replace)
+        if games is None:
+            return [], []
+        sequences = [game.sequence for game in games]
+        player_ids = remove_games(games)
+        db.session.commit()
+        return sequences, player_ids
+    
+    try:
+        sequences, player_ids = run_with_retries(remove)
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error removing game: {str(e)}', 'error')
+        return redirect(url_for('game_detail', date=date))
+    if not sequences:
+        flash(f'No game to remove on {date}', 'error')
+        return redirect(url_for('calendar'))
+    announce_change('undo', player_ids, game_date)
+    flash(f'Removed {len(sequences)} game{"s" if len(sequences) != 1 else ""} on {date} '
+          f'and adjusted the balances of {len(player_ids)} players.', 'success')
+    if Game.query.filter_by(game_date=game_date).first():
+        return redirect(url_for('game_detail', date=date))
+    return redirect(url_for('calendar'))
+
+@app.route('/game/<date>/rows')
+def game_row_fragments(date):
+    # Re-rendered player rows for the live game page
+    try:
+        game_date = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'invalid date'}), 400
+    return jsonify({'html': render_template('_game_rows.html', game_data=game_rows(game_date))})
+
+def game_rows(game_date):
+    # Every player result on this date, with its player and game number
+    entries = db.session.query(LedgerEntry, Player, Game.sequence).join(
+        Player, Player.id == LedgerEntry.player_id
+    ).outerjoin(Game, Game.id == LedgerEntry.game_id).filter(LedgerEntry.game_date == game_date).all()
+    
     game_data = []
-    for entry in entries:
-        player = Player.query.get(entry.player_id)
+    for entry, player, sequence in entries:
         game_data.append({
             'player': player,
             'net_profit': entry.net_profit,
-            'entry_id': entry.id
+            'buy_in': entry.buy_in,
+            'buy_out': entry.buy_out,
+            'entry_id': entry.id,
+            'game_sequence': sequence
         })
     
-    # Sort by net profit (highest to lowest)
-    game_data.sort(key=lambda x: x['net_profit'], reverse=True)
-    
-    return render_template('game_detail.html', game_date=game_date, game_data=game_data)
+    # Game by game, then by net profit (highest to lowest)
+    game_data.sort(key=lambda x: (x['game_sequence'] or 0, -(x['net_profit'] or 0.0)))
+    return game_data
 
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -667,6 +2317,8 @@ def admin_logout():
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
+    from migrate import run_migrations
     with app.app_context():
-        db.create_all()
+        run_migrations(db)
+        ensure_rollups()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
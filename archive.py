@@ -0,0 +1,51 @@
+"""
+Compressed cold storage for cleared players' games and payments.
+
+Clearing a player moves their LedgerEntry and Payment rows out of the hot
+tables, which every page queries, into one archived_ledger row per clear
+next to its LedgerHistory total.  The rows are stored column by column as
+JSON and zlib-compressed: dates as day numbers, repeated payment methods
+and similar runs of values compress to a few bytes each.  Nothing reads
+the archive except the /history detail page, which unpacks one player on
+demand.
+"""
+import json
+import zlib
+from datetime import date, datetime
+
+ENTRY_FIELDS = ('game_date', 'net_profit', 'running_balance', 'created_at')
+PAYMENT_FIELDS = ('payment_date', 'amount', 'payment_method', 'created_at')
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.toordinal()
+    return value
+
+
+def _decode(field, value):
+    if value is None:
+        return None
+    if field.endswith('_date'):
+        return date.fromordinal(value)
+    if field == 'created_at':
+        return datetime.fromisoformat(value)
+    return value
+
+
+def pack(rows, fields):
+    """Compress rows (objects or named tuples with ``fields``) column by column."""
+    columns = {field: [_encode(getattr(row, field)) for row in rows] for field in fields}
+    return zlib.compress(json.dumps(columns, separators=(',', ':')).encode(), 9)
+
+
+def unpack(blob):
+    """The rows packed by pack(), as dicts."""
+    if not blob:
+        return []
+    columns = json.loads(zlib.decompress(blob))
+    fields = list(columns)
+    decoded = [[_decode(field, value) for value in columns[field]] for field in fields]
+    return [dict(zip(fields, values)) for values in zip(*decoded)]
@@ -0,0 +1,100 @@
+"""
+Point-in-time ("as of date") balance lookups.
+
+Ledger entries are kept as per-player segments of (game date, running
+balance) sorted by date, and payments as per-player segments of (payment
+date, cumulative amount).  A lookup is a binary search in each segment, so
+answering "what did I owe on June 1st?" never replays history.
+"""
+import numpy as np
+
+
+class _Segments:
+    """Per-player sorted date arrays with an associated value at each date."""
+
+    def __init__(self, player_ids, ordinals, values, cumulative=False):
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        order = np.lexsort((ordinals, player_ids))
+        self.player_ids = player_ids[order]
+        self.ordinals = ordinals[order]
+        self.values = values[order]
+
+        self.unique_ids, starts = np.unique(self.player_ids, return_index=True)
+        self.starts = starts
+        self.ends = np.r_[starts[1:], len(self.player_ids)]
+        self._segment = {pid: i for i, pid in enumerate(self.unique_ids.tolist())}
+        segment_of = np.repeat(np.arange(len(starts)), self.ends - self.starts)
+
+        if cumulative and len(self.values):
+            # Running total within each player, restarting at every segment
+            totals = np.cumsum(self.values)
+            offsets = np.where(starts > 0, totals[np.maximum(starts - 1, 0)], 0.0)
+            self.values = totals - offsets[segment_of]
+
+        # Composite (segment, date) key lets every player be searched at once
+        self._stride = int(self.ordinals.max()) + 2 if len(self.ordinals) else 1
+        self._keys = segment_of * self._stride + self.ordinals
+
+    def value_at(self, player_id, ordinal):
+        """Value at the last date <= ordinal for one player, or (0.0, None)."""
+        segment = self._segment.get(player_id)
+        if segment is None:
+            return 0.0, None
+        start, end = self.starts[segment], self.ends[segment]
+        pos = start + np.searchsorted(self.ordinals[start:end], ordinal, side='right') - 1
+        if pos < start:
+            return 0.0, None
+        return float(self.values[pos]), int(self.ordinals[pos])
+
+    def values_at(self, ordinal):
+        """Value at the last date <= ordinal for every player, as a dict."""
+        if not len(self.unique_ids):
+            return {}
+        ordinal = min(int(ordinal), self._stride - 1)
+        queries = np.arange(len(self.unique_ids)) * self._stride + ordinal
+        pos = np.searchsorted(self._keys, queries, side='right') - 1
+        found = pos >= self.starts
+        values = np.where(found, self.values[np.maximum(pos, 0)], 0.0)
+        return dict(zip(self.unique_ids.tolist(), values.tolist()))
+
+
+class BalanceTimeline:
+    def __init__(self, entries, payments):
+        """
+        ``entries`` yields (player_id, date_ordinal, running_balance) and
+        ``payments`` yields (player_id, date_ordinal, amount).
+        """
+        entries = list(entries)
+        payments = list(payments)
+        self._games = _Segments([e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries])
+        self._payments = _Segments([p[0] for p in payments], [p[1] for p in payments],
+                                   [p[2] for p in payments], cumulative=True)
+
+    @staticmethod
+    def _summary(game_balance, payments_to_date):
+        remaining = game_balance + payments_to_date
+        if abs(remaining) < 0.01:
+            remaining = 0.0
+        return {
+            'game_balance': game_balance,
+            'payments_to_date': payments_to_date,
+            'remaining_payment': remaining,
+        }
+
+    def as_of(self, player_id, ordinal):
+        game_balance, last_game = self._games.value_at(player_id, ordinal)
+        payments_to_date, _ = self._payments.value_at(player_id, ordinal)
+        summary = self._summary(game_balance, payments_to_date)
+        summary['last_game_ordinal'] = last_game
+        return summary
+
+    def all_as_of(self, ordinal, player_ids=()):
+        games = self._games.values_at(ordinal)
+        payments = self._payments.values_at(ordinal)
+        result = {}
+        for player_id in set(games) | set(payments) | set(player_ids):
+            result[player_id] = self._summary(games.get(player_id, 0.0), payments.get(player_id, 0.0))
+        return result
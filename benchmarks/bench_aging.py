@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark and check for the debt aging report.
+
+Builds a throwaway SQLite database, then times the aging report cold (the
+queries plus the vectorized FIFO match), the match alone, and /aging with
+the report cached.  Checks every player's unpaid total against the ledger's
+remaining payment, and a sample of players' buckets against a plain
+per-player FIFO loop.
+
+Usage: python benchmarks/bench_aging.py [num_players] [games] [payments]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('bench_aging')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+import numpy as np
+
+from aging import BUCKETS, age_debts
+from app import app, db, data_cache, get_aging_report, get_player_balances, LedgerEntry, Payment, Player, Transfer
+
+
+def reference_fifo(events, as_of):
+    """One player's buckets the slow way: walk debts oldest first."""
+    debts = sorted((day, -amount) for day, amount in events if amount < 0 and day <= as_of)
+    credit = sum(amount for day, amount in events if amount > 0 and day <= as_of)
+    buckets = dict.fromkeys([label for label, _, _ in BUCKETS], 0.0)
+    for day, amount in debts:
+        paid = min(credit, amount)
+        credit -= paid
+        if amount - paid >= 0.005:
+            age = max(as_of - day, 0)
+            label = next(label for label, _, last in BUCKETS if last is None or age <= last)
+            buckets[label] += amount - paid
+    return buckets
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    payments = int(sys.argv[3]) if len(sys.argv) > 3 else num_players * 10
+
+    with app.app_context():
+        db.create_all()
+        # Recent games so every bucket gets some debt
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment,
+                               'Transfer': Transfer}, num_players, games=games, payments=payments,
+                          players_per_game=60, start=date(2024, 1, 1), interval_days=1)
+        print(f"Generated {counts}")
+        as_of = db.session.query(db.func.max(LedgerEntry.game_date)).scalar()
+
+        cold_ms, report = timed(lambda: get_aging_report(as_of))
+        rows = lambda model, day, amount: db.session.query(model.player_id, day, amount).all()
+        games_rows = rows(LedgerEntry, LedgerEntry.game_date, LedgerEntry.net_profit)
+        payment_rows = rows(Payment, Payment.payment_date, Payment.amount)
+        columns = lambda rows: (np.array([r[0] for r in rows]), np.array([r[1].toordinal() for r in rows]),
+                                np.array([r[2] for r in rows]))
+        game_columns, payment_columns = columns(games_rows), columns(payment_rows)
+        match_ms, _ = timed(lambda: age_debts(game_columns, payment_columns, as_of.toordinal()), 5)
+
+        failures = []
+        balances = get_player_balances()
+        for player_id, summary in balances.items():
+            owed = max(-summary['remaining_payment'], 0.0)
+            row = report.for_player(player_id)
+            unpaid = row['outstanding'] if row else 0.0
+            if abs(owed - unpaid) > 0.01:
+                failures.append(f'player {player_id}: owes {owed:.2f}, aging has {unpaid:.2f}')
+
+        events = {}
+        for player_id, day, amount in games_rows + payment_rows:
+            events.setdefault(player_id, []).append((day.toordinal(), amount))
+        for player_id in random.Random(1).sample(sorted(events), min(500, len(events))):
+            expected = reference_fifo(events[player_id], as_of.toordinal())
+            row = report.for_player(player_id)
+            got = row['buckets'] if row else dict.fromkeys(expected, 0.0)
+            if any(abs(expected[label] - got[label]) > 0.01 for label in expected):
+                failures.append(f'player {player_id}: buckets {got} vs FIFO {expected}')
+        totals = report.totals()
+
+    client = app.test_client()
+    client.get(f'/aging?as_of={as_of.isoformat()}')
+    page_ms, response = timed(lambda: client.get(f'/aging?as_of={as_of.isoformat()}'), 5)
+    assert response.status_code == 200
+    with app.app_context():
+        data_cache.clear()
+    uncached_ms, _ = timed(lambda: client.get(f'/api/aging?as_of={as_of.isoformat()}'))
+
+    print(f"\n{len(report)} of {num_players} players owe something as of {as_of}:")
+    print('  ' + ', '.join(f'{label} days ${amount:,.2f}' for label, amount in totals.items()))
+    print(f"\naging report, cold (queries + match)  {cold_ms:9.1f} ms")
+    print(f"vectorized FIFO match only            {match_ms:9.1f} ms")
+    print(f"/api/aging after a data change        {uncached_ms:9.1f} ms")
+    print(f"/aging, report cached                 {page_ms:9.1f} ms")
+    print(f"\n{'FAIL: ' + '; '.join(failures[:5]) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
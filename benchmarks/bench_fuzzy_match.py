@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the fuzzy nickname matcher used by the CSV upload page.
+
+Builds a trigram index over a synthetic player list (50k names by default)
+and times suggestion lookups for misspelled / shortened nicknames.
+
+Usage: python benchmarks/bench_fuzzy_match.py [num_players] [num_queries]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_match import NameIndex
+
+FIRST_NAMES = ['jake', 'jacob', 'sarah', 'mike', 'michael', 'chris', 'alex', 'sam',
+               'dan', 'danny', 'matt', 'nick', 'tom', 'kevin', 'brian', 'eric',
+               'jess', 'katie', 'emily', 'ryan', 'josh', 'andy', 'steve', 'tony']
+
+
+def make_names(count, rng):
+    names = set()
+    while len(names) < count:
+        first = rng.choice(FIRST_NAMES)
+        suffix = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 6)))
+        names.add(f'{first.title()} {suffix.title()}{rng.randint(0, 99)}')
+    return sorted(names)
+
+
+def mangle(name, rng):
+    # Drop, swap or duplicate a character, or keep only the first word
+    choice = rng.random()
+    if choice < 0.25:
+        return name.split()[0] + name.split()[1][:3]
+    chars = list(name)
+    i = rng.randrange(len(chars))
+    if choice < 0.5:
+        del chars[i]
+    elif choice < 0.75 and i + 1 < len(chars):
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    else:
+        chars.insert(i, chars[i])
+    return ''.join(chars)
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(42)
+
+    names = make_names(num_players, rng)
+    start = time.perf_counter()
+    index = NameIndex(enumerate(names))
+    build_time = time.perf_counter() - start
+
+    targets = [rng.randrange(num_players) for _ in range(num_queries)]
+    queries = [mangle(names[t], rng) for t in targets]
+
+    timings = []
+    hits = 0
+    for target, query in zip(targets, queries):
+        start = time.perf_counter()
+        suggestions = index.search(query)
+        timings.append(time.perf_counter() - start)
+        if any(s['player_id'] == target for s in suggestions):
+            hits += 1
+
+    timings.sort()
+    print(f"Players indexed:  {num_players}")
+    print(f"Index build:      {build_time * 1000:.1f} ms")
+    print(f"Queries:          {num_queries}")
+    print(f"Mean lookup:      {sum(timings) / len(timings) * 1000:.3f} ms")
+    print(f"p50 lookup:       {timings[len(timings) // 2] * 1000:.3f} ms")
+    print(f"p99 lookup:       {timings[int(len(timings) * 0.99)] * 1000:.3f} ms")
+    print(f"Target in top 5:  {hits / num_queries:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the /leaderboard route on 10 years of weekly games.
+
+Creates a throwaway SQLite database, fills it with weekly games, backfills
+the monthly rollups and compares each leaderboard window against a plain
+GROUP BY scan of LedgerEntry.
+
+Usage: python benchmarks/bench_leaderboard.py [num_players] [players_per_game] [years]
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('bench_leaderboard')
+
+from app import app, db, data_cache, get_rollup_index, Player, LedgerEntry, Payment, rebuild_rollups
+from leaderboard import month_index, rank
+
+
+def scan(start):
+    # What a leaderboard costs without rollups
+    query = db.session.query(LedgerEntry.player_id, db.func.sum(LedgerEntry.net_profit))
+    if start:
+        query = query.filter(LedgerEntry.game_date >= start)
+    return sorted(query.group_by(LedgerEntry.player_id).all(), key=lambda r: -r[1])
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    players_per_game = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    years = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    with app.app_context():
+        db.create_all()
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment},
+                          num_players, games=52 * years + 1, payments=0,
+                          players_per_game=players_per_game,
+                          start=date.today() - timedelta(weeks=52 * years))
+        num_entries = counts['ledger_entries']
+        start = time.perf_counter()
+        rebuild_rollups()
+        backfill = (time.perf_counter() - start) * 1000
+
+        today = date.today()
+        scans = {
+            'month': date(today.year, today.month, 1),
+            'year': date(today.year, 1, 1),
+            'all': None,
+        }
+        print(f"Ledger entries: {num_entries}, players: {num_players}, rollup backfill: {backfill:.1f} ms")
+        print(f"{'window':<10} {'scan':>10} {'prefix sums':>12} {'route, cold':>12} {'route, cached':>14}   (ms)")
+        rollup_windows = {
+            'month': (month_index(today), month_index(today)),
+            'year': (month_index(scans['year']), month_index(today)),
+            'last_n': (month_index(today), None),
+            'all': (None, None),
+        }
+
+        client = app.test_client()
+        for window in ('month', 'year', 'last_n', 'all'):
+            url = f'/leaderboard?window={window}&n=10'
+            if window == 'last_n':
+                cutoff = db.session.query(LedgerEntry.game_date).distinct().order_by(
+                    LedgerEntry.game_date.desc()).limit(10).all()[-1][0]
+                scan_ms = timed(lambda: scan(cutoff))
+            else:
+                scan_ms = timed(lambda: scan(scans[window]))
+            index = get_rollup_index()
+            lookup_ms = timed(lambda: rank(*index.window(*rollup_windows[window])))
+            # Cold includes rebuilding the prefix-sum matrix from the rollup table
+            cold_ms = timed(lambda: (data_cache.clear(), client.get(url)))
+            cached_ms = timed(lambda: client.get(url))
+            print(f"{window:<10} {scan_ms:10.2f} {lookup_ms:12.2f} {cold_ms:12.2f} {cached_ms:14.2f}")
+        print("(route timings include rendering every ranked player)")
+
+
+if __name__ == '__main__':
+    main()
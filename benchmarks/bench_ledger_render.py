@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark for /ledger with cached per-player row fragments.
+
+Creates a throwaway SQLite database with many players and times /ledger
+with every row rendered (cold), with every row cached (warm), and right
+after one payment, when only that player's row should be rebuilt.  Render
+time is the tpl entry of the Server-Timing header, i.e. time spent in
+templates as opposed to queries.
+
+Usage: python benchmarks/bench_ledger_render.py [num_players] [games]
+"""
+import os
+import re
+import sys
+import time
+from datetime import date
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('bench_ledger_render')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+os.environ.setdefault('PROFILING_REPEAT_THRESHOLD', str(10 ** 9))
+
+from app import app, db, ledger_row_cache, Player, LedgerEntry, Payment
+
+
+def timing(response, name):
+    match = re.search(rf'{name};dur=([\d.]+)(?:;desc="(\d+)[^"]*")?', response.headers.get('Server-Timing', ''))
+    return (float(match.group(1)), int(match.group(2) or 0)) if match else (0.0, 0)
+
+
+def get_ledger(client):
+    start = time.perf_counter()
+    response = client.get('/ledger')
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.status_code
+    render, templates = timing(response, 'tpl')
+    sql, queries = timing(response, 'sql')
+    # Just the table; the page after a payment also carries its flash message
+    rows = re.search(rb'<tbody>.*?</tbody>', response.get_data(), re.S).group(0)
+    return {'ms': elapsed, 'render_ms': render, 'templates': templates, 'sql_ms': sql, 'queries': queries,
+            'rows': rows}
+
+
+def report(label, result):
+    print(f"{label:<28} {result['ms']:9.1f} {result['render_ms']:10.1f} {result['templates']:10} "
+          f"{result['sql_ms']:8.1f} {result['queries']:8}")
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with app.app_context():
+        db.create_all()
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment},
+                          num_players, games=games, payments=num_players, players_per_game=40)
+        payer = db.session.query(LedgerEntry.player_id).first()[0]
+    print(f"Generated {counts}")
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+
+    print(f"\n{'request':<28} {'total ms':>9} {'render ms':>10} {'templates':>10} {'sql ms':>8} {'queries':>8}")
+    ledger_row_cache.clear()
+    cold = get_ledger(client)
+    report('GET /ledger (cold)', cold)
+    warm = min((get_ledger(client) for _ in range(5)), key=lambda r: r['ms'])
+    report('GET /ledger (warm)', warm)
+
+    response = client.post('/add_payment', data={'player_id': payer, 'amount': '12.50',
+                                                 'payment_date': date.today().isoformat()})
+    assert response.status_code == 302, response.status_code
+    after = get_ledger(client)
+    report('GET /ledger (after payment)', after)
+
+    failures = []
+    # The page itself plus the one changed row
+    if after['templates'] > warm['templates'] + 1:
+        failures.append(f"{after['templates'] - warm['templates']} rows re-rendered after one payment")
+    if cold['rows'] == after['rows']:
+        failures.append('the paying player\'s row did not change')
+    ledger_row_cache.clear()
+    if get_ledger(client)['rows'] != after['rows']:
+        failures.append('cached page differs from a fresh render')
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
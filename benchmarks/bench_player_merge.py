@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark for merging a duplicate player into another.
+
+Builds a throwaway SQLite database with few players but many rows each, so
+the two merged players share hundreds of games and own thousands of
+payments and transfers.  Times merge_player_into() and its commit, then
+checks that nothing of the duplicate is left, that the survivor's balance
+is the two balances added together, that every running balance is the
+cumulative sum of its nets, and that the event journal still agrees with
+the tables.
+
+Usage: python benchmarks/bench_player_merge.py [num_players] [games] [payments]
+"""
+import os
+import sys
+import time
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('bench_player_merge')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+from sqlalchemy import text
+
+from app import (app, db, ensure_journal, ensure_rollups, get_player_balances, journal,
+                 journal_state_from_tables, merge_player_into, Game, LedgerEntry, MonthlyRollup,
+                 Payment, Player, Transfer)
+from journal import diff_states
+from migrate import run_migrations
+
+# Entries whose running balance is not the player's cumulative net
+CHAIN_MISMATCHES = """
+    SELECT count(*) FROM (
+        SELECT running_balance, sum(coalesce(net_profit, 0)) OVER (
+            PARTITION BY player_id ORDER BY game_date, id) AS expected
+        FROM ledger_entry WHERE player_id = :player_id
+    ) WHERE abs(running_balance - expected) > 0.005
+"""
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    payments = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+    failures = 0
+
+    with app.app_context():
+        run_migrations(db)
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment,
+                               'Game': Game, 'Transfer': Transfer},
+                          num_players, games=games, payments=payments, players_per_game=25)
+        print(f"Generated {counts}")
+        ensure_rollups()
+        ensure_journal()
+
+        # The busiest pair of players
+        busiest = [pid for (pid,) in db.session.query(LedgerEntry.player_id).group_by(
+            LedgerEntry.player_id).order_by(db.func.count().desc()).limit(2).all()]
+        target, source = db.session.get(Player, busiest[0]), db.session.get(Player, busiest[1])
+        source_id, target_id = source.id, target.id
+        balances = get_player_balances()
+        expected = {key: balances[target_id][key] + balances[source_id][key]
+                    for key in ('current_balance', 'total_payments')}
+        rows = {'entries': LedgerEntry.query.filter_by(player_id=source_id).count(),
+                'payments': Payment.query.filter_by(player_id=source_id).count(),
+                'transfers': Transfer.query.filter(db.or_(Transfer.payer_id == source_id,
+                                                          Transfer.recipient_id == source_id)).count()}
+        print(f"Merging player {source_id} into {target_id}: {rows}")
+
+        start = time.perf_counter()
+        moved = merge_player_into(source, target)
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f"Merge: {elapsed * 1000:.1f} ms, moved {moved}")
+
+        after = get_player_balances()[target_id]
+        left = sum(model.query.filter(column == source_id).count() for model, column in (
+            (LedgerEntry, LedgerEntry.player_id), (Payment, Payment.player_id),
+            (MonthlyRollup, MonthlyRollup.player_id), (Transfer, Transfer.payer_id),
+            (Transfer, Transfer.recipient_id), (Player, Player.id)))
+        chain = db.session.execute(text(CHAIN_MISMATCHES), {'player_id': target_id}).scalar()
+        per_game = db.session.query(LedgerEntry.game_id).filter_by(player_id=target_id).group_by(
+            LedgerEntry.game_id).having(db.func.count() > 1).count()
+        drift = diff_states(journal.state()['players'], journal_state_from_tables())
+        for label, ok in (
+            (f"no rows of the duplicate left ({left})", left == 0),
+            (f"balance is the sum of both ({after['current_balance']:.2f} vs {expected['current_balance']:.2f})",
+             abs(after['current_balance'] - expected['current_balance']) < 0.01),
+            (f"payments are the sum of both ({after['total_payments']:.2f} vs {expected['total_payments']:.2f})",
+             abs(after['total_payments'] - expected['total_payments']) < 0.01),
+            (f"running balances are cumulative sums ({chain} mismatched)", chain == 0),
+            (f"one entry per game ({per_game} games with more)", per_game == 0),
+            (f"journal agrees with the tables ({len(drift)} differences)", not drift),
+            (f"merge under a second ({elapsed:.2f} s)", elapsed < 1.0),
+        ):
+            failures += not ok
+            print(f"  {'ok' if ok else 'FAILED'}: {label}")
+
+    print('\nPASS' if not failures else f'\nFAIL ({failures} checks)')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark for removing and re-uploading a whole game.
+
+Builds a throwaway SQLite database where every player has a long history,
+then replaces a 40-player game early in that history through
+/confirm_upload (replace=<game id>) and removes another through
+/game/<date>/remove.  Each is one transaction whose later running balances
+move with a single set-based UPDATE; for comparison it also times the
+per-entry recomputation edit_ledger_entry does, for the same players.
+Checks that every running balance is still the cumulative sum of its
+player's nets, that the monthly rollups match a full rebuild and that the
+event journal agrees with the tables.
+
+Usage: python benchmarks/bench_replace_game.py [num_players] [games] [players_per_game]
+"""
+import os
+import random
+import sys
+import time
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('bench_replace_game')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+from sqlalchemy import text
+
+from app import (app, db, ensure_journal, ensure_rollups, journal, journal_state_from_tables, rebuild_rollups,
+                 Game, LedgerEntry, MonthlyRollup, Payment, Player)
+from journal import diff_states
+from migrate import run_migrations
+
+CHAIN_MISMATCHES = """
+    SELECT count(*) FROM (
+        SELECT running_balance, sum(coalesce(net_profit, 0)) OVER (
+            PARTITION BY player_id ORDER BY game_date, id) AS expected
+        FROM ledger_entry
+    ) WHERE abs(running_balance - expected) > 0.005
+"""
+
+
+def rollup_rows():
+    return sorted((r.player_id, r.month, round(r.net_profit, 2), r.games) for r in MonthlyRollup.query)
+
+
+def per_entry_recompute(player_ids):
+    # What edit_ledger_entry does for one player, for every affected player
+    for player_id in player_ids:
+        running_balance = 0.0
+        for entry in LedgerEntry.query.filter_by(player_id=player_id).order_by(
+                LedgerEntry.game_date, LedgerEntry.id).all():
+            running_balance += entry.net_profit
+            entry.running_balance = running_balance
+    db.session.flush()
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    players_per_game = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+    rng = random.Random(7)
+    failures = 0
+
+    with app.app_context():
+        run_migrations(db)
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment, 'Game': Game},
+                          num_players, games=games, payments=20000, players_per_game=players_per_game)
+        print(f"Generated {counts}")
+        ensure_rollups()
+        ensure_journal()
+
+        ordered = Game.query.order_by(Game.game_date).all()
+        replaced, removed = ordered[len(ordered) // 10], ordered[len(ordered) // 5]
+        replaced_id, replaced_day, removed_day = replaced.id, replaced.game_date, removed.game_date
+        replaced_date, removed_date = replaced_day.isoformat(), removed_day.isoformat()
+        seated = db.session.query(LedgerEntry.player_id, Player.name).join(
+            Player, Player.id == LedgerEntry.player_id).filter(LedgerEntry.game_id == replaced_id).all()
+        later = LedgerEntry.query.filter(LedgerEntry.player_id.in_([pid for pid, _ in seated]),
+                                         LedgerEntry.game_date > replaced_day).count()
+        print(f"Replacing game {replaced_date} ({len(seated)} players, {later} later entries of theirs)")
+
+        start = time.perf_counter()
+        per_entry_recompute([pid for pid, _ in seated])
+        baseline = time.perf_counter() - start
+        db.session.rollback()
+        db.session.remove()
+
+    nets = [rng.randint(-40000, 40000) / 100.0 for _ in seated[:-1]]
+    nets.append(-sum(nets))
+    form = {'game_date': replaced_date, 'replace': str(replaced_id), 'session_start_at': '', 'session_end_at': '',
+            'existing_players': [f'{name}|{net}|{pid}' for (pid, name), net in zip(seated, nets)],
+            'existing_player_stakes': ['' for _ in seated]}
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+
+    start = time.perf_counter()
+    status = client.post('/confirm_upload', data=form).status_code
+    replace_time = time.perf_counter() - start
+    start = time.perf_counter()
+    client.post(f'/game/{removed_date}/remove')
+    remove_time = time.perf_counter() - start
+    print(f"Per-entry recomputation of their chains: {baseline * 1000:.1f} ms")
+    print(f"Replace via /confirm_upload: {replace_time * 1000:.1f} ms (status {status})")
+    print(f"Remove via /game/<date>/remove: {remove_time * 1000:.1f} ms")
+
+    with app.app_context():
+        chain = db.session.execute(text(CHAIN_MISMATCHES)).scalar()
+        uploaded = {pid: net for pid, net in db.session.query(LedgerEntry.player_id, LedgerEntry.net_profit).join(
+            Game, Game.id == LedgerEntry.game_id).filter(Game.game_date == replaced_day).all()}
+        gone = LedgerEntry.query.filter(LedgerEntry.game_date == removed_day).count() + \
+            Game.query.filter_by(game_date=removed_day).count()
+        rollups = rollup_rows()
+        rebuild_rollups()
+        db.session.flush()
+        rollups_match = rollups == rollup_rows()
+        db.session.rollback()
+        drift = diff_states(journal_state_from_tables(), journal.state()['players'])
+        for label, ok in (
+            (f"new results recorded ({len(uploaded)} players)",
+             uploaded == {pid: net for (pid, _), net in zip(seated, nets)}),
+            (f"removed game left nothing behind ({gone} rows)", gone == 0),
+            (f"running balances are cumulative sums ({chain} mismatched)", chain == 0),
+            ("monthly rollups match a full rebuild", rollups_match),
+            (f"journal agrees with the tables ({len(drift)} differences)", not drift),
+        ):
+            failures += not ok
+            print(f"  {'ok' if ok else 'FAILED'}: {label}")
+
+    print('\nPASS' if not failures else f'\nFAIL ({failures} checks)')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
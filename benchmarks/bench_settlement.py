@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the settlement planner behind the Settle Up page.
+
+Generates random zero-sum balances and times both the heap-based greedy
+(large groups) and the exact search (small groups).
+
+Usage: python benchmarks/bench_settlement.py [num_players]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settlement import EXACT_LIMIT, plan_settlement
+
+METHODS = ['Venmo', 'Zelle', 'Cash', 'PayPal', None]
+
+
+def make_balances(count, rng):
+    cents = [rng.randint(-50000, 50000) for _ in range(count - 1)]
+    cents.append(-sum(cents))
+    return {player_id: amount / 100.0 for player_id, amount in enumerate(cents)}
+
+
+def run(label, remaining, **kwargs):
+    start = time.perf_counter()
+    transfers, unsettled = plan_settlement(remaining, **kwargs)
+    elapsed = time.perf_counter() - start
+    nonzero = sum(1 for amount in remaining.values() if abs(amount) >= 0.01)
+    print(f"{label:<32} {elapsed * 1000:9.2f} ms  {len(transfers):6d} transfers "
+          f"(players with balance: {nonzero}, unsettled: {unsettled:.2f})")
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(42)
+
+    remaining = make_balances(num_players, rng)
+    methods = {player_id: rng.choice(METHODS) for player_id in remaining}
+    run(f'greedy, {num_players} players', remaining)
+    run(f'greedy + methods, {num_players}', remaining, methods=methods, respect_methods=True)
+
+    small = make_balances(EXACT_LIMIT, rng)
+    run(f'exact, {EXACT_LIMIT} players', small)
+    run(f'greedy only, {EXACT_LIMIT} players', small, exact_limit=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark for worker startup: how long `import wsgi` takes in a fresh process.
+
+Each boot runs in its own interpreter against a throwaway SQLite database,
+the way a gunicorn worker starts.  Reports import time, the SQL statements
+issued while booting, and whether pandas/NumPy were loaded.  The first boot
+runs the schema bootstrap; later boots should skip it.  SCHEMA_BOOTSTRAP=always
+shows the old every-worker cost for comparison.
+
+Usage: python benchmarks/bench_startup.py [boots]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT = """
+import json, sys, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'queries': len(statements),
+                  'pandas': 'pandas' in sys.modules, 'numpy': 'numpy' in sys.modules}}))
+"""
+
+
+def boot(module, db_path, **env_overrides):
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_URL=f'sqlite:///{db_path}',
+               UPLOAD_FOLDER=os.path.join(os.path.dirname(db_path), 'uploads'), **env_overrides)
+    out = subprocess.run([sys.executable, '-c', BOOT.format(module=module)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def heavy_import_ms():
+    code = "import time; s = time.perf_counter(); import pandas, numpy; print((time.perf_counter() - s) * 1000)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return float(out)
+
+
+def row(label, result):
+    print(f"{label:<34} {result['ms']:>9.1f} {result['queries']:>8} "
+          f"{'yes' if result['pandas'] else 'no':>7} {'yes' if result['numpy'] else 'no':>6}")
+
+
+def main():
+    boots = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_startup.db')
+
+    print(f"{'boot':<34} {'ms':>9} {'queries':>8} {'pandas':>7} {'numpy':>6}")
+    row('import app', boot('app', db_path))
+    row('import wsgi (first boot)', boot('wsgi', db_path))
+    warm = [boot('wsgi', db_path) for _ in range(boots)]
+    best = min(warm, key=lambda r: r['ms'])
+    row(f'import wsgi (best of {boots}, skipped)', best)
+    always = [boot('wsgi', db_path, SCHEMA_BOOTSTRAP='always') for _ in range(boots)]
+    row(f'import wsgi (best of {boots}, always)', min(always, key=lambda r: r['ms']))
+    row('import wsgi (new deploy id)', boot('wsgi', db_path, DEPLOY_ID='bench-redeploy'))
+    print(f"\nimporting pandas + numpy on their own: {heavy_import_ms():.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
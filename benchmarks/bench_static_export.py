@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the static export of the read-only pages (export_static.py).
+
+Creates a throwaway SQLite database and times a full export with one
+rendering process and with several, then the incremental runs that
+follow: nothing changed, one payment, one uploaded game and one removed
+game.  Checks that each incremental run renders exactly the pages whose
+data changed, that the removed game's page is deleted, that a player's
+page follows a transfer counterparty merged into another player, and that
+the files on disk match the manifest.
+
+Usage: python benchmarks/bench_static_export.py [num_players] [games] [workers]
+"""
+import json
+import os
+import sys
+import time
+
+from synthetic_data import populate, use_scratch_database
+
+WORK_DIR = use_scratch_database('bench_static_export')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+os.environ.setdefault('PROFILING_REPEAT_THRESHOLD', str(10 ** 9))
+
+from app import app, db, ensure_journal, ensure_rollups, Game, LedgerEntry, Payment, Player
+from export_static import MANIFEST, export_static
+from migrate import run_migrations
+
+
+def timed_export(output_dir, **kwargs):
+    start = time.perf_counter()
+    rendered, removed = export_static(output_dir, **kwargs)
+    return time.perf_counter() - start, rendered, removed
+
+
+def files_match_manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST)) as f:
+        pages = json.load(f)['pages']
+    on_disk = {os.path.relpath(root, output_dir) for root, _, files in os.walk(output_dir) if 'index.html' in files}
+    expected = {path.strip('/') or '.' for path in pages}
+    return on_disk == expected, len(pages)
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else max(2, os.cpu_count() or 1)
+    failures = 0
+
+    with app.app_context():
+        run_migrations(db)
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment, 'Game': Game},
+                          num_players, games=games, payments=20000, players_per_game=12)
+        print(f"Generated {counts}; {os.cpu_count()} CPUs")
+        ensure_rollups()
+        ensure_journal()
+        player_id, other_id, third_id = db.session.query(Player.id).order_by(Player.id).limit(3).all()
+        last_game = db.session.query(db.func.max(Game.game_date)).scalar()
+        db.session.remove()
+        db.engine.dispose()
+
+    serial_dir, parallel_dir = os.path.join(WORK_DIR, 'serial'), os.path.join(WORK_DIR, 'parallel')
+    serial, pages, _ = timed_export(serial_dir, workers=1)
+    parallel, _, _ = timed_export(parallel_dir, workers=workers)
+    print(f"Full export of {pages} pages: 1 process {serial:.1f} s, {workers} processes {parallel:.1f} s "
+          f"({pages / parallel:.0f} pages/s)")
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    steps = (
+        # (label, change, pages expected to render, pages expected to go)
+        ('nothing changed', None, 0, 0),
+        ('one payment', lambda: client.post('/add_payment', data={
+            'player_id': player_id[0], 'amount': '25', 'payment_date': last_game.isoformat(),
+            'payment_method': 'Cash'}), 2, 0),  # the ledger and the player
+        ('one new game', lambda: client.post('/confirm_upload', data={
+            'game_date': '2031-01-01', 'existing_players': [f'Player 00000|10.0|{player_id[0]}',
+                                                           f'Player 00001|-10.0|{other_id[0]}']}),
+         5, 0),  # ledger, calendar, the game and its two players
+        ('one removed game', lambda: client.post('/game/2031-01-01/remove'), 4, 1),
+    )
+    print(f"\n{'Incremental run':<20} {'seconds':>8} {'rendered':>9} {'removed':>8}")
+    for label, change, expect_rendered, expect_removed in steps:
+        if change is not None:
+            assert change().status_code == 302
+        elapsed, rendered, removed = timed_export(parallel_dir, workers=workers)
+        ok = (rendered, removed) == (expect_rendered, expect_removed)
+        failures += not ok
+        print(f"{label:<20} {elapsed:8.2f} {rendered:9} {removed:8}"
+              f"{'' if ok else f'  FAILED: expected {expect_rendered} rendered, {expect_removed} removed'}")
+
+    # The payer's page lists the recipient, who then merges into a third
+    # player without the payer's own data changing
+    client.post('/add_payment', data={'player_id': player_id[0], 'transfer_to_player_id': other_id[0],
+                                      'amount': '15', 'payment_date': last_game.isoformat(), 'payment_method': 'Venmo'})
+    timed_export(parallel_dir, workers=workers)
+    client.post('/players/merge', data={'target_id': third_id[0], 'source_id': other_id[0]})
+    timed_export(parallel_dir, workers=workers)
+    with open(os.path.join(parallel_dir, 'player', str(player_id[0]), 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    follows = f'href="/player/{third_id[0]}"' in html and f'href="/player/{other_id[0]}"' not in html
+    failures += not follows
+    print(f"\n  {'ok' if follows else 'FAILED'}: payer's page links the merged counterparty's new player")
+
+    matches, pages = files_match_manifest(parallel_dir)
+    failures += not matches
+    print(f"  {'ok' if matches else 'FAILED'}: files on disk match the manifest ({pages} pages)")
+    print('\nPASS' if not failures else f'\nFAIL ({failures} checks)')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the pairwise netting and counterparty queries.
+
+Builds a throwaway SQLite database with linked transfers, then times
+pairwise_flow() and counterparties() against the same answers computed by
+joining the two Payment legs of every transfer, which is what the queries
+cost without the transfer table.  Prints the query plans so the
+ix_transfer_* indexes can be seen doing the work.
+
+Usage: python benchmarks/bench_transfers.py [num_players] [payments]
+"""
+import os
+import sys
+import time
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('bench_transfers')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+from sqlalchemy import text
+
+from app import app, db, counterparties, pairwise_flow, LedgerEntry, Payment, Player, Transfer
+
+# Without the transfer table: pair the legs up by joining payments to payments
+LEG_JOIN = """
+    SELECT recipient.player_id AS other_id, sum(payer.amount) AS paid, 0 AS received
+    FROM payment AS payer JOIN payment AS recipient
+      ON recipient.transfer_id = payer.transfer_id AND recipient.amount < 0
+    WHERE payer.amount > 0 AND payer.player_id = :player_id GROUP BY recipient.player_id
+    UNION ALL
+    SELECT payer.player_id, 0, sum(payer.amount)
+    FROM payment AS payer JOIN payment AS recipient
+      ON recipient.transfer_id = payer.transfer_id AND recipient.amount < 0
+    WHERE payer.amount > 0 AND recipient.player_id = :player_id GROUP BY payer.player_id
+"""
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payments = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    repeat = 20
+
+    with app.app_context():
+        db.create_all()
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment,
+                               'Transfer': Transfer},
+                          num_players, games=100, payments=payments, transfer_fraction=0.5)
+        print(f"Generated {counts}")
+        busiest, other = db.session.query(Transfer.payer_id, Transfer.recipient_id).group_by(
+            Transfer.payer_id, Transfer.recipient_id).order_by(db.func.count().desc()).first()
+
+        pair_ms, flow = timed(lambda: pairwise_flow(busiest, other), repeat)
+        list_ms, listed = timed(lambda: counterparties(busiest), repeat)
+        join_ms, joined = timed(lambda: db.session.execute(text(LEG_JOIN), {'player_id': busiest}).all(), repeat)
+
+        expected = {}
+        for other_id, paid, received in joined:
+            totals = expected.setdefault(other_id, [0.0, 0.0])
+            totals[0] += paid
+            totals[1] += received
+        failures = [f"player {c['player_id']}: {c['paid']:.2f}/{c['received']:.2f} vs legs {expected.get(c['player_id'])}"
+                    for c in listed
+                    if expected.get(c['player_id']) is None
+                    or abs(expected[c['player_id']][0] - c['paid']) > 0.005
+                    or abs(expected[c['player_id']][1] - c['received']) > 0.005]
+        if len(listed) != len(expected):
+            failures.append(f'{len(listed)} counterparties, the legs give {len(expected)}')
+
+        print(f"\npairwise_flow({busiest}, {other})          {pair_ms:8.2f} ms  "
+              f"net {flow['net']:.2f} over {flow['transfers']} transfers")
+        print(f"counterparties({busiest})              {list_ms:8.2f} ms  {len(listed)} counterparties")
+        print(f"same list by joining payment legs  {join_ms:8.2f} ms")
+
+        print("\nQuery plans:")
+        for label, sql in (
+                ('pairwise', 'SELECT payer_id, sum(amount) FROM transfer WHERE (payer_id = :a AND recipient_id = :b) '
+                             'OR (payer_id = :b AND recipient_id = :a) GROUP BY payer_id'),
+                ('paid to', 'SELECT recipient_id, sum(amount) FROM transfer WHERE payer_id = :a GROUP BY recipient_id'),
+                ('received from', 'SELECT payer_id, sum(amount) FROM transfer WHERE recipient_id = :a GROUP BY payer_id')):
+            plan = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), {'a': busiest, 'b': other}).all()
+            print(f"  {label:<14} " + '; '.join(row[-1] for row in plan))
+
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
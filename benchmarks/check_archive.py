@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Check that clearing players archives their games and payments intact.
+
+Creates a throwaway SQLite database, clears the busiest players through
+/clear_ledger, and checks that their rows left the hot tables, that the
+archive unpacks to exactly the rows that were there, and that /history and
+the detail page serve them.  Reports the archive's size against the same
+rows as plain JSON, and the page timings.
+
+Usage: python benchmarks/check_archive.py [num_players] [games] [players_to_clear]
+"""
+import json
+import os
+import sys
+import time
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('check_archive')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+import archive
+from app import app, db, ArchivedLedger, LedgerEntry, LedgerHistory, Payment, Player
+
+
+def rows_of(model, fields, player_id, order):
+    return [dict(zip(fields, row)) for row in db.session.query(*[getattr(model, f) for f in fields])
+            .filter(model.player_id == player_id).order_by(*order).all()]
+
+
+def timed_get(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    return (time.perf_counter() - start) * 1000, response
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    to_clear = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    with app.app_context():
+        db.create_all()
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment},
+                          num_players, games=games, payments=num_players * 5, players_per_game=40)
+        busiest = [pid for (pid,) in db.session.query(LedgerEntry.player_id).group_by(LedgerEntry.player_id)
+                   .order_by(db.func.count(LedgerEntry.id).desc()).limit(to_clear)]
+        before = {pid: (rows_of(LedgerEntry, archive.ENTRY_FIELDS, pid, (LedgerEntry.game_date,)),
+                        rows_of(Payment, archive.PAYMENT_FIELDS, pid, (Payment.payment_date, Payment.id)))
+                  for pid in busiest}
+    print(f"Generated {counts}; clearing the {len(busiest)} busiest players")
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    start = time.perf_counter()
+    for pid in busiest:
+        response = client.post('/clear_ledger', data={'player_id': pid})
+        assert response.status_code == 302, response.status_code
+    clear_ms = (time.perf_counter() - start) * 1000 / len(busiest)
+
+    failures = []
+    with app.app_context():
+        left = db.session.query(LedgerEntry.id).filter(LedgerEntry.player_id.in_(busiest)).count() + \
+            db.session.query(Payment.id).filter(Payment.player_id.in_(busiest)).count()
+        if left:
+            failures.append(f'{left} rows of cleared players are still in the hot tables')
+        packed = raw = 0
+        archives = {a.player_id: a for a in ArchivedLedger.query.filter(ArchivedLedger.player_id.in_(busiest))}
+        for pid, (entries, payments) in before.items():
+            archived = archives.get(pid)
+            if archived is None:
+                failures.append(f'player {pid} has no archive')
+                continue
+            if archive.unpack(archived.ledger_entries) != entries or archive.unpack(archived.payments) != payments:
+                failures.append(f'player {pid}: archived rows differ from the cleared rows')
+            packed += len(archived.ledger_entries) + len(archived.payments)
+            raw += len(json.dumps(entries, default=str)) + len(json.dumps(payments, default=str))
+        history_ids = [h.id for h in LedgerHistory.query.all()]
+
+    history_ms, _ = timed_get(client, '/history')
+    detail_ms = [timed_get(client, f'/history/{hid}')[0] for hid in history_ids]
+    rows = sum(len(e) + len(p) for e, p in before.values())
+    print(f"\narchived {rows} rows in {packed / 1024:.1f} KiB ({raw / 1024:.1f} KiB as JSON rows, "
+          f"{raw / max(packed, 1):.1f}x smaller)")
+    print(f"clear_ledger {clear_ms:.1f} ms per player, /history {history_ms:.1f} ms, "
+          f"detail page {sorted(detail_ms)[len(detail_ms) // 2]:.1f} ms median")
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
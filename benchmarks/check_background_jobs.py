@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Check that large uploads and exports run as background jobs.
+
+Starts the app under gunicorn with a single sync worker, so any request that
+held the worker would stall every other one.  Submits a large CSV upload
+and an export, times how long the submitting requests take, polls
+/jobs/<id> until both finish, and meanwhile keeps reading pages.  Fails if
+a submit took as long as its job, a job failed, or reads errored.  Pass
+--inline to run the jobs inside the request (JOB_WORKERS=0) for comparison.
+
+Usage: python benchmarks/check_background_jobs.py [--upload-rows 20000] [--preset medium] [--inline]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from check_sqlite_concurrency import Session
+from load_test import ADMIN_PASSWORD, percentile, seed_database, start_gunicorn
+from synthetic_data import make_upload_csv
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--upload-rows', type=int, default=20000, help='rows in the upload CSV')
+    parser.add_argument('--preset', default='medium', choices=['small', 'medium', 'large'])
+    parser.add_argument('--readers', type=int, default=2, help='clients reading pages meanwhile')
+    parser.add_argument('--inline', action='store_true', help='run jobs in the request (JOB_WORKERS=0)')
+    parser.add_argument('--port', type=int, default=8777)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+    # Fields seed_database() and start_gunicorn() expect
+    args.database_url, args.reset = None, False
+    args.workers, args.threads, args.worker_class, args.preload = 1, 1, 'sync', False
+    return args
+
+
+def post_file(session, path, fields, filename, content):
+    # http.client has no multipart support; build the body by hand
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: text/csv\r\n\r\n'.encode() + content + b'\r\n')
+    body = b''.join(parts) + f'--{boundary}--\r\n'.encode()
+    conn = http.client.HTTPConnection('127.0.0.1', session.port, timeout=600)
+    conn.request('POST', path, body=body, headers={
+        'Content-Type': f'multipart/form-data; boundary={boundary}', 'Cookie': session.cookie})
+    response = conn.getresponse()
+    response.read()
+    return response.status, response.getheader('Location') or ''
+
+
+def get_json(session, path):
+    conn = http.client.HTTPConnection('127.0.0.1', session.port, timeout=600)
+    conn.request('GET', path, headers={'Cookie': session.cookie} if session.cookie else {})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read() or b'null')
+
+
+def wait_for(session, status_url, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        _, job = get_json(session, status_url)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.2)
+    return {'status': 'failed', 'error': 'timed out waiting for the job'}
+
+
+def reader(port, data, stop, samples, rng):
+    session = Session(port)
+    while not stop.is_set():
+        path = rng.choice([f'/player/{rng.choice(data["players"])[0]}', '/leaderboard?window=all', '/calendar'])
+        start = time.perf_counter()
+        try:
+            status, _ = session.request('GET', path)
+            error = status >= 400
+        except Exception:
+            error = True
+        samples.append((time.perf_counter() - start, error))
+
+
+def main():
+    args = parse_args()
+    os.environ['JOB_WORKERS'] = '0' if args.inline else '2'
+    print(f"Seeding {args.preset} data set (JOB_WORKERS={os.environ['JOB_WORKERS']}) ...")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='jobs_check_'), 'check.db')}"
+    data = seed_database(args, database_url)
+    upload = make_upload_csv(args.upload_rows, [name for _, name in data['players']], seed=args.seed)
+    game_date = max(data['game_dates']).toordinal() + 1
+
+    server = start_gunicorn(args, database_url)
+    rng = random.Random(args.seed)
+    stop, samples = threading.Event(), []
+    readers = [threading.Thread(target=reader, args=(args.port, data, stop, samples, random.Random(rng.random())))
+               for _ in range(args.readers)]
+    failures = []
+    try:
+        admin = Session(args.port)
+        admin.request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+        for thread in readers:
+            thread.start()
+        time.sleep(1)
+
+        start = time.perf_counter()
+        status, location = post_file(admin, '/upload', {'game_date': date.fromordinal(game_date).isoformat()},
+                                     'game.csv', upload)
+        upload_submit = time.perf_counter() - start
+        job_id = location.rstrip('/').rsplit('/', 1)[-1]
+        upload_job = wait_for(admin, f'/jobs/{job_id}') if '/upload/' in location else \
+            {'status': 'failed', 'error': f'upload returned {status} {location}'}
+        upload_total = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, export = get_json(admin, '/export')
+        export_submit = time.perf_counter() - start
+        export_job = wait_for(admin, export['status_url'])
+        export_total = time.perf_counter() - start
+        time.sleep(1)
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    print(f"\n{'job':<28} {'submit ms':>10} {'finished ms':>12}  status")
+    for name, submit, total, job in [(f'upload ({args.upload_rows} rows)', upload_submit, upload_total, upload_job),
+                                     ('export', export_submit, export_total, export_job)]:
+        print(f"{name:<28} {submit * 1000:10.0f} {total * 1000:12.0f}  {job['status']}"
+              f"{' (' + job['error'] + ')' if job.get('error') else ''}")
+        if job['status'] != 'done':
+            failures.append(f'{name} job failed')
+        elif not args.inline and total > 0.5 and submit > total / 2:
+            failures.append(f'{name} submit waited for the job')
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    errors = sum(error for _, error in samples)
+    if latencies:
+        print(f"\nreads meanwhile: {len(latencies)} req  p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+              f"p95 {percentile(latencies, 95) * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms  errors {errors}")
+    if errors:
+        failures.append(f'{errors} reads failed')
+
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Check for the game table and its backfill migration (0008).
+
+Builds a throwaway SQLite database at the schema before games existed,
+fills it with synthetic games, then times migration 0008 and checks that
+every ledger entry was linked to a game whose totals match its entries.
+Finally compares the calendar's old DISTINCT over every ledger row with
+the game table query, and loads /calendar and a /game/<date> page.
+
+Usage: python benchmarks/check_games.py [preset]
+"""
+import os
+import sys
+import time
+
+from synthetic_data import PRESETS, populate, use_scratch_database
+
+use_scratch_database('check_games')
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+from sqlalchemy import text
+
+from app import app, db, Game, LedgerEntry, Payment, Player
+from migrate import run_migrations
+
+OLD_CALENDAR = "SELECT DISTINCT game_date FROM ledger_entry ORDER BY game_date DESC"
+NEW_CALENDAR = "SELECT game_date, count(id) FROM game GROUP BY game_date ORDER BY game_date DESC"
+
+
+def timed(sql, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(text(sql)).all()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    preset = PRESETS[sys.argv[1] if len(sys.argv) > 1 else 'large']
+    failures = 0
+
+    with app.app_context():
+        run_migrations(db, target=7)
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment}, **preset)
+        print(f"Populated before games existed: {counts}")
+        db.session.remove()
+
+        start = time.perf_counter()
+        run_migrations(db)
+        print(f"Migration 0008 backfill: {time.perf_counter() - start:.2f} s")
+
+        unlinked = LedgerEntry.query.filter(LedgerEntry.game_id.is_(None)).count()
+        dates = db.session.query(db.func.count(db.distinct(LedgerEntry.game_date))).scalar()
+        games = Game.query.count()
+        mismatched = db.session.execute(text(
+            "SELECT count(*) FROM game JOIN (SELECT game_id, count(*) AS players, sum(net_profit) AS net "
+            "FROM ledger_entry GROUP BY game_id) AS e ON e.game_id = game.id "
+            "WHERE e.players <> game.player_count OR abs(e.net - game.total_net) > 0.005"
+        )).scalar()
+        for label, ok in (
+            (f'every entry linked ({unlinked} unlinked)', unlinked == 0),
+            (f'one game per date ({games} games, {dates} dates)', games == dates),
+            (f'game totals match their entries ({mismatched} mismatched)', mismatched == 0),
+        ):
+            failures += not ok
+            print(f"  {'ok' if ok else 'FAILED'}: {label}")
+
+        old_ms, new_ms = timed(OLD_CALENDAR), timed(NEW_CALENDAR)
+        print(f"\nCalendar dates: DISTINCT over ledger_entry {old_ms:.2f} ms, game table {new_ms:.2f} ms "
+              f"({old_ms / max(new_ms, 1e-6):.1f}x)")
+
+        client = app.test_client()
+        day = db.session.query(Game.game_date).order_by(Game.game_date.desc()).first()[0]
+        for path in ('/calendar', f'/game/{day.isoformat()}'):
+            start = time.perf_counter()
+            status = client.get(path).status_code
+            failures += status != 200
+            print(f"GET {path}: {status} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print('\nPASS' if not failures else f'\nFAIL ({failures} checks)')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
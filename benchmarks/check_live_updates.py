@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Check that ledger changes reach open pages through /live on every worker.
+
+Starts the app under gunicorn with several threaded workers, opens --viewers
+SSE connections (spread over the workers by the kernel), then records
+payments, edits a game and confirms an upload as an admin.  Reports how long
+each change took to reach every viewer and how many requests the viewers
+made meanwhile, and fails unless every viewer saw every change.  Run with
+--threads 1 to see the fallback for single-threaded workers, where /live
+answers at once and the browser reconnects every LIVE_RETRY_MS.
+
+Usage: python benchmarks/check_live_updates.py [--workers 3] [--threads 4] [--viewers 6]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from check_sqlite_concurrency import Session
+from load_test import ADMIN_PASSWORD, percentile, seed_database, start_gunicorn
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--viewers', type=int, default=6, help='open ledger pages listening on /live')
+    parser.add_argument('--changes', type=int, default=10, help='admin changes to make')
+    parser.add_argument('--retry-ms', type=int, default=1000, help='LIVE_RETRY_MS for the fallback')
+    parser.add_argument('--preset', default='small', choices=['small', 'medium', 'large'])
+    parser.add_argument('--port', type=int, default=8778)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+    # Fields seed_database() and start_gunicorn() expect
+    args.database_url, args.reset, args.worker_class, args.preload = None, False, 'gthread', False
+    return args
+
+
+class Viewer(threading.Thread):
+    """Minimal EventSource: reconnects with Last-Event-ID like a browser."""
+
+    def __init__(self, port, since, stop):
+        super().__init__(daemon=True)
+        self.port, self.last_id, self.stop = port, since, stop
+        self.received = {}  # version -> arrival time
+        self.requests = 0
+        self.retry = 3.0
+        self.conn = None
+
+    def run(self):
+        while not self.stop.is_set():
+            self.requests += 1
+            try:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+                self.conn.request('GET', f'/live?since={self.last_id}', headers={'Last-Event-ID': str(self.last_id)})
+                response = self.conn.getresponse()
+                if response.getheader('Content-Length'):
+                    # Answered at once rather than streamed
+                    lines = iter(response.read().splitlines(keepends=True))
+                else:
+                    lines = iter(response.fp.readline, b'')
+                event = {}
+                for line in lines:
+                    if self.stop.is_set():
+                        break
+                    line = line.decode().rstrip('\n')
+                    if line.startswith('retry:'):
+                        self.retry = int(line[6:]) / 1000
+                    elif line.startswith('id:'):
+                        event['id'] = int(line[3:])
+                    elif line.startswith('data:'):
+                        event['data'] = json.loads(line[5:])
+                    elif not line and 'data' in event:
+                        self.received.setdefault(event['id'], time.perf_counter())
+                        self.last_id = max(self.last_id, event['id'])
+                        event = {}
+                self.conn.close()
+            except (OSError, http.client.HTTPException):
+                pass
+            self.stop.wait(self.retry)
+
+
+def main():
+    args = parse_args()
+    os.environ['GUNICORN_THREADS'] = str(args.threads)
+    os.environ['LIVE_RETRY_MS'] = str(args.retry_ms)
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='live_check_'), 'check.db')}"
+    print(f"Seeding {args.preset} data set ...")
+    data = seed_database(args, database_url)
+    from app import app, db, get_data_version
+    with app.app_context():
+        since = get_data_version()
+        entry_ids = data['entry_ids']
+        db.session.remove()
+        db.engine.dispose()
+
+    server = start_gunicorn(args, database_url)
+    rng = random.Random(args.seed)
+    stop = threading.Event()
+    viewers = [Viewer(args.port, since, stop) for _ in range(args.viewers)]
+    sent = {}
+    try:
+        for viewer in viewers:
+            viewer.start()
+        time.sleep(2)
+        admin = Session(args.port)
+        admin.request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+        next_date = data['game_dates'][-1]
+        for i in range(args.changes):
+            kind = ('payment', 'edit', 'upload')[i % 3]
+            start = time.perf_counter()
+            if kind == 'payment':
+                admin.request('POST', '/add_payment', {
+                    'player_id': rng.choice(data['players'])[0], 'amount': '5.00',
+                    'payment_date': data['game_dates'][-1].isoformat(), 'payment_method': 'Cash'})
+            elif kind == 'edit':
+                admin.request('POST', '/edit_ledger_entry', {
+                    'entry_id': rng.choice(entry_ids), 'net_profit': f'{rng.randint(-100, 100)}.0'})
+            else:
+                next_date += timedelta(days=1)
+                seated = rng.sample(data['players'], 6)
+                admin.request('POST', '/confirm_upload', {
+                    'game_date': next_date.isoformat(),
+                    'existing_players': [f'{name}|{net}.0|{pid}' for (pid, name), net in zip(seated, [10, -10] * 3)]})
+            with app.app_context():
+                version = get_data_version()
+                db.session.remove()
+            sent[version] = (kind, start)
+            time.sleep(0.5)
+        time.sleep(args.retry_ms / 1000 + 2)
+    finally:
+        stop.set()
+        for viewer in viewers:
+            if viewer.conn is not None:
+                # Like closing the tab; open streams would hold up shutdown
+                viewer.conn.close()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    delays, missing = [], 0
+    for viewer in viewers:
+        for version, (kind, start) in sent.items():
+            if version in viewer.received:
+                delays.append(viewer.received[version] - start)
+            else:
+                missing += 1
+    delays.sort()
+    print(f"\n{len(sent)} changes, {args.viewers} viewers, {args.workers} workers x {args.threads} threads")
+    if delays:
+        print(f"delivery after commit: p50 {percentile(delays, 50) * 1000:.0f} ms  "
+              f"p95 {percentile(delays, 95) * 1000:.0f} ms  max {delays[-1] * 1000:.0f} ms")
+    print(f"/live requests per viewer: {sum(v.requests for v in viewers) / len(viewers):.1f}, missed deliveries: {missing}")
+    print(f"\n{'FAIL: some viewers missed changes' if missing else 'PASS'}")
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Check that the index migration changes the query plans it was written for.
+
+Builds a throwaway database at the baseline migration, fills it with
+synthetic data, and prints the plan and timing of each hot query before and
+after migrating to the latest version.  Exits non-zero if a query still
+doesn't use the index it should.  On SQLite it also round-trips the payment
+table through rebuild_table() and checks rows and indexes survive.
+
+Usage: python benchmarks/check_migration_indexes.py [--preset small|medium|large] [--database-url URL --reset]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--preset', default='small', choices=['small', 'medium', 'large'])
+parser.add_argument('--database-url', help='Database to use instead of a temporary SQLite file')
+parser.add_argument('--reset', action='store_true', help='Drop all tables in --database-url first')
+args = parser.parse_args()
+
+os.environ['FLASK_ENV'] = 'production'
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'check_indexes.db')}"
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import registry
+
+from app import app, db, Player, LedgerEntry, Payment
+from migrate import Operations, discover, run_migrations, schema_migrations
+from synthetic_data import PRESETS, populate
+
+# (description, SQL, index the plan should use after migrating)
+HOT_QUERIES = [
+    ('latest entry for a player',
+     "SELECT running_balance FROM ledger_entry WHERE player_id = :pid ORDER BY game_date DESC LIMIT 1",
+     'ix_ledger_entry_player_date'),
+    ('entries on a game date',
+     "SELECT player_id, net_profit FROM ledger_entry WHERE game_date = :day",
+     'ix_ledger_entry_game_date'),
+    ('list of game dates',
+     "SELECT DISTINCT game_date FROM ledger_entry ORDER BY game_date DESC",
+     'ix_ledger_entry_game_date'),
+    ('payment total for a player',
+     "SELECT SUM(amount) FROM payment WHERE player_id = :pid",
+     'ix_payment_player_date'),
+    ('payment history for a player',
+     "SELECT amount, payment_date FROM payment WHERE player_id = :pid ORDER BY payment_date DESC",
+     'ix_payment_player_date'),
+]
+
+
+def baseline_models():
+    # The app's models have columns later migrations add, so fill the
+    # baseline schema through classes mapped onto 0001's own tables
+    baseline = next(m for m in discover() if m.version == 1).module
+    mapper = registry()
+    models = {}
+    for name, table in (('Player', baseline.player), ('LedgerEntry', baseline.ledger_entry),
+                        ('Payment', baseline.payment)):
+        models[name] = type(f'Baseline{name}', (), {})
+        mapper.map_imperatively(models[name], table)
+    return models
+
+
+def explain(sql, params):
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).all()
+        return '\n'.join(row[-1] for row in rows)
+    rows = db.session.execute(text(f'EXPLAIN {sql}'), params).all()
+    return '\n'.join(row[0] for row in rows)
+
+
+def timed(sql, params, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(text(sql), params).all()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def report(label, params):
+    results = {}
+    print(f"\n=== {label} ===")
+    for description, sql, index in HOT_QUERIES:
+        plan = explain(sql, params)
+        ms = timed(sql, params)
+        results[description] = (plan, ms)
+        print(f"\n{description}: {ms:.3f} ms")
+        for line in plan.splitlines():
+            print(f"    {line}")
+    return results
+
+
+def check_rebuild():
+    # Round-trip a table through the SQLite rebuild path
+    before_rows = db.session.query(Payment).count()
+    before_indexes = {i['name'] for i in inspect(db.engine).get_indexes('payment')}
+    db.session.remove()
+    with db.engine.begin() as conn:
+        Operations(db.engine, conn).rebuild_table(Payment.__table__)
+    after_rows = db.session.query(Payment).count()
+    after_indexes = {i['name'] for i in inspect(db.engine).get_indexes('payment')}
+    ok = before_rows == after_rows and before_indexes <= after_indexes
+    print(f"\nrebuild_table('payment'): {before_rows} -> {after_rows} rows, "
+          f"indexes {sorted(after_indexes)}: {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            with db.engine.begin() as conn:
+                schema_migrations.drop(conn, checkfirst=True)
+            db.session.remove()
+        elif args.database_url and inspect(db.engine).has_table('player'):
+            sys.exit('--database-url already has tables; pass --reset to drop them')
+
+        run_migrations(db, target=1)
+        preset = dict(PRESETS[args.preset])
+        counts = populate(db, baseline_models(), **preset)
+        print(f"Populated: {counts}")
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+
+        pid = db.session.query(Player.id).order_by(Player.id).offset(counts['players'] // 2).limit(1).scalar()
+        day = db.session.query(LedgerEntry.game_date).order_by(LedgerEntry.game_date).first()[0]
+        params = {'pid': pid, 'day': day}
+
+        before = report('before (baseline schema)', params)
+        db.session.remove()
+        run_migrations(db)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+        after = report('after (latest migration)', params)
+
+        print(f"\n{'query':<32} {'before ms':>10} {'after ms':>10}  index used")
+        failures = 0
+        for description, _, index in HOT_QUERIES:
+            used = index in after[description][0]
+            failures += not used
+            print(f"{description:<32} {before[description][1]:>10.3f} {after[description][1]:>10.3f}  "
+                  f"{'yes' if used else 'NO'} ({index})")
+
+        if db.engine.dialect.name == 'sqlite' and not check_rebuild():
+            failures += 1
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Check and time the bulk payment import on a 500-row statement.
+
+Creates a throwaway SQLite database, builds a Venmo-style statement export
+(payments in by payment ID, payouts by name, a nickname only an alias
+knows, a few strangers and one row already in the ledger, followed by a
+genuine repeat of it), then uploads, reviews and confirms it through
+/payments/import.  Checks that every matched row went in as one payment,
+that the flagged row was skipped but its repeat recorded, that submitting
+the form again records nothing, and that the journal still matches the
+tables.  /api/payments/bulk is timed with the same rows.
+
+Usage: python benchmarks/check_payment_import.py [num_players] [rows]
+"""
+import csv
+import io
+import os
+import random
+import re
+import sys
+import time
+from datetime import date
+
+from synthetic_data import populate, use_scratch_database
+
+use_scratch_database('check_payment_import')
+os.environ['JOB_WORKERS'] = '0'
+os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+
+from app import (app, db, ensure_journal, journal, journal_state_from_tables,
+                 LedgerEntry, Payment, Player, PlayerAlias, Transfer)
+from journal import diff_states
+
+STRANGERS = 5
+
+
+def build_statement(players, alias, rows, rng):
+    """Statement CSV bytes, and the number of rows that should be recorded."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['ID', 'Datetime', 'Type', 'Note', 'From', 'To', 'Amount (total)'])
+    for i in range(rows - STRANGERS - 3):
+        player_id, name, payment_id = rng.choice(players)
+        amount = rng.randint(100, 50000) / 100.0
+        when = f'2030-01-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:15:00'
+        if i % 3 == 0 or not payment_id:
+            # A payout, addressed by name
+            writer.writerow([i, when, 'Payment', 'winnings', 'House Account', name, f'- ${amount:,.2f}'])
+        else:
+            writer.writerow([i, when, 'Payment', 'poker', payment_id, 'House Account', f'+ ${amount:,.2f}'])
+    writer.writerow(['alias', '2030-01-05T20:00:00', 'Payment', '', alias, 'House Account', '+ $12.00'])
+    # The first is already in the ledger, the second a second payment that day
+    writer.writerow(['dup', '2030-01-06', 'Payment', '', players[0][1], 'House Account', '+ $40.00'])
+    writer.writerow(['repeat', '2030-01-06', 'Payment', '', players[0][1], 'House Account', '+ $40.00'])
+    for i in range(STRANGERS):
+        writer.writerow([f's{i}', '2030-01-07', 'Payment', '', f'Stranger {i}', 'House Account', '+ $5.00'])
+    return out.getvalue().encode(), rows - STRANGERS - 1
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:<34} {elapsed:9.1f} ms")
+    return result, elapsed
+
+
+def main():
+    num_players = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(7)
+
+    with app.app_context():
+        db.create_all()
+        counts = populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment,
+                               'Transfer': Transfer}, num_players, games=200, payments=num_players * 5)
+        for player in Player.query.filter(Player.payment_id.is_(None)).limit(num_players // 4):
+            player.payment_id = f'@{player.name.replace(" ", "-")}'
+        players = [tuple(row) for row in db.session.query(Player.id, Player.name, Player.payment_id)]
+        db.session.add(PlayerAlias(player_id=players[1][0], alias='Lucky Seven'))
+        db.session.add(Payment(player_id=players[0][0], amount=40.0,
+                               payment_date=date(2030, 1, 6)))
+        db.session.commit()
+        ensure_journal()
+        before = Payment.query.count()
+    print(f"Generated {counts}")
+    statement, expected = build_statement(players, 'lucky seven', rows, rng)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+
+    failures = []
+    print(f"\n{rows}-row statement, {num_players} players:")
+    response, upload_ms = timed('upload + match (job inline)', lambda: client.post(
+        '/payments/import', data={'file': (io.BytesIO(statement), 'venmo.csv')}))
+    review_url = response.headers['Location']
+    job_id = review_url.rsplit('/', 1)[-1]
+    response, review_ms = timed('review page', lambda: client.get(review_url))
+    page = response.get_data(as_text=True)
+    ticked = re.findall(r'name="include" value="(\d+)"\s+data-status="ready" checked', page)
+    unmatched = re.findall(r'name="player_(\d+)"', page)
+    if len(unmatched) != STRANGERS:
+        failures.append(f'{len(unmatched)} unmatched rows, expected {STRANGERS}')
+    if 'Already recorded' not in page:
+        failures.append('the row already in the ledger was not flagged')
+
+    form = {'job_id': job_id, 'include': ticked}
+    response, confirm_ms = timed('confirm (one transaction)', lambda: client.post(
+        '/payments/import/confirm', data=form))
+    with app.app_context():
+        recorded = Payment.query.count() - before
+        if recorded != expected:
+            failures.append(f'{recorded} payments recorded, expected {expected}')
+        client.post('/payments/import/confirm', data=form)
+        if Payment.query.count() - before != recorded:
+            failures.append('submitting the form twice recorded the payments twice')
+        problems = diff_states(journal_state_from_tables(), journal.state()['players'])
+        if problems:
+            failures.append(f'journal differs for {len(problems)} players')
+
+        items = [{'player_id': pid, 'amount': 10.0, 'payment_date': '2030-02-01', 'payment_method': 'Venmo'}
+                 for pid, _, _ in players[:rows]]
+    response, bulk_ms = timed(f'/api/payments/bulk ({len(items)} rows)', lambda: client.post(
+        '/api/payments/bulk', json={'payments': items}))
+    if response.status_code != 201:
+        failures.append(f'/api/payments/bulk returned {response.status_code}')
+    bad = client.post('/api/payments/bulk', json=[{'player_id': 10 ** 9, 'amount': 1, 'payment_date': '2030-02-01'}])
+    if bad.status_code != 400:
+        failures.append('/api/payments/bulk accepted an unknown player')
+
+    total = (upload_ms + review_ms + confirm_ms) / 1000
+    print(f"\nstatement to ledger: {total:.2f} s for {rows} rows ({expected} recorded)")
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Exercise the connection pool settings and the /health report.
+
+Runs more request threads than the pool has connections and samples
+/health meanwhile, so saturation and checkout latency should climb.  Against
+PostgreSQL it also kills every pooled connection server-side, as happens
+when Railway idles the database, and checks the next requests still succeed
+thanks to pre-ping.  It then checks that a query running longer than
+DB_STATEMENT_TIMEOUT_MS is cancelled.
+
+Usage:
+    python benchmarks/check_pool_health.py
+    python benchmarks/check_pool_health.py --database-url postgresql://localhost/poker_bench --reset
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--database-url', help='database to use instead of a temp SQLite file')
+parser.add_argument('--reset', action='store_true', help='drop and recreate every table in --database-url')
+parser.add_argument('--threads', type=int, default=8, help='concurrent request threads')
+parser.add_argument('--pool-size', type=int, default=2)
+parser.add_argument('--duration', type=float, default=5.0)
+args = parser.parse_args()
+
+os.environ['FLASK_ENV'] = 'production'
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}"
+os.environ['DB_POOL_SIZE'] = str(args.pool_size)
+os.environ['DB_MAX_OVERFLOW'] = '0'
+os.environ['DB_POOL_TIMEOUT'] = '30'
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '500'
+os.environ['PROFILING_QUERY_THRESHOLD'] = str(10 ** 9)
+os.environ['PROFILING_REPEAT_THRESHOLD'] = str(10 ** 9)
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import app, db, ensure_rollups, Player, LedgerEntry, Payment
+from synthetic_data import PRESETS, populate, reset_database
+
+
+def hammer(stop, errors):
+    client = app.test_client()
+    player_ids = [pid for (pid,) in app_player_ids]
+    i = 0
+    while not stop.is_set():
+        path = f'/player/{player_ids[i % len(player_ids)]}' if i % 2 else '/leaderboard?window=all'
+        if client.get(path).status_code != 200:
+            errors.append(path)
+        i += 1
+
+
+def main():
+    global app_player_ids
+    failures = []
+    with app.app_context():
+        postgres = db.engine.dialect.name == 'postgresql'
+        if args.database_url and not args.reset:
+            db.create_all()
+            if Player.query.first() is not None:
+                sys.exit(f'{args.database_url} already has data; pass --reset to wipe it')
+        reset_database(db)
+        sizes = PRESETS['small']
+        populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment},
+                 sizes['players'], sizes['games'], sizes['payments'], players_per_game=sizes['players_per_game'])
+        ensure_rollups()
+        app_player_ids = db.session.query(Player.id).limit(200).all()
+        db.session.remove()
+
+    client = app.test_client()
+    print(f"Pool before load: {client.get('/health').json['pool']}")
+
+    stop, errors, samples = threading.Event(), [], []
+    threads = [threading.Thread(target=hammer, args=(stop, errors)) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + args.duration
+    while time.time() < deadline:
+        samples.append(client.get('/health').json['pool'])
+        time.sleep(0.1)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    peak = max((s.get('saturation') or 0) for s in samples)
+    final = client.get('/health').json['pool']
+    print(f"\n{args.threads} threads on a pool of {args.pool_size} for {args.duration:.0f} s:")
+    print(f"  peak saturation {peak:.2f}, checkouts {final['checkouts']}, timeouts {final['timeouts']}")
+    print(f"  checkout latency ms: {final['checkout_ms']}")
+    if errors:
+        failures.append(f'{len(errors)} requests failed under load')
+    if peak < 1.0:
+        failures.append('pool never saturated; raise --threads')
+
+    if postgres:
+        with app.app_context():
+            db.session.remove()
+            with db.engine.connect() as conn:
+                killed = conn.execute(text(
+                    "SELECT count(pg_terminate_backend(pid)) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                )).scalar()
+        before = final['invalidated']
+        statuses = [client.get('/leaderboard?window=all').status_code for _ in range(args.pool_size + 1)]
+        after = client.get('/health').json['pool']['invalidated']
+        print(f"\nKilled {killed} server connections; next requests returned {statuses}, "
+              f"pre-ping replaced {after - before} dead connections")
+        if any(status != 200 for status in statuses):
+            failures.append('requests failed after the server dropped pooled connections')
+
+        with app.app_context():
+            try:
+                db.session.execute(text('SELECT pg_sleep(2)'))
+                failures.append('statement timeout did not cancel a 2 s query')
+            except OperationalError as e:
+                print(f"\n2 s query cancelled by statement_timeout: {str(e).splitlines()[0]}")
+            db.session.rollback()
+    else:
+        print("\n(SQLite: skipping the dropped-connection and statement-timeout checks, which need PostgreSQL)")
+
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Check that reads keep flowing on SQLite while a large upload is committing.
+
+Seeds a temporary SQLite database, starts the app under gunicorn, and runs
+reader threads (player pages, game pages, leaderboards) while one admin
+confirms a very large game and others record payments.  Reports read latency
+and errors during the upload and fails if any read or write errored.  Run
+with --no-tuning to see the same workload without WAL and the writer lane.
+
+Usage: python benchmarks/check_sqlite_concurrency.py [--workers 4] [--readers 8] [--upload-players 2000]
+"""
+import argparse
+import http.client
+import os
+import random
+import signal
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ADMIN_PASSWORD, percentile, seed_database, start_gunicorn
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--readers', type=int, default=8, help='concurrent reader clients')
+    parser.add_argument('--payment-writers', type=int, default=2, help='admins recording payments meanwhile')
+    parser.add_argument('--upload-players', type=int, default=2000, help='players in the large game')
+    parser.add_argument('--preset', default='medium', choices=['small', 'medium', 'large'])
+    parser.add_argument('--no-tuning', action='store_true', help='run with SQLITE_TUNING=0 for comparison')
+    parser.add_argument('--port', type=int, default=8775)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    # Fields seed_database() and start_gunicorn() expect
+    args.database_url, args.reset, args.worker_class, args.preload = None, False, 'sync', False
+    return args
+
+
+class Session:
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        body, headers = None, {}
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=300)
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                cookie = response.getheader('Set-Cookie')
+                if cookie:
+                    self.cookie = cookie.split(';', 1)[0]
+                return response.status, response.getheader('Location') or ''
+            except (http.client.HTTPException, OSError):
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def reader(port, data, stop, samples, rng):
+    session = Session(port)
+    players, game_dates = data['players'], data['game_dates']
+    while not stop.is_set():
+        path = rng.choice([
+            f'/player/{rng.choice(players)[0]}',
+            f'/game/{rng.choice(game_dates).isoformat()}',
+            '/leaderboard?window=all',
+        ])
+        start = time.perf_counter()
+        try:
+            status, _ = session.request('GET', path)
+            error = status >= 400
+        except Exception:
+            error = True
+        samples.append((time.perf_counter(), time.perf_counter() - start, error))
+
+
+def payment_writer(port, data, stop, results, rng):
+    session = Session(port)
+    session.request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status, location = session.request('POST', '/add_payment', {
+                'player_id': rng.choice(data['players'])[0], 'amount': '5.00',
+                'payment_date': data['game_dates'][-1].isoformat(), 'payment_method': 'Cash'})
+            error = status >= 400 or 'admin/login' in location
+        except Exception:
+            error = True
+        results.append((time.perf_counter() - start, error))
+        time.sleep(0.05)
+
+
+def summarize(label, latencies, errors):
+    latencies = sorted(latencies)
+    if not latencies:
+        print(f"  {label:<28} no requests")
+        return
+    print(f"  {label:<28} {len(latencies):>6} req  p50 {percentile(latencies, 50) * 1000:8.1f} ms  "
+          f"p95 {percentile(latencies, 95) * 1000:8.1f} ms  max {latencies[-1] * 1000:8.1f} ms  errors {errors}")
+
+
+def main():
+    args = parse_args()
+    os.environ['SQLITE_TUNING'] = '0' if args.no_tuning else '1'
+    print(f"Seeding {args.preset} data set (SQLITE_TUNING={os.environ['SQLITE_TUNING']}) ...")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='sqlite_check_'), 'check.db')}"
+    data = seed_database(args, database_url)
+
+    server = start_gunicorn(args, database_url)
+    rng = random.Random(args.seed)
+    stop = threading.Event()
+    read_samples, payment_results = [], []
+    threads = [threading.Thread(target=reader, args=(args.port, data, stop, read_samples, random.Random(rng.random())))
+               for _ in range(args.readers)]
+    threads += [threading.Thread(target=payment_writer, args=(args.port, data, stop, payment_results, random.Random(rng.random())))
+                for _ in range(args.payment_writers)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(2)
+
+        admin = Session(args.port)
+        admin.request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+        seated = rng.sample(data['players'], min(args.upload_players, len(data['players'])))
+        game_date = data['game_dates'][-1] + timedelta(days=1)
+        print(f"Confirming a {len(seated)}-player game while {args.readers} readers and "
+              f"{args.payment_writers} payment writers run ...")
+        upload_start = time.perf_counter()
+        status, location = admin.request('POST', '/confirm_upload', {
+            'game_date': game_date.isoformat(),
+            'existing_players': [f'{name}|{rng.randint(-300, 300)}.0|{pid}' for pid, name in seated]})
+        upload_end = time.perf_counter()
+        upload_error = status >= 400 or 'upload' in location
+        time.sleep(1)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    # A read overlaps the upload if it started before the upload finished
+    # and finished after the upload started
+    during, outside = [], []
+    for finished, elapsed, error in read_samples:
+        overlaps = finished - elapsed < upload_end and finished > upload_start
+        (during if overlaps else outside).append((elapsed, error))
+    read_errors = sum(error for _, _, error in read_samples)
+    payment_errors = sum(error for _, error in payment_results)
+
+    journal_mode = sqlite3.connect(database_url[len('sqlite:///'):]).execute('PRAGMA journal_mode').fetchone()[0]
+    print(f"\njournal mode: {journal_mode}")
+    print(f"confirm_upload: {(upload_end - upload_start) * 1000:.0f} ms, "
+          f"{'FAILED' if upload_error else 'ok'} (status {status})")
+    summarize('reads overlapping upload', [e for e, _ in during], sum(err for _, err in during))
+    summarize('reads before/after', [e for e, _ in outside], sum(err for _, err in outside))
+    summarize('add_payment (concurrent)', [e for e, _ in payment_results], payment_errors)
+
+    ok = not upload_error and read_errors == 0 and payment_errors == 0 and len(during) > 0
+    print("\nPASS: reads kept flowing during the upload" if ok else
+          "\nFAIL: errors during the upload, or no reads completed while it ran")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
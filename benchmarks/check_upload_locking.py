@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Stress concurrent upload confirmations and check the ledger stays consistent.
+
+Seeds a database, starts the app under gunicorn, and has several admins
+confirm uploads at once: the same handful of players in every game, several
+games on each date (some before already recorded games, so later balances
+have to move), half of them without session times, double-submitted forms,
+and ledger edits running meanwhile.  Afterwards it checks that
+
+  * every reviewed upload was recorded at most once, and exactly as the
+    submission that won it sent;
+  * every player's running_balance is the cumulative sum of their nets in
+    date order;
+  * replaying the event journal gives the same balances as the tables;
+  * no request failed with a server error.
+
+Usage:
+    python benchmarks/check_upload_locking.py [--workers 4] [--uploaders 8] [--uploads 60]
+    python benchmarks/check_upload_locking.py --database-url postgresql://localhost/poker_bench --reset
+"""
+import argparse
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from check_sqlite_concurrency import Session
+from load_test import ADMIN_PASSWORD, seed_database, start_gunicorn
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='database to use instead of a temp SQLite file')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table in --database-url')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--uploaders', type=int, default=8, help='concurrent admins confirming uploads')
+    parser.add_argument('--editors', type=int, default=2, help='concurrent admins editing ledger entries')
+    parser.add_argument('--uploads', type=int, default=60, help='uploads to confirm in total')
+    parser.add_argument('--dates', type=int, default=12, help='distinct game dates the uploads share')
+    parser.add_argument('--hot-players', type=int, default=12, help='players shared by every upload')
+    parser.add_argument('--preset', default='small', choices=['small', 'medium', 'large'])
+    parser.add_argument('--port', type=int, default=8776)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+    # Fields seed_database() and start_gunicorn() expect
+    args.worker_class, args.preload = 'sync', False
+    return args
+
+
+def candidate_dates(game_dates, count, rng):
+    # Half the dates fall between recorded games, half after the last one
+    recorded = set(game_dates)
+    gaps = [d + timedelta(days=1) for d in game_dates[len(game_dates) // 2:-1]
+            if d + timedelta(days=1) not in recorded]
+    before = rng.sample(gaps, min(len(gaps), count // 2))
+    after = [game_dates[-1] + timedelta(days=i + 1) for i in range(count - len(before))]
+    return before + after
+
+
+def uploader(port, jobs, hot_players, results, lock, rng):
+    session = Session(port)
+    session.request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+    while True:
+        with lock:
+            if not jobs:
+                return
+            game_date, upload_token, session_start_at = jobs.pop()
+        seated = rng.sample(hot_players, rng.randint(2, len(hot_players)))
+        nets = [rng.randint(-200, 200) for _ in seated]
+        nets[-1] -= sum(nets)  # games are zero-sum
+        form = {'game_date': game_date.isoformat(), 'upload_token': upload_token,
+                'session_start_at': session_start_at.isoformat(' ') if session_start_at else '',
+                'existing_players': [f'{name}|{net}.0|{pid}' for (pid, name), net in zip(seated, nets)]}
+        # Every fifth form is submitted twice at once, like a double click
+        copies = 2 if rng.random() < 0.2 else 1
+        outcomes = []
+        submitters = [threading.Thread(target=lambda: outcomes.append(submit(port, session.cookie, form)))
+                      for _ in range(copies)]
+        for thread in submitters:
+            thread.start()
+        for thread in submitters:
+            thread.join()
+        with lock:
+            for status, location in outcomes:
+                results.append(((game_date, upload_token), {pid: float(net) for (pid, _), net in zip(seated, nets)}, status, location))
+
+
+def submit(port, cookie, form):
+    session = Session(port)
+    session.cookie = cookie
+    return session.request('POST', '/confirm_upload', form)
+
+
+def editor(port, entry_ids, stop, results, rng):
+    session = Session(port)
+    session.request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+    while not stop.is_set():
+        status, _ = session.request('POST', '/edit_ledger_entry', {
+            'entry_id': rng.choice(entry_ids), 'net_profit': f'{rng.randint(-200, 200)}.0'})
+        results.append(status)
+        time.sleep(0.02)
+
+
+def verify(uploads):
+    from app import app, db, journal, journal_state_from_tables, Game, LedgerEntry
+    from journal import diff_states
+
+    failures = []
+    won = defaultdict(list)
+    for game, nets, status, location in uploads:
+        if location.endswith('/ledger'):
+            won[game].append(nets)
+    with app.app_context():
+        recorded = defaultdict(dict)
+        for player_id, game_date, upload_token, net in db.session.query(
+                LedgerEntry.player_id, Game.game_date, Game.upload_token, LedgerEntry.net_profit
+        ).join(Game, Game.id == LedgerEntry.game_id).filter(Game.game_date.in_({d for (d, _), _, _, _ in uploads})):
+            recorded[(game_date, upload_token)][player_id] = net
+        for game in sorted({g for g, _, _, _ in uploads}):
+            label = f'{game[0].isoformat()} ({game[1]})'
+            if len(won[game]) > 1:
+                failures.append(f'{label}: {len(won[game])} uploads succeeded')
+            elif won[game] and recorded[game] != won[game][0]:
+                failures.append(f'{label}: recorded entries differ from the winning upload')
+            elif not won[game] and recorded[game]:
+                failures.append(f'{label}: entries recorded but no upload reported success')
+
+        balances, broken = defaultdict(float), set()
+        for player_id, net, running in db.session.query(
+                LedgerEntry.player_id, LedgerEntry.net_profit, LedgerEntry.running_balance
+        ).order_by(LedgerEntry.player_id, LedgerEntry.game_date, LedgerEntry.id):
+            balances[player_id] += net
+            if abs(balances[player_id] - running) > 0.01:
+                broken.add(player_id)
+        if broken:
+            failures.append(f'{len(broken)} players have running balances that are not the cumulative sum')
+        drift = diff_states(journal_state_from_tables(), journal.state()['players'])
+        if drift:
+            failures.append(f'{len(drift)} players differ between the journal and the tables')
+        db.session.remove()
+    return won, failures
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    database_url = args.database_url or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='upload_check_'), 'check.db')}"
+    print(f"Seeding {args.preset} data set ...")
+    data = seed_database(args, database_url)
+
+    dates = candidate_dates(data['game_dates'], args.dates, rng)
+    # Each upload is its own game, so a date collects several; only the
+    # double-submitted copies of one form share a review's upload token.
+    # Every other upload has no session times, as most CSVs don't
+    jobs = [(dates[i % len(dates)], uuid.uuid4().hex,
+             datetime.combine(dates[i % len(dates)], datetime.min.time()) + timedelta(minutes=i) if i % 2 else None)
+            for i in range(args.uploads)]
+    rng.shuffle(jobs)
+    hot_players = rng.sample(data['players'], min(args.hot_players, len(data['players'])))
+    hot_ids = {pid for pid, _ in hot_players}
+    from app import app, db, LedgerEntry
+    with app.app_context():
+        hot_entries = [eid for (eid,) in db.session.query(LedgerEntry.id).filter(LedgerEntry.player_id.in_(hot_ids))]
+        db.session.remove()
+        db.engine.dispose()
+
+    server = start_gunicorn(args, database_url)
+    lock, stop = threading.Lock(), threading.Event()
+    uploads, edits = [], []
+    uploaders = [threading.Thread(target=uploader, args=(args.port, jobs, hot_players, uploads, lock, random.Random(rng.random())))
+                 for _ in range(args.uploaders)]
+    editors = [threading.Thread(target=editor, args=(args.port, hot_entries, stop, edits, random.Random(rng.random())))
+               for _ in range(args.editors if hot_entries else 0)]
+    print(f"{args.uploaders} admins confirming {args.uploads} uploads for {len(dates)} dates "
+          f"({len(hot_players)} shared players), {len(editors)} editing ...")
+    start = time.perf_counter()
+    try:
+        for thread in uploaders + editors:
+            thread.start()
+        for thread in uploaders:
+            thread.join()
+    finally:
+        stop.set()
+        for thread in editors:
+            thread.join()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    elapsed = time.perf_counter() - start
+
+    won, failures = verify(uploads)
+    server_errors = sum(status >= 500 for _, _, status, _ in uploads) + sum(status >= 500 for status in edits)
+    if server_errors:
+        failures.append(f'{server_errors} requests returned a server error')
+    rejected = sum('upload' in location for _, _, _, location in uploads)
+    print(f"\n{len(uploads)} submissions in {elapsed:.1f} s: {sum(len(w) for w in won.values())} recorded, "
+          f"{rejected} rejected (already uploaded), {len(edits)} edits")
+    print(f"\n{'FAIL: ' + '; '.join(failures) if failures else 'PASS'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
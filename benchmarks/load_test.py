@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test simulating game-night traffic.
+
+Seeds a database with synthetic data, starts the app under gunicorn with the
+requested worker/thread counts, then runs many concurrent clients replaying a
+weighted mix of reads (/ledger, /player/<id>, /game/<date>, ...) and admin
+writes (confirm_upload, add_payment, edit_ledger_entry).  Reports throughput,
+p50/p95/p99 latency and error rate per route, optionally as JSON.
+
+    python benchmarks/load_test.py --workers 4 --clients 50 --duration 30
+    python benchmarks/load_test.py --database-url postgresql://localhost/poker_bench --reset
+    python benchmarks/load_test.py --mix ledger=60,player=30,confirm_upload=1
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import PRESETS, populate, reset_database
+
+DEFAULT_MIX = ('ledger=35,player=30,game=10,calendar=5,leaderboard=5,stats=5,'
+               'settle=2,add_payment=4,edit_ledger_entry=2,confirm_upload=2')
+ADMIN_ROUTES = {'add_payment', 'edit_ledger_entry', 'confirm_upload'}
+ADMIN_PASSWORD = 'load-test-admin'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--preload', action='store_true', help='start gunicorn with --preload')
+    parser.add_argument('--clients', type=int, default=20, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='route=weight list')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--upload-players', type=int, default=40, help='players per uploaded game')
+    parser.add_argument('--database-url', help='use this database instead of a temp SQLite file')
+    parser.add_argument('--reset', action='store_true',
+                        help='drop and recreate every table in --database-url (destroys its data)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    return parser.parse_args()
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        route, _, weight = part.partition('=')
+        weights[route.strip()] = float(weight or 1)
+    return weights
+
+
+def seed_database(args, database_url):
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, db, ensure_rollups, Game, Player, LedgerEntry, Payment
+
+    sizes = PRESETS[args.preset]
+    with app.app_context():
+        if args.database_url and not args.reset:
+            db.create_all()
+            if Player.query.first() is not None:
+                sys.exit(f'{database_url} already has data; pass --reset to wipe it for load testing')
+        reset_database(db)
+        populate(db, {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment, 'Game': Game},
+                 sizes['players'], sizes['games'], sizes['payments'],
+                 players_per_game=sizes['players_per_game'], seed=args.seed)
+        ensure_rollups()
+        players = db.session.query(Player.id, Player.name).all()
+        game_dates = [d for (d,) in db.session.query(LedgerEntry.game_date).distinct().all()]
+        entry_ids = [eid for (eid,) in db.session.query(LedgerEntry.id).limit(5000).all()]
+        db.session.remove()
+        db.engine.dispose()
+    return {'players': players, 'game_dates': sorted(game_dates), 'entry_ids': entry_ids}
+
+
+def start_gunicorn(args, database_url):
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_URL=database_url,
+               ADMIN_PASSWORD=ADMIN_PASSWORD, SECRET_KEY='load-test',
+               UPLOAD_FOLDER=tempfile.mkdtemp(prefix='load_uploads_'))
+    command = [sys.executable, '-m', 'gunicorn', 'wsgi:app',
+               '--bind', f'127.0.0.1:{args.port}',
+               '--workers', str(args.workers),
+               '--threads', str(args.threads),
+               '--worker-class', args.worker_class,
+               '--timeout', '120',
+               '--log-level', 'warning']
+    if args.preload:
+        command.append('--preload')
+    log = open(os.path.join(tempfile.gettempdir(), 'load_test_gunicorn.log'), 'w')
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'gunicorn exited early, see {log.name}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=2)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('gunicorn did not become ready within 60 s')
+
+
+class Client(threading.Thread):
+    def __init__(self, port, routes, weights, data, stop_at, results, lock, next_date, rng):
+        super().__init__(daemon=True)
+        self.port = port
+        self.routes = routes
+        self.weights = weights
+        self.data = data
+        self.stop_at = stop_at
+        self.results = results
+        self.lock = lock
+        self.next_date = next_date
+        self.rng = rng
+        self.conn = None
+        self.cookie = None
+
+    def _request(self, method, path, form=None):
+        body, headers = None, {}
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                cookie = response.getheader('Set-Cookie')
+                if cookie:
+                    self.cookie = cookie.split(';', 1)[0]
+                return response.status
+            except (http.client.HTTPException, OSError):
+                # Sync workers close idle keep-alive connections; reconnect once
+                self.conn = None
+                if attempt:
+                    raise
+
+    def login(self):
+        self._request('POST', '/admin/login', {'password': ADMIN_PASSWORD})
+
+    def build_request(self, route):
+        players, game_dates = self.data['players'], self.data['game_dates']
+        if route == 'ledger':
+            return 'GET', '/ledger', None
+        if route == 'player':
+            return 'GET', f'/player/{self.rng.choice(players)[0]}', None
+        if route == 'game':
+            return 'GET', f'/game/{self.rng.choice(game_dates).isoformat()}', None
+        if route == 'calendar':
+            return 'GET', '/calendar', None
+        if route == 'leaderboard':
+            return 'GET', f"/leaderboard?window={self.rng.choice(['month', 'year', 'last_n', 'all'])}", None
+        if route == 'stats':
+            return 'GET', '/stats', None
+        if route == 'settle':
+            return 'GET', '/settle', None
+        if route == 'add_payment':
+            return 'POST', '/add_payment', {
+                'player_id': self.rng.choice(players)[0], 'amount': f'{self.rng.randint(1, 200)}.00',
+                'payment_date': game_dates[-1].isoformat(), 'payment_method': 'Venmo'}
+        if route == 'edit_ledger_entry':
+            return 'POST', '/edit_ledger_entry', {
+                'entry_id': self.rng.choice(self.data['entry_ids']),
+                'net_profit': str(self.rng.randint(-500, 500))}
+        if route == 'confirm_upload':
+            with self.lock:
+                game_date = game_dates[-1] + timedelta(days=next(self.next_date))
+            seated = self.rng.sample(players, min(self.data['upload_players'], len(players)))
+            return 'POST', '/confirm_upload', {
+                'game_date': game_date.isoformat(),
+                'existing_players': [f'{name}|{self.rng.randint(-300, 300)}.0|{pid}' for pid, name in seated]}
+        raise ValueError(f'unknown route {route!r}')
+
+    def run(self):
+        if ADMIN_ROUTES & set(self.routes):
+            self.login()
+        while time.time() < self.stop_at:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            method, path, form = self.build_request(route)
+            start = time.perf_counter()
+            try:
+                status = self._request(method, path, form)
+                error = status >= 400
+            except Exception:
+                error = True
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.results[route].append((elapsed, error))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(results, duration):
+    rows = {}
+    all_latencies, all_errors = [], 0
+    for route, samples in sorted(results.items()):
+        latencies = sorted(s[0] * 1000 for s in samples)
+        errors = sum(1 for s in samples if s[1])
+        all_latencies.extend(latencies)
+        all_errors += errors
+        rows[route] = {
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        }
+    all_latencies.sort()
+    rows['TOTAL'] = {
+        'requests': len(all_latencies),
+        'throughput_rps': round(len(all_latencies) / duration, 2),
+        'p50_ms': round(percentile(all_latencies, 50), 2),
+        'p95_ms': round(percentile(all_latencies, 95), 2),
+        'p99_ms': round(percentile(all_latencies, 99), 2),
+        'error_rate': round(all_errors / len(all_latencies), 4) if all_latencies else 0.0,
+    }
+
+    print(f"\n{'route':<20} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, row in rows.items():
+        print(f"{route:<20} {row['requests']:7d} {row['throughput_rps']:8.1f} {row['p50_ms']:9.1f} "
+              f"{row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['error_rate']:7.1%}")
+    return rows
+
+
+def main():
+    args = parse_args()
+    weights = parse_mix(args.mix)
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='load_'), 'load.db')}"
+
+    print(f"Seeding {args.preset} data set into {database_url} ...")
+    data = seed_database(args, database_url)
+    data['upload_players'] = args.upload_players
+
+    print(f"Starting gunicorn: {args.workers} workers x {args.threads} threads ({args.worker_class})")
+    server = start_gunicorn(args, database_url)
+    try:
+        results = defaultdict(list)
+        lock = threading.Lock()
+        next_date = itertools.count(1)
+        routes, route_weights = list(weights), list(weights.values())
+        stop_at = time.time() + args.duration
+        rng = random.Random(args.seed)
+        clients = [Client(args.port, routes, route_weights, data, stop_at, results, lock,
+                          next_date, random.Random(rng.random()))
+                   for _ in range(args.clients)]
+        print(f"Running {args.clients} clients for {args.duration:.0f} s ...")
+        started = time.time()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        rows = report(results, time.time() - started)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(),
+                    'workers': args.workers, 'threads': args.threads,
+                    'worker_class': args.worker_class, 'preload': args.preload,
+                    'clients': args.clients, 'duration': args.duration,
+                    'mix': weights, 'preset': args.preset,
+                    'database': 'postgresql' if database_url.startswith('postgres') else 'sqlite',
+                },
+                'routes': rows,
+            }, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: times every route and the export/import scripts on
+seeded synthetic data and writes the results as JSON.
+
+Routes are driven through Flask's test client against a throwaway SQLite
+database (or --database-url).  Each result records min/median/mean wall
+time, the SQL query count and template render time reported by the
+profiling middleware, so two
+result files can be compared between commits:
+
+    python benchmarks/run_benchmarks.py --preset medium
+    python benchmarks/run_benchmarks.py --preset medium --compare benchmarks/results/<old>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import PRESETS, make_upload_csv, populate, reset_database
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--players', type=int, help='override the preset player count')
+    parser.add_argument('--games', type=int, help='override the preset game count')
+    parser.add_argument('--payments', type=int, help='override the preset payment count')
+    parser.add_argument('--players-per-game', type=int)
+    parser.add_argument('--upload-rows', type=int, default=1000, help='rows in the upload CSV')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', help='benchmark against this database instead of a temp SQLite file')
+    parser.add_argument('--reset', action='store_true',
+                        help='drop and recreate every table in --database-url (destroys its data)')
+    parser.add_argument('--skip-scripts', action='store_true', help='skip the export/import script benchmarks')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<commit>_<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def summarize(samples, queries=None, render_samples=None):
+    result = {
+        'samples_ms': [round(s, 3) for s in samples],
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+    }
+    if queries is not None:
+        result['sql_queries'] = queries
+    if render_samples:
+        result['render_median_ms'] = round(statistics.median(render_samples), 3)
+    return result
+
+
+def sql_queries(response):
+    match = re.search(r'(\d+) queries', response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def render_ms(response):
+    match = re.search(r'tpl;dur=([\d.]+)', response.headers.get('Server-Timing', ''))
+    return float(match.group(1)) if match else None
+
+
+class RouteTimer:
+    def __init__(self, client, repeat):
+        self.client = client
+        self.repeat = repeat
+        self.results = {}
+
+    def run(self, name, method, url_or_factory, data=None, expected=(200, 302)):
+        samples, queries, render_samples = [], None, []
+        for i in range(self.repeat):
+            url, payload = (url_or_factory(i) if callable(url_or_factory) else (url_or_factory, data))
+            start = time.perf_counter()
+            # Some routes print debug lines per row; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = self.client.open(url, method=method, data=payload)
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code not in expected:
+                raise RuntimeError(f'{name}: {method} {url} returned {response.status_code}')
+            queries = sql_queries(response)
+            if render_ms(response) is not None:
+                render_samples.append(render_ms(response))
+        self.results[name] = summarize(samples, queries, render_samples)
+        render = self.results[name].get('render_median_ms')
+        print(f"  {name:<36} median {self.results[name]['median_ms']:9.2f} ms"
+              f"  queries {queries if queries is not None else '-':>6}"
+              f"  render {f'{render:.2f} ms' if render is not None else '-':>10}")
+
+
+def run_script(code, env, cwd):
+    # Scripts print per row, so time inside the child and discard its output
+    wrapper = (
+        'import contextlib, io, sys, time\n'
+        f'sys.path.insert(0, {REPO_ROOT!r})\n'
+        'start = time.perf_counter()\n'
+        'with contextlib.redirect_stdout(io.StringIO()):\n'
+        + ''.join(f'    {line}\n' for line in code.splitlines()) +
+        'print((time.perf_counter() - start) * 1000)\n'
+    )
+    output = subprocess.check_output([sys.executable, '-c', wrapper], env=env, cwd=cwd)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def benchmark_scripts(database_url, repeat, results):
+    workdir = tempfile.mkdtemp(prefix='bench_scripts_')
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_URL=database_url)
+
+    samples = [run_script('from export_data import export_data\nexport_data()', env, workdir)
+               for _ in range(repeat)]
+    results['script:export_data'] = summarize(samples)
+    print(f"  {'script:export_data':<36} median {results['script:export_data']['median_ms']:9.2f} ms")
+
+    samples = []
+    for i in range(repeat):
+        import_env = dict(env, DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'import_{i}.db')}")
+        samples.append(run_script(
+            'from app import app, db\n'
+            'with app.app_context():\n'
+            '    from migrate import run_migrations\n'
+            '    run_migrations(db)\n'
+            'from import_data import import_data\n'
+            'import_data()', import_env, workdir))
+    results['script:import_data'] = summarize(samples)
+    print(f"  {'script:import_data':<36} median {results['script:import_data']['median_ms']:9.2f} ms")
+
+
+def compare(old_path, new_results):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\nComparison with {old_path} ({old['meta'].get('git_commit')}):")
+    print(f"  {'benchmark':<36} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for name, new in new_results.items():
+        previous = old['results'].get(name)
+        if not previous:
+            continue
+        change = (new['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100 if previous['median_ms'] else 0
+        flag = '  <-- slower' if change > 20 else ''
+        print(f"  {name:<36} {previous['median_ms']:10.2f} {new['median_ms']:10.2f} {change:+7.1f}%{flag}")
+
+
+def main():
+    args = parse_args()
+    sizes = dict(PRESETS[args.preset])
+    for key in ('players', 'games', 'payments', 'players_per_game'):
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = database_url
+    # Time the routes with the profiling hooks on, as before it became opt-in,
+    # and keep the N+1 warnings out of the timing output
+    os.environ.setdefault('PROFILING_ENABLED', '1')
+    os.environ.setdefault('PROFILING_QUERY_THRESHOLD', str(10 ** 9))
+    os.environ.setdefault('PROFILING_REPEAT_THRESHOLD', str(10 ** 9))
+    # Run upload parses and exports inline so their timings cover the job
+    os.environ.setdefault('JOB_WORKERS', '0')
+
+    from app import app, db, ensure_journal, ensure_rollups, Game, Player, LedgerEntry, Payment, Transfer
+    app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='bench_uploads_')
+
+    models = {'Player': Player, 'LedgerEntry': LedgerEntry, 'Payment': Payment, 'Game': Game,
+              'Transfer': Transfer}
+    with app.app_context():
+        if args.database_url and not args.reset:
+            db.create_all()
+            if Player.query.first() is not None:
+                sys.exit(f'{database_url} already has data; pass --reset to wipe it for benchmarking')
+        reset_database(db)
+        start = time.perf_counter()
+        counts = populate(db, models, sizes['players'], sizes['games'], sizes['payments'],
+                          players_per_game=sizes['players_per_game'], seed=args.seed)
+        ensure_rollups()
+        ensure_journal()
+        print(f"Generated {counts} in {time.perf_counter() - start:.1f} s ({database_url})")
+
+        busiest = db.session.query(LedgerEntry.player_id).group_by(LedgerEntry.player_id).order_by(
+            db.func.count(LedgerEntry.id).desc()).first()[0]
+        quietest = db.session.query(Player.id).order_by(Player.id.desc()).first()[0]
+        last_game = db.session.query(db.func.max(LedgerEntry.game_date)).scalar()
+        entry_ids = [eid for (eid,) in db.session.query(LedgerEntry.id).filter_by(player_id=busiest).limit(args.repeat).all()]
+        known_names = [name for (name,) in db.session.query(Player.name).all()]
+        name_to_id = {name.lower(): pid for pid, name in db.session.query(Player.id, Player.name).all()}
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    timer = RouteTimer(client, args.repeat)
+
+    print("Read routes:")
+    timer.run('GET /', 'GET', '/')
+    timer.run('GET /ledger', 'GET', '/ledger')
+    timer.run('GET /player/<busiest>', 'GET', f'/player/{busiest}')
+    timer.run('GET /player/<quietest>', 'GET', f'/player/{quietest}')
+    timer.run('GET /calendar', 'GET', '/calendar')
+    timer.run('GET /game/<date>', 'GET', f'/game/{last_game.isoformat()}')
+    timer.run('GET /history', 'GET', '/history')
+    timer.run('GET /stats', 'GET', '/stats')
+    for window in ('month', 'year', 'last_n', 'all'):
+        timer.run(f'GET /leaderboard?window={window}', 'GET', f'/leaderboard?window={window}&n=10')
+    timer.run('GET /settle', 'GET', '/settle')
+    timer.run('GET /settle?respect_methods=1', 'GET', '/settle?respect_methods=1')
+    timer.run('GET /api/players', 'GET', '/api/players')
+    timer.run('GET /api/balance_as_of', 'GET', f'/api/balance_as_of?date={last_game.isoformat()}')
+    timer.run('GET /api/balance_as_of?player_id', 'GET', f'/api/balance_as_of?date={last_game.isoformat()}&player_id={busiest}')
+    timer.run('GET /api/transfers/net', 'GET', f'/api/transfers/net?player_id={busiest}&other_id={quietest}')
+    timer.run('GET /api/players/<busiest>/counterparties', 'GET', f'/api/players/{busiest}/counterparties')
+    timer.run('GET /debug', 'GET', '/debug')
+    timer.run('GET /debug_player/<busiest>', 'GET', f'/debug_player/{busiest}')
+    timer.run('GET /export', 'GET', '/export', expected=(202,))
+    timer.run('GET /metrics', 'GET', '/metrics')
+
+    print("Write routes:")
+    upload_csv = make_upload_csv(args.upload_rows, known_names, seed=args.seed)
+    upload_date = lambda i: (last_game + timedelta(days=1 + i)).isoformat()
+
+    def upload_request(i):
+        return '/upload', {'game_date': upload_date(i), 'file': (io.BytesIO(upload_csv), 'game.csv')}
+    timer.run(f'POST /upload ({args.upload_rows} rows)', 'POST', upload_request)
+
+    def confirm_request(i):
+        # Same form the confirm page would post for this CSV
+        consolidated = {}
+        for line in upload_csv.decode().splitlines()[1:]:
+            fields = line.split(',')
+            key = fields[0].strip().lower()
+            name, net = consolidated.get(key, (fields[0].strip(), 0.0))
+            consolidated[key] = (name, net + float(fields[-1]) / 100.0)
+        form = {'game_date': upload_date(i), 'new_players': [], 'existing_players': []}
+        for key, (name, net) in consolidated.items():
+            if key in name_to_id:
+                form['existing_players'].append(f'{name}|{net}|{name_to_id[key]}')
+            else:
+                index = len(form['new_players'])
+                form['new_players'].append(f'{name}|{net}')
+                form[f'action_{index}'] = 'create'
+                form[f'create_name_{index}'] = f'{name} #{i}'
+        return '/confirm_upload', form
+
+    timer.run(f'POST /confirm_upload ({args.upload_rows} rows)', 'POST', confirm_request)
+
+    timer.run('POST /add_payment', 'POST', lambda i: ('/add_payment', {
+        'player_id': busiest, 'amount': '12.50', 'payment_date': last_game.isoformat(), 'payment_method': 'Venmo'}))
+    timer.run('POST /add_payment (transfer)', 'POST', lambda i: ('/add_payment', {
+        'player_id': busiest, 'transfer_to_player_id': quietest, 'amount': '5.00',
+        'payment_date': last_game.isoformat(), 'payment_method': 'Cash'}))
+    timer.run('POST /edit_ledger_entry', 'POST', lambda i: ('/edit_ledger_entry', {
+        'entry_id': entry_ids[i % len(entry_ids)], 'net_profit': str(10 + i)}))
+    timer.run('POST /edit_player', 'POST', lambda i: ('/edit_player', {
+        'player_id': busiest, 'preferred_payment_method': 'Zelle', 'payment_id': f'bench-{i}'}))
+    with app.app_context():
+        clear_ids = [pid for (pid,) in db.session.query(Player.id).order_by(Player.id).limit(args.repeat).all()]
+    timer.run('POST /clear_ledger', 'POST', lambda i: ('/clear_ledger', {'player_id': clear_ids[i]}))
+
+    results = timer.results
+    if not args.skip_scripts:
+        print("Scripts:")
+        benchmark_scripts(database_url, min(args.repeat, 3), results)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': git_commit(),
+            'preset': args.preset,
+            'sizes': counts,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'upload_rows': args.upload_rows,
+            'database': 'postgresql' if database_url.startswith('postgres') else 'sqlite',
+            'python': platform.python_version(),
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        REPO_ROOT, 'benchmarks', 'results',
+        f"{report['meta']['git_commit']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Seeded synthetic data for benchmarks.
+
+Fills the app's database with players, games and payments whose running
+balances are consistent with how the app itself maintains them, and builds
+game CSVs in the upload format.  The same seed always produces the same data.
+"""
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAYMENT_METHODS = ['Cash', 'Venmo', 'Zelle', 'PayPal', 'Check', None]
+
+PRESETS = {
+    'small': {'players': 500, 'games': 200, 'payments': 5000, 'players_per_game': 12},
+    'medium': {'players': 2000, 'games': 500, 'payments': 20000, 'players_per_game': 20},
+    'large': {'players': 10000, 'games': 2000, 'payments': 200000, 'players_per_game': 25},
+}
+
+
+def player_name(i):
+    return f'Player {i:05d}'
+
+
+def use_scratch_database(name):
+    """
+    Point the app at a new SQLite file, <tempdir>/<name>.db, and put the
+    repository on sys.path.  Call before importing app; returns the
+    temporary directory.
+    """
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    work_dir = tempfile.mkdtemp()
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, f'{name}.db')}"
+    return work_dir
+
+
+def reset_database(db):
+    """Drop every table, including the migration history, and migrate from scratch."""
+    from migrate import run_migrations, schema_migrations
+    db.drop_all()
+    with db.engine.begin() as conn:
+        schema_migrations.drop(conn, checkfirst=True)
+    db.session.remove()
+    run_migrations(db)
+
+
+def populate(db, models, players, games, payments, players_per_game=12, seed=42,
+             start=date(2020, 1, 2), interval_days=7, transfer_fraction=0.1):
+    """
+    Insert synthetic data using bulk inserts.
+
+    ``models`` is a dict with the Player, LedgerEntry and Payment classes,
+    plus optionally Game to give the entries their game rows and Transfer to
+    link the two legs of each transfer.
+    Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    Player, LedgerEntry, Payment = models['Player'], models['LedgerEntry'], models['Payment']
+
+    db.session.bulk_insert_mappings(Player, [
+        {'name': player_name(i),
+         'preferred_payment_method': rng.choice(PAYMENT_METHODS),
+         'payment_id': f'@player{i}' if rng.random() < 0.5 else None}
+        for i in range(players)
+    ])
+    db.session.flush()
+    player_ids = [pid for (pid,) in db.session.query(Player.id).order_by(Player.id).all()]
+
+    Game = models.get('Game')
+    balances = dict.fromkeys(player_ids, 0.0)
+    entries = []
+    game_rows = []
+    game_dates = [start + timedelta(days=interval_days * i) for i in range(games)]
+    per_game = min(players_per_game, len(player_ids))
+    for game_id, game_date in enumerate(game_dates, start=1):
+        seated = rng.sample(player_ids, per_game)
+        # Zero-sum table: every loss is someone else's win
+        nets = [rng.randint(-40000, 40000) for _ in seated[:-1]]
+        nets.append(-sum(nets))
+        for player_id, cents in zip(seated, nets):
+            net = cents / 100.0
+            balances[player_id] += net
+            entries.append({'player_id': player_id, 'game_date': game_date,
+                            'net_profit': net, 'running_balance': balances[player_id]})
+            if Game is not None:
+                entries[-1]['game_id'] = game_id
+        if Game is not None:
+            game_rows.append({'id': game_id, 'game_date': game_date, 'sequence': 1,
+                              'player_count': per_game, 'total_net': 0.0})
+    if game_rows:
+        db.session.bulk_insert_mappings(Game, game_rows)
+    db.session.bulk_insert_mappings(LedgerEntry, entries)
+
+    Transfer = models.get('Transfer')
+    transfer_rows = []
+    payment_rows = []
+    last_day = (game_dates[-1] - start).days if game_dates else 0
+    while len(payment_rows) < payments:
+        payer = rng.choice(player_ids)
+        amount = rng.randint(100, 50000) / 100.0
+        payment_date = start + timedelta(days=rng.randint(0, last_day))
+        method = rng.choice(PAYMENT_METHODS)
+        payment_rows.append({'player_id': payer, 'amount': amount,
+                             'payment_date': payment_date, 'payment_method': method})
+        if rng.random() < transfer_fraction and len(payment_rows) < payments:
+            recipient = rng.choice(player_ids)
+            payment_rows.append({'player_id': recipient, 'amount': -amount,
+                                 'payment_date': payment_date, 'payment_method': method})
+            if Transfer is not None:
+                transfer_id = len(transfer_rows) + 1
+                transfer_rows.append({'id': transfer_id, 'payer_id': payer, 'recipient_id': recipient,
+                                      'amount': amount, 'transfer_date': payment_date,
+                                      'payment_method': method})
+                payment_rows[-2]['transfer_id'] = payment_rows[-1]['transfer_id'] = transfer_id
+    if transfer_rows:
+        db.session.bulk_insert_mappings(Transfer, transfer_rows)
+    db.session.bulk_insert_mappings(Payment, payment_rows)
+    db.session.commit()
+
+    return {'players': len(player_ids), 'games': len(game_dates),
+            'ledger_entries': len(entries), 'payments': len(payment_rows),
+            'transfers': len(transfer_rows)}
+
+
+def make_upload_csv(num_rows, known_players, seed=42, new_fraction=0.1, duplicate_fraction=0.05):
+    """
+    Build a game CSV in the upload format, returned as bytes.
+
+    Most rows use existing player names (in varying case), ``new_fraction``
+    are unknown nicknames and ``duplicate_fraction`` repeat a name so the
+    upload has to consolidate them.
+    """
+    rng = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['player_nickname', 'player_id', 'session_start_at', 'session_end_at',
+                     'buy_in', 'buy_out', 'stack', 'net'])
+    names = []
+    for i in range(num_rows):
+        roll = rng.random()
+        if names and roll < duplicate_fraction:
+            name = rng.choice(names)
+        elif roll < duplicate_fraction + new_fraction or not known_players:
+            name = f'Newcomer {seed}-{i}'
+        else:
+            name = rng.choice(known_players)
+            name = name.lower() if rng.random() < 0.3 else name
+        names.append(name)
+        buy_in = rng.randint(1, 20) * 1000
+        buy_out = max(0, buy_in + rng.randint(-buy_in, 2 * buy_in))
+        writer.writerow([name, 10000 + i, '2024-01-15 19:00:00', '2024-01-15 23:00:00',
+                         buy_in, buy_out, buy_out, buy_out - buy_in])
+    return out.getvalue().encode()
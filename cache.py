@@ -0,0 +1,44 @@
+"""
+Process-local caches invalidated by the database data version.
+
+Every commit that changes players, ledger entries or payments bumps a single
+version counter in the database (see ``DataVersion`` in app.py).  Each worker
+keeps its own cached results tagged with the version they were computed at
+and recomputes only when the counter has moved.  Keys can also carry their
+own version, e.g. a player's row_version for that player's ledger row.
+"""
+import threading
+
+
+class VersionedCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, compute):
+        """Return the cached value for ``key`` at ``version``, computing it if stale."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = compute()
+        self.put(key, version, value)
+        return value
+
+    def lookup(self, key, version):
+        """The value cached for ``key`` at ``version``, or None."""
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None and entry[0] == version else None
+
+    def put(self, key, version, value):
+        with self._lock:
+            current = self._entries.get(key)
+            # Don't let a slow, older computation overwrite a newer one
+            if current is None or current[0] <= version:
+                self._entries[key] = (version, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,17 +1,77 @@
 import os
+import tempfile
 from datetime import timedelta
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') or 'admin123'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    UPLOAD_FOLDER = 'uploads'
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
+    
+    # Request profiling (see profiling.py); off unless PROFILING_ENABLED=1
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+    PROFILING_METRICS_TOKEN = os.environ.get('PROFILING_METRICS_TOKEN')  # bearer token for scraping /metrics
+    PROFILING_QUERY_THRESHOLD = int(os.environ.get('PROFILING_QUERY_THRESHOLD', 50))  # queries per request
+    PROFILING_REPEAT_THRESHOLD = int(os.environ.get('PROFILING_REPEAT_THRESHOLD', 20))  # same statement per request
+    PROFILING_SAMPLER = os.environ.get('PROFILING_SAMPLER') == '1'  # opt-in stack sampling
+    PROFILING_SAMPLE_INTERVAL_MS = int(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', 5))
+    PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+    PROFILING_DUMP_DIR = os.environ.get('PROFILING_DUMP_DIR', 'profiles')
+
+    # Startup bootstrap (see wsgi.py): 'auto' runs it once per schema version
+    # and deploy, 'always' runs it on every worker boot
+    SCHEMA_BOOTSTRAP = os.environ.get('SCHEMA_BOOTSTRAP', 'auto')
+    DEPLOY_ID = os.environ.get('DEPLOY_ID') or os.environ.get('RAILWAY_DEPLOYMENT_ID') or ''
+    
+    # SQLite production mode (see sqlite_tuning.py); ignored for other databases
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') == '1'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    SQLITE_WRITE_LOCK_TIMEOUT_S = float(os.environ.get('SQLITE_WRITE_LOCK_TIMEOUT_S', 30))
+    
+    # Connection pool (see db_pool.py).  On PostgreSQL, unset sizes are derived
+    # from the gunicorn workers/threads so all workers fit in DB_MAX_CONNECTIONS
+    DB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+    DB_THREADS = int(os.environ.get('GUNICORN_THREADS', 1))
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 20))
+    DB_POOL_SIZE = int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None
+    DB_MAX_OVERFLOW = int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    DB_EXTERNAL_POOLER = os.environ.get('DB_EXTERNAL_POOLER') == '1'  # PgBouncer-style pooler in front
+    
+    # Background jobs (see jobs.py); JOB_WORKERS=0 runs jobs inline
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # threads per gunicorn worker
+    JOB_STALE_AFTER_S = int(os.environ.get('JOB_STALE_AFTER_S', 900))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+    
+    # Live ledger updates over server-sent events (see live_updates.py)
+    LIVE_UPDATES_PATH = os.environ.get('LIVE_UPDATES_PATH')  # spool file shared by the workers
+    LIVE_MAX_STREAMS = int(os.environ['LIVE_MAX_STREAMS']) if os.environ.get('LIVE_MAX_STREAMS') else None  # per worker
+    LIVE_STREAM_MAX_S = int(os.environ.get('LIVE_STREAM_MAX_S', 300))
+    LIVE_RETRY_MS = int(os.environ.get('LIVE_RETRY_MS', 5000))  # reconnect delay when no stream is free
+    LIVE_POLL_INTERVAL_MS = int(os.environ.get('LIVE_POLL_INTERVAL_MS', 500))
+    
+    # Event journal (see journal.py): a balance snapshot every N events
+    JOURNAL_SNAPSHOT_EVERY = int(os.environ.get('JOURNAL_SNAPSHOT_EVERY', 500))
+    
+    # Static export of the read-only pages (see export_static.py)
+    STATIC_EXPORT_DIR = os.environ.get('STATIC_EXPORT_DIR', 'static_export')
+    STATIC_EXPORT_WORKERS = int(os.environ['STATIC_EXPORT_WORKERS']) if os.environ.get('STATIC_EXPORT_WORKERS') else None  # default: one per CPU
+    STATIC_EXPORT_APP_URL = os.environ.get('STATIC_EXPORT_APP_URL')  # the app, for links to pages not exported
+    
+    # Compiled templates on disk, shared by the workers on a host; empty disables
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'poker-ledger-jinja'))
 
 class DevelopmentConfig(Config):
     DEBUG = True
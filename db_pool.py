@@ -0,0 +1,179 @@
+"""
+Connection pool configuration and pool health reporting.
+
+engine_options() turns the DB_* pool settings into SQLAlchemy engine options.
+Against PostgreSQL the pool is sized per gunicorn worker so that all
+workers together stay within DB_MAX_CONNECTIONS.  Connections are pinged
+before use and recycled, so the first requests after Railway idles the
+database reconnect instead of failing, and every session gets a statement
+timeout.  With DB_EXTERNAL_POOLER (PgBouncer in transaction mode, or
+Railway's pooler) the app keeps no pool of its own and sets the timeout
+per transaction, because poolers reject startup options.
+
+The pool classes time every checkout, i.e. how long a request waited for
+a connection, and /health reports those latencies together with how
+saturated the pool is.  Numbers are per worker process.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from flask import jsonify
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class PoolStats:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.invalidated = 0
+
+    def record_checkout(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.checkouts += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_invalidated(self):
+        with self._lock:
+            self.invalidated += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            counts = {'checkouts': self.checkouts, 'timeouts': self.timeouts, 'invalidated': self.invalidated}
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(math.ceil(p / 100 * len(latencies))) - 1)] * 1000, 3)
+
+        counts['checkout_ms'] = {
+            'avg': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            'p50': pct(50), 'p95': pct(95), 'p99': pct(99), 'max': pct(100),
+            'window': len(latencies),
+        }
+        return counts
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckout:
+    # _do_get() is where a pool hands out (or waits for, or opens) a connection
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record_timeout()
+            raise
+        pool_stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def _is_postgres(uri):
+    return uri.startswith('postgres')
+
+
+def engine_options(config):
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if not _is_postgres(uri):
+        if uri.startswith('sqlite') and ':memory:' not in uri and uri not in ('sqlite://', 'sqlite:///'):
+            # SQLAlchemy's defaults for SQLite files unless sizes are given
+            options = {'poolclass': TimedQueuePool,
+                       'pool_timeout': float(config.get('DB_POOL_TIMEOUT', 10))}
+            if config.get('DB_POOL_SIZE') is not None:
+                options['pool_size'] = config['DB_POOL_SIZE']
+            if config.get('DB_MAX_OVERFLOW') is not None:
+                options['max_overflow'] = config['DB_MAX_OVERFLOW']
+            return options
+        return {}
+
+    timeout_ms = int(config.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if config.get('DB_EXTERNAL_POOLER'):
+        return {'poolclass': TimedNullPool}
+
+    pool_size = config.get('DB_POOL_SIZE')
+    max_overflow = config.get('DB_MAX_OVERFLOW')
+    if pool_size is None:
+        # A worker can't use more connections than it has request threads
+        pool_size = max(1, config.get('DB_THREADS', 1))
+    if max_overflow is None:
+        # Whatever is left of this worker's share of the connection budget
+        budget = config.get('DB_MAX_CONNECTIONS', 20) // max(1, config.get('DB_WORKERS', 1))
+        max_overflow = max(0, budget - pool_size)
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(pool_size),
+        'max_overflow': int(max_overflow),
+        'pool_timeout': float(config.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(config.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': bool(config.get('DB_POOL_PRE_PING', True)),
+        # Reuse the most recent connection so idle extras can age out
+        'pool_use_lifo': True,
+    }
+    if timeout_ms:
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout_ms}'}
+    return options
+
+
+def init_pool_health(app, db):
+    config = app.config
+    timeout_ms = int(config.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine.pool, 'invalidate')
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        pool_stats.record_invalidated()
+
+    if _is_postgres(str(engine.url)) and config.get('DB_EXTERNAL_POOLER') and timeout_ms:
+        @event.listens_for(engine, 'begin')
+        def _set_statement_timeout(conn):
+            conn.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout_ms}')
+
+    @app.route('/health')
+    def health():
+        pool = engine.pool
+        report = {'status': 'ok', 'pool': {'class': type(pool).__name__}}
+        if isinstance(pool, QueuePool):
+            max_overflow = getattr(pool, '_max_overflow', 0)
+            capacity = pool.size() + max(max_overflow, 0)
+            checked_out = pool.checkedout()
+            report['pool'].update({
+                'size': pool.size(),
+                'max_overflow': max_overflow,
+                'checked_out': checked_out,
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'saturation': round(checked_out / capacity, 3) if capacity > 0 else None,
+            })
+        report['pool'].update(pool_stats.snapshot())
+
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            report['database'] = {'ok': True, 'ping_ms': round((time.perf_counter() - start) * 1000, 2)}
+        except SQLAlchemyError as e:
+            report['status'] = 'error'
+            report['database'] = {'ok': False, 'error': str(e).splitlines()[0]}
+        return jsonify(report), 200 if report['status'] == 'ok' else 503
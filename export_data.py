@@ -2,10 +2,11 @@
 """
 Export script to backup all data from local database
 """
+import base64
 import json
 import os
 from datetime import datetime
-from app import app, db, Player, LedgerEntry, Payment, LedgerHistory
+from app import app, db, Player, LedgerEntry, Payment, LedgerHistory, Game
 
 def export_data():
     with app.app_context():
@@ -26,12 +27,20 @@ def export_data():
         for entry in ledger_entries:
             # Get player name for reference
             player = Player.query.get(entry.player_id)
+            game = Game.query.get(entry.game_id) if entry.game_id else None
             ledger_data.append({
                 'player_name': player.name if player else 'Unknown',
                 'game_date': entry.game_date.isoformat(),
                 'net_profit': entry.net_profit,
                 'running_balance': entry.running_balance,
-                'created_at': entry.created_at.isoformat() if entry.created_at else None
+                'buy_in': entry.buy_in,
+                'buy_out': entry.buy_out,
+                'stack': entry.stack,
+                'created_at': entry.created_at.isoformat() if entry.created_at else None,
+                # Which of the day's games, and its session times
+                'game_sequence': game.sequence if game else 1,
+                'session_start_at': game.session_start_at.isoformat() if game and game.session_start_at else None,
+                'session_end_at': game.session_end_at.isoformat() if game and game.session_end_at else None
             })
         
         # Export Payments
@@ -45,7 +54,8 @@ def export_data():
                 'amount': payment.amount,
                 'payment_date': payment.payment_date.isoformat(),
                 'payment_method': payment.payment_method,
-                'created_at': payment.created_at.isoformat() if payment.created_at else None
+                'created_at': payment.created_at.isoformat() if payment.created_at else None,
+                'transfer_id': payment.transfer_id  # pairs the two legs of a transfer
             })
         
         # Export Ledger History
@@ -58,6 +68,18 @@ def export_data():
                 'cleared_date': entry.cleared_date.isoformat(),
                 'created_at': entry.created_at.isoformat() if entry.created_at else None
             })
+            if entry.archive:
+                # The archived games and payments, still compressed
+                archived = entry.archive
+                history_data[-1]['archive'] = {
+                    'player_id': archived.player_id,
+                    'game_count': archived.game_count,
+                    'payment_count': archived.payment_count,
+                    'first_game': archived.first_game.isoformat() if archived.first_game else None,
+                    'last_game': archived.last_game.isoformat() if archived.last_game else None,
+                    'ledger_entries': base64.b64encode(archived.ledger_entries).decode(),
+                    'payments': base64.b64encode(archived.payments).decode()
+                }
         
         # Create export directory
         export_dir = 'database_export'
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Render the read-only site to static files for a static host or CDN.
+
+Writes /, /ledger, /calendar, /history, every /game/<date> and every
+/player/<id> as <path>/index.html, with the page's data as
+<path>/data.json, so the site can be served while the Flask app only takes
+admin writes.  Pages are rendered by a pool of processes, each with its
+own database connection, through the app's own routes.
+
+Re-running only renders the pages whose data changed since the last run.
+manifest.json keeps a fingerprint per page:
+
+  * a player page: the player's row_version (stamped whenever their games,
+    payments or details change), the day, since debt ages move daily, and
+    a hash of who they have paid or been paid by, by name and total, since
+    a merge, rename or clear of the other player doesn't stamp them;
+  * a game page, the calendar and history: a hash of the rows they show;
+  * the ledger: the data version, bumped by every change;
+
+plus a hash of the templates, so a template change renders everything.
+Pages of removed players and games are deleted.  Every file is written
+to a temporary name and renamed into place, and the manifest last.
+
+Usage: python export_static.py [output_dir] [--workers N] [--full] [--app-url URL]
+
+With --app-url, links to pages that are not exported (upload, admin login,
+stats, ...) point at the running app instead.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from app import (app, db, game_rows, get_data_version, get_player_balances, Game, LedgerEntry,
+                 LedgerHistory, ArchivedLedger, Payment, Player, Transfer)
+
+MANIFEST = 'manifest.json'
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+# Pages rendered per task handed to a worker
+BATCH_SIZE = 25
+# Paths served from the snapshot; other links go to the app with --app-url
+EXPORTED_PATH = re.compile(r'^/(ledger|calendar|history|player/\d+|game/\d{4}-\d{2}-\d{2})?/?$')
+LINK = re.compile(r'(href|action)="(/[^"]*)"')
+
+
+def digest(value):
+    return hashlib.sha1(json.dumps(value, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def site_fingerprint(app_url):
+    # Everything every page depends on besides its data
+    sha = hashlib.sha1((app_url or '').encode())
+    for root, _, files in sorted(os.walk(TEMPLATES_DIR)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                sha.update(name.encode() + f.read())
+    return sha.hexdigest()
+
+
+def page_fingerprints():
+    # {path: fingerprint} for every page to export, from a few queries
+    today = datetime.utcnow().date().isoformat()
+    pages = {'/': 'static', '/ledger': get_data_version()}
+
+    games = db.session.query(Game.game_date, Game.sequence, Game.session_start_at, Game.session_end_at,
+                             Game.player_count, Game.total_net, Game.total_buy_in).order_by(
+        Game.game_date, Game.sequence).all()
+    pages['/calendar'] = digest([(row.game_date, row.sequence) for row in games])
+    rows_by_date = {}
+    for row in games:
+        rows_by_date.setdefault(row.game_date, []).append(tuple(row))
+    for row in db.session.query(LedgerEntry.game_date, LedgerEntry.id, LedgerEntry.player_id, Player.name,
+                                LedgerEntry.net_profit, LedgerEntry.buy_in, LedgerEntry.buy_out).join(
+            Player, Player.id == LedgerEntry.player_id).order_by(LedgerEntry.id):
+        rows_by_date.setdefault(row.game_date, []).append(tuple(row))
+    for game_date, rows in rows_by_date.items():
+        pages[f'/game/{game_date.isoformat()}'] = digest(rows)
+
+    pages['/history'] = digest(db.session.query(
+        LedgerHistory.id, LedgerHistory.player_name, LedgerHistory.final_balance, LedgerHistory.cleared_date
+    ).order_by(LedgerHistory.id).all())
+    players = db.session.query(Player.id, Player.name, Player.row_version).all()
+    names = {player_id: name for player_id, name, _ in players}
+    # {player_id: {counterparty_id: total}}, what the page's transfer table shows
+    flows = {}
+    for payer_id, recipient_id, amount in db.session.query(
+            Transfer.payer_id, Transfer.recipient_id, Transfer.amount).order_by(Transfer.id):
+        for player_id, other_id in ((payer_id, recipient_id), (recipient_id, payer_id)):
+            if player_id is not None:
+                totals = flows.setdefault(player_id, {})
+                totals[other_id] = totals.get(other_id, 0.0) + amount
+    for player_id, _, row_version in players:
+        fingerprint = f'{row_version}/{today}'
+        if player_id in flows:
+            fingerprint += '/' + digest(sorted(
+                ((other_id or 0, names.get(other_id), round(total, 2)) for other_id, total in flows[player_id].items()),
+                key=lambda flow: flow[0]))
+        pages[f'/player/{player_id}'] = fingerprint
+    return pages
+
+
+def page_data(path):
+    # The data behind a page, for its data.json
+    if path == '/ledger':
+        names = dict(db.session.query(Player.id, Player.name).all())
+        return [dict(summary, player_id=player_id, name=names[player_id])
+                for player_id, summary in sorted(get_player_balances().items())]
+    if path == '/calendar':
+        return [{'game_date': game_date, 'games': games} for game_date, games in db.session.query(
+            Game.game_date, db.func.count(Game.id)).group_by(Game.game_date).order_by(Game.game_date.desc())]
+    if path == '/history':
+        archives = {row.history_id: row for row in ArchivedLedger.query.with_entities(
+            ArchivedLedger.history_id, ArchivedLedger.game_count, ArchivedLedger.payment_count)}
+        return [{'id': h.id, 'player_name': h.player_name, 'final_balance': h.final_balance,
+                 'cleared_date': h.cleared_date,
+                 'games': archives[h.id].game_count if h.id in archives else None,
+                 'payments': archives[h.id].payment_count if h.id in archives else None}
+                for h in LedgerHistory.query.order_by(LedgerHistory.cleared_date.desc())]
+    if path.startswith('/game/'):
+        game_date = datetime.strptime(path.rsplit('/', 1)[1], '%Y-%m-%d').date()
+        return {
+            'game_date': game_date,
+            'games': [{'sequence': g.sequence, 'session_start_at': g.session_start_at,
+                       'session_end_at': g.session_end_at, 'player_count': g.player_count,
+                       'total_net': g.total_net, 'total_buy_in': g.total_buy_in, 'total_buy_out': g.total_buy_out}
+                      for g in Game.query.filter_by(game_date=game_date).order_by(Game.sequence)],
+            'results': [{'player_id': row['player'].id, 'name': row['player'].name,
+                         'game_sequence': row['game_sequence'], 'net_profit': row['net_profit'],
+                         'buy_in': row['buy_in'], 'buy_out': row['buy_out']}
+                        for row in game_rows(game_date)],
+        }
+    if path.startswith('/player/'):
+        player = db.session.get(Player, int(path.rsplit('/', 1)[1]))
+        if player is None:
+            return None
+        return {
+            'id': player.id, 'name': player.name,
+            'preferred_payment_method': player.preferred_payment_method, 'payment_id': player.payment_id,
+            'games': [{'game_date': d, 'game_id': gid, 'net_profit': net, 'running_balance': balance,
+                       'buy_in': buy_in, 'buy_out': buy_out}
+                      for d, gid, net, balance, buy_in, buy_out in db.session.query(
+                          LedgerEntry.game_date, LedgerEntry.game_id, LedgerEntry.net_profit,
+                          LedgerEntry.running_balance, LedgerEntry.buy_in, LedgerEntry.buy_out
+                      ).filter_by(player_id=player.id).order_by(LedgerEntry.game_date, LedgerEntry.id)],
+            'payments': [{'payment_date': d, 'amount': amount, 'payment_method': method, 'transfer_id': tid}
+                         for d, amount, method, tid in db.session.query(
+                             Payment.payment_date, Payment.amount, Payment.payment_method, Payment.transfer_id
+                         ).filter_by(player_id=player.id).order_by(Payment.payment_date, Payment.id)],
+        }
+    return None
+
+
+def write_atomic(filename, content):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temporary = f'{filename}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temporary, filename)
+
+
+def page_dir(output_dir, path):
+    return os.path.join(output_dir, *[part for part in path.split('/') if part])
+
+
+def _init_worker(app_url):
+    # Forked workers must not share the parent's database connections
+    app.config['STATIC_SNAPSHOT'] = True
+    app.config['STATIC_SNAPSHOT_APP_URL'] = app_url
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def render_batch(output_dir, paths):
+    # Render these pages in this worker; returns the paths that are gone
+    app_url = app.config.get('STATIC_SNAPSHOT_APP_URL')
+
+    def relink(match):
+        attribute, path = match.groups()
+        if app_url and not EXPORTED_PATH.match(path.split('?')[0]):
+            path = app_url.rstrip('/') + path
+        return f'{attribute}="{path}"'
+
+    client = app.test_client()
+    missing = []
+    for path in paths:
+        response = client.get(path)
+        if response.status_code != 200:
+            missing.append(path)
+            continue
+        directory = page_dir(output_dir, path)
+        write_atomic(os.path.join(directory, 'index.html'), LINK.sub(relink, response.get_data(as_text=True)))
+        with app.app_context():
+            data = page_data(path)
+        if data is not None:
+            write_atomic(os.path.join(directory, 'data.json'), json.dumps(data, default=str))
+    return missing
+
+
+def remove_page(output_dir, path):
+    directory = page_dir(output_dir, path)
+    for name in ('index.html', 'data.json'):
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    if directory != output_dir and os.path.isdir(directory) and not os.listdir(directory):
+        os.rmdir(directory)
+
+
+def export_static(output_dir, workers=None, full=False, app_url=None):
+    """Bring ``output_dir`` up to date; returns (rendered, removed) page counts."""
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    site = site_fingerprint(app_url)
+    old_pages = previous.get('pages', {}) if previous.get('site') == site and not full else {}
+
+    with app.app_context():
+        data_version = get_data_version()
+        pages = page_fingerprints()
+        db.session.remove()
+        db.engine.dispose()
+    stale = sorted(path for path, fingerprint in pages.items() if old_pages.get(path) != fingerprint)
+    gone = sorted(set(previous.get('pages', {})) - set(pages))
+
+    if stale:
+        batches = [stale[i:i + BATCH_SIZE] for i in range(0, len(stale), BATCH_SIZE)]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(batches)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(app_url,)) as pool:
+            for missing in pool.map(render_batch, [output_dir] * len(batches), batches):
+                # Removed while the snapshot was running; the next run catches up
+                for path in missing:
+                    pages.pop(path, None)
+                    gone.append(path)
+    for path in gone:
+        remove_page(output_dir, path)
+
+    write_atomic(manifest_path, json.dumps({
+        'site': site, 'data_version': data_version, 'generated_at': datetime.utcnow().isoformat(),
+        'pages': pages}, indent=1, default=str))
+    return len(stale) - len([p for p in gone if p in stale]), len(gone)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the read-only site to static files')
+    parser.add_argument('output_dir', nargs='?', default=app.config['STATIC_EXPORT_DIR'])
+    parser.add_argument('--workers', type=int, default=app.config['STATIC_EXPORT_WORKERS'],
+                        help='rendering processes (default: one per CPU)')
+    parser.add_argument('--full', action='store_true', help='render every page, ignoring the manifest')
+    parser.add_argument('--app-url', default=app.config['STATIC_EXPORT_APP_URL'],
+                        help='where links to pages that are not exported should point')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rendered, removed = export_static(args.output_dir, args.workers, args.full, args.app_url)
+    print(f"Static export in {args.output_dir}: {rendered} pages rendered, {removed} removed "
+          f"in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Fuzzy nickname matching for CSV uploads.
+
+Player names and known aliases are indexed by character trigrams so that an
+unmatched CSV nickname only gets compared against players that share at least
+one trigram with it, instead of against every player in the database.
+"""
+import heapq
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+NGRAM_SIZE = 3
+
+# Grams that appear in more than this fraction of indexed names carry almost no
+# signal and have very long posting lists, so they are skipped during lookup
+# (unless the query has nothing else to go on).
+COMMON_GRAM_FRACTION = 0.05
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(name):
+    """Lowercase a name and collapse punctuation/whitespace to single spaces."""
+    return _NON_ALNUM.sub(' ', str(name).lower()).strip()
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    """Return the set of padded character n-grams for a normalized name."""
+    padded = f' {text} '
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NameIndex:
+    """Inverted trigram index over player names and aliases."""
+
+    def __init__(self, entries=()):
+        # Parallel lists, one slot per indexed string
+        self._player_ids = []
+        self._texts = []
+        self._display = []
+        self._gram_counts = []
+        self._postings = defaultdict(list)
+        for player_id, text in entries:
+            self.add(player_id, text)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, player_id, text):
+        normalized = normalize_name(text)
+        if not normalized:
+            return
+        slot = len(self._texts)
+        grams = ngrams(normalized)
+        self._player_ids.append(player_id)
+        self._texts.append(normalized)
+        self._display.append(text)
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(slot)
+
+    def _candidate_slots(self, query_grams, max_candidates):
+        common_limit = max(50, int(len(self._texts) * COMMON_GRAM_FRACTION))
+        postings = [self._postings[g] for g in query_grams if g in self._postings]
+        rare = [p for p in postings if len(p) <= common_limit]
+        if rare:
+            postings = rare
+
+        shared = defaultdict(int)
+        for posting in postings:
+            for slot in posting:
+                shared[slot] += 1
+        if not shared:
+            return []
+
+        # Rank by Dice coefficient on trigram sets, cheap enough to do for
+        # every slot that shares a gram
+        query_size = len(query_grams)
+        gram_counts = self._gram_counts
+        top = heapq.nlargest(
+            max_candidates,
+            shared.items(),
+            key=lambda item: 2.0 * item[1] / (query_size + gram_counts[item[0]]),
+        )
+        return [slot for slot, _ in top]
+
+    def search(self, name, limit=5, min_score=0.4, max_candidates=50):
+        """
+        Return up to ``limit`` suggestions for ``name``, best first.
+
+        Each suggestion is a dict with ``player_id``, ``matched_text`` (the name
+        or alias that matched) and ``score`` in [0, 1].  Only one suggestion is
+        returned per player.
+        """
+        normalized = normalize_name(name)
+        if not normalized or not self._texts:
+            return []
+
+        query_grams = ngrams(normalized)
+        best = {}
+        for slot in self._candidate_slots(query_grams, max_candidates):
+            text = self._texts[slot]
+            score = SequenceMatcher(None, normalized, text).ratio()
+            # Nicknames are often a prefix of the full name ("Jake" / "Jake M")
+            if text.startswith(normalized) or normalized.startswith(text):
+                score = max(score, 0.85)
+            if score < min_score:
+                continue
+            player_id = self._player_ids[slot]
+            if player_id not in best or score > best[player_id]['score']:
+                best[player_id] = {
+                    'player_id': player_id,
+                    'matched_text': self._display[slot],
+                    'score': round(score, 3),
+                }
+
+        suggestions = sorted(best.values(), key=lambda s: s['score'], reverse=True)
+        return suggestions[:limit]
@@ -0,0 +1,52 @@
+# Gunicorn settings, loaded automatically when gunicorn starts from this directory.
+#
+# Worker count and other options still come from the command line or
+# GUNICORN_CMD_ARGS.  Set GUNICORN_PRELOAD=1 (or pass --preload) to import the
+# app once in the master and fork workers from it: the schema bootstrap runs
+# once, and the workers share the master's memory copy-on-write.
+import gc
+import os
+import signal
+
+if os.environ.get('GUNICORN_PRELOAD') == '1':
+    preload_app = True
+
+# Also read by config.py to size the database pool per worker
+if os.environ.get('GUNICORN_THREADS'):
+    threads = int(os.environ['GUNICORN_THREADS'])
+
+def on_starting(server):
+    if not server.cfg.preload_app:
+        return
+    # The app is already loaded; pull in the lazily imported modules too so
+    # every worker shares one copy instead of importing them on first use
+    import pandas  # noqa: F401
+    import player_stats  # noqa: F401
+    import leaderboard  # noqa: F401
+    import balance_history  # noqa: F401
+    # Compile the templates once here rather than in each worker
+    from wsgi import app
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    # Keep the garbage collector from touching (and so copying) these pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # Connections opened by the master during bootstrap must not be shared
+    from wsgi import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def post_worker_init(worker):
+    # Gunicorn has installed its signal handlers by now.  On SIGTERM, end the
+    # open /live streams first, or the worker waits for them to time out.
+    from live_updates import live_updates
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        live_updates.close()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
@@ -2,13 +2,24 @@
 """
 Import script to restore data from JSON files to Railway database
 """
+import base64
 import json
 import os
+from contextlib import nullcontext
 from datetime import datetime
-from app import app, db, Player, LedgerEntry, Payment, LedgerHistory
+from flask import has_app_context
+from app import app, db, journal, journal_state_from_tables, rebuild_player_rollups, refresh_game_totals, Player, LedgerEntry, Payment, Transfer, Game, LedgerHistory, ArchivedLedger
+from sqlite_tuning import serialized_write
 
-def import_data(export_dir='database_export'):
-    with app.app_context():
+def report(job, progress, message):
+    # Progress for /jobs/<id> when running as a background job
+    if job is not None:
+        job.update(progress, message)
+
+def import_data(export_dir='database_export', job=None):
+    # A background job already runs inside the app (and maybe the writer lane)
+    context = nullcontext() if has_app_context() else app.app_context()
+    with context, serialized_write():
         # Find the most recent export files
         files = os.listdir(export_dir)
         
@@ -43,7 +54,8 @@ def import_data(export_dir='database_export'):
             players_data = json.load(f)
         
         player_map = {}  # Map player names to IDs
-        for player_data in players_data:
+        for i, player_data in enumerate(players_data):
+            report(job, 0.2 * i / len(players_data), f'Importing players ({i} of {len(players_data)})')
             # Check if player already exists
             existing_player = Player.query.filter_by(name=player_data['name']).first()
             if existing_player:
@@ -68,16 +80,36 @@ def import_data(export_dir='database_export'):
             with open(f'{export_dir}/{latest_ledger_file}', 'r') as f:
                 ledger_data = json.load(f)
             
-            for entry_data in ledger_data:
+            games = {}  # (game_date, sequence) -> Game
+            imported_player_ids = set()
+            for i, entry_data in enumerate(ledger_data):
+                report(job, 0.2 + 0.5 * i / len(ledger_data), f'Importing ledger entries ({i} of {len(ledger_data)})')
                 player_name = entry_data['player_name']
                 if player_name not in player_map:
                     print(f"   ⚠️  Player '{player_name}' not found, skipping ledger entry")
                     continue
                 
+                # Exports from before games existed had one game per date
+                game_date = datetime.fromisoformat(entry_data['game_date']).date()
+                sequence = entry_data.get('game_sequence') or 1
+                game = games.get((game_date, sequence))
+                if game is None:
+                    game = Game.query.filter_by(game_date=game_date, sequence=sequence).first()
+                    if game is None:
+                        game = Game(
+                            game_date=game_date,
+                            sequence=sequence,
+                            session_start_at=datetime.fromisoformat(entry_data['session_start_at']) if entry_data.get('session_start_at') else None,
+                            session_end_at=datetime.fromisoformat(entry_data['session_end_at']) if entry_data.get('session_end_at') else None
+                        )
+                        db.session.add(game)
+                        db.session.flush()  # Get the ID
+                    games[(game_date, sequence)] = game
+                
                 # Check if entry already exists
                 existing_entry = LedgerEntry.query.filter_by(
                     player_id=player_map[player_name],
-                    game_date=datetime.fromisoformat(entry_data['game_date']).date()
+                    game_id=game.id
                 ).first()
                 
                 if existing_entry:
@@ -87,20 +119,32 @@ def import_data(export_dir='database_export'):
                 # Create new entry
                 entry = LedgerEntry(
                     player_id=player_map[player_name],
-                    game_date=datetime.fromisoformat(entry_data['game_date']).date(),
+                    game_id=game.id,
+                    game_date=game_date,
                     net_profit=entry_data['net_profit'],
-                    running_balance=entry_data['running_balance']
+                    running_balance=entry_data['running_balance'],
+                    buy_in=entry_data.get('buy_in'),
+                    buy_out=entry_data.get('buy_out'),
+                    stack=entry_data.get('stack')
                 )
                 db.session.add(entry)
+                imported_player_ids.add(entry.player_id)
                 print(f"   ✅ Added ledger entry: {player_name} on {entry_data['game_date']}")
+            db.session.flush()
+            refresh_game_totals([game.id for game in games.values()])
+            # ensure_rollups() only backfills an empty table, so the
+            # leaderboard would never see these games otherwise
+            rebuild_player_rollups(imported_player_ids)
         
         # Import Payments
         if latest_payment_file:
             print(f"\n🔄 Importing payments...")
             with open(f'{export_dir}/{latest_payment_file}', 'r') as f:
                 payments_data = json.load(f)
-            
-            for payment_data in payments_data:
+
+            transfers = {}  # Exported transfer_id -> Transfer, so both legs link up again
+            for i, payment_data in enumerate(payments_data):
+                report(job, 0.7 + 0.2 * i / len(payments_data), f'Importing payments ({i} of {len(payments_data)})')
                 player_name = payment_data['player_name']
                 if player_name not in player_map:
                     print(f"   ⚠️  Player '{player_name}' not found, skipping payment")
@@ -113,6 +157,20 @@ def import_data(export_dir='database_export'):
                     payment_date=datetime.fromisoformat(payment_data['payment_date']).date(),
                     payment_method=payment_data['payment_method']
                 )
+                if payment_data.get('transfer_id') is not None:
+                    transfer = transfers.get(payment_data['transfer_id'])
+                    if transfer is None:
+                        transfer = transfers[payment_data['transfer_id']] = Transfer(
+                            amount=abs(payment.amount),
+                            transfer_date=payment.payment_date,
+                            payment_method=payment.payment_method
+                        )
+                    # The payer's leg is the positive one
+                    if payment.amount >= 0:
+                        transfer.payer_id = payment.player_id
+                    else:
+                        transfer.recipient_id = payment.player_id
+                    payment.transfer = transfer
                 db.session.add(payment)
                 print(f"   ✅ Added payment: {player_name} - ${payment_data['amount']}")
         
@@ -122,7 +180,8 @@ def import_data(export_dir='database_export'):
             with open(f'{export_dir}/{latest_history_file}', 'r') as f:
                 history_data = json.load(f)
             
-            for history_entry in history_data:
+            for i, history_entry in enumerate(history_data):
+                report(job, 0.9 + 0.1 * i / len(history_data), f'Importing history ({i} of {len(history_data)})')
                 # Check if history entry already exists
                 existing_history = LedgerHistory.query.filter_by(
                     player_name=history_entry['player_name'],
@@ -140,10 +199,24 @@ def import_data(export_dir='database_export'):
                     cleared_date=datetime.fromisoformat(history_entry['cleared_date']).date()
                 )
                 db.session.add(history)
+                archived = history_entry.get('archive')
+                if archived:
+                    db.session.add(ArchivedLedger(
+                        history=history,
+                        player_id=archived['player_id'],
+                        game_count=archived['game_count'],
+                        payment_count=archived['payment_count'],
+                        first_game=datetime.fromisoformat(archived['first_game']).date() if archived['first_game'] else None,
+                        last_game=datetime.fromisoformat(archived['last_game']).date() if archived['last_game'] else None,
+                        ledger_entries=base64.b64decode(archived['ledger_entries']),
+                        payments=base64.b64decode(archived['payments'])
+                    ))
                 print(f"   ✅ Added history entry: {history_entry['player_name']}")
         
         # Commit all changes
         db.session.commit()
+        # The journal carries on from the imported balances
+        journal.rebase(journal_state_from_tables(), 'import')
         
         print(f"\n✅ Data import completed successfully!")
         print(f"📊 Summary:")
@@ -154,6 +227,13 @@ def import_data(export_dir='database_export'):
             print(f"   - Payments imported: {len(payments_data)}")
         if latest_history_file:
             print(f"   - History entries imported: {len(history_data)}")
+        
+        return {
+            'players': len(players_data),
+            'ledger_entries': len(ledger_data) if latest_ledger_file else 0,
+            'payments': len(payments_data) if latest_payment_file else 0,
+            'history_entries': len(history_data) if latest_history_file else 0,
+        }
 
 if __name__ == '__main__':
     import_data()
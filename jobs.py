@@ -0,0 +1,183 @@
+"""
+Background jobs for slow CSV parses, exports and imports.
+
+submit() records a job row and runs the function on a small thread pool in
+the worker that accepted the request, so the request returns at once with a
+job id instead of holding a gunicorn worker until the timeout.  The function
+gets a JobContext for reporting progress.  State lives in the job table, so
+/jobs/<id> answers from any worker with the job's status, progress and
+message, plus its error for an admin.  Results (player names, amounts,
+matched ids) are never served there; the admin review pages read them with
+get().
+
+Jobs die with their worker; a queued or running job that hasn't reported in
+JOB_STALE_AFTER_S is shown as failed.  JOB_WORKERS=0 runs jobs inline in the
+submitting request (scripts, benchmarks).  On SQLite, job bookkeeping goes
+through the single-writer lane like any other write.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import has_app_context, jsonify, session
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from sqlite_tuning import serialized_write
+
+FINISHED = ('done', 'failed')
+# What /jobs/<id> shows; admins also see the error and the owning worker
+STATUS_FIELDS = ('id', 'kind', 'status', 'progress', 'message', 'created_at', 'updated_at',
+                 'started_at', 'finished_at')
+
+
+class JobContext:
+    """Handed to a job function; update() reports progress to /jobs/<id>."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.id = job_id
+        self._last_write = 0.0
+
+    def update(self, progress=None, message=None, force=False):
+        # Writes at most twice a second unless forced
+        now = time.monotonic()
+        if not force and now - self._last_write < 0.5:
+            return
+        session = self.runner.db.session
+        if self.runner.sqlite and session.info.get('job_flushed'):
+            # Our own open write transaction holds SQLite's lock
+            return
+        values = {}
+        if progress is not None:
+            values['progress'] = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            values['message'] = message[:200]
+        self._last_write = now
+        try:
+            self.runner.write(self.id, **values)
+        except OperationalError as e:
+            print(f"JOBS: could not record progress for {self.id}: {str(e).splitlines()[0]}")
+
+
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.table = None
+        self.sqlite = False
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, model):
+        self.app, self.db, self.table = app, db, model.__table__
+        with app.app_context():
+            self.sqlite = db.engine.dialect.name == 'sqlite'
+
+        @event.listens_for(db.session, 'after_flush')
+        def _note_flush(session, flush_context):
+            session.info['job_flushed'] = True
+
+        @event.listens_for(db.session, 'after_commit')
+        def _clear_flush_after_commit(session):
+            session.info.pop('job_flushed', None)
+
+        @event.listens_for(db.session, 'after_rollback')
+        def _clear_flush_after_rollback(session):
+            session.info.pop('job_flushed', None)
+
+        @app.route('/jobs/<job_id>')
+        def job_status(job_id):
+            job = self.get(job_id)
+            if job is None:
+                return jsonify({'error': 'no such job'}), 404
+            status = {key: job[key] for key in STATUS_FIELDS}
+            if session.get('is_admin'):
+                status.update(error=job['error'], owner=job['owner'])
+            elif job['status'] == 'failed':
+                status['error'] = 'the job failed'
+            return jsonify(status)
+
+    @property
+    def executor(self):
+        # Created on first use, i.e. after gunicorn has forked the worker
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.app.config.get('JOB_WORKERS', 2),
+                                                    thread_name_prefix='job')
+            return self._executor
+
+    def write(self, job_id, **values):
+        values['updated_at'] = datetime.utcnow()
+        with serialized_write():
+            with self.db.engine.begin() as conn:
+                conn.execute(update(self.table).where(self.table.c.id == job_id).values(**values))
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Queue func(job, *args, **kwargs) and return the new job's id."""
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        retention = timedelta(days=self.app.config.get('JOB_RETENTION_DAYS', 7))
+        with serialized_write():
+            with self.db.engine.begin() as conn:
+                conn.execute(delete(self.table).where(self.table.c.status.in_(FINISHED),
+                                                      self.table.c.updated_at < now - retention))
+                conn.execute(insert(self.table).values(
+                    id=job_id, kind=kind, status='queued', progress=0.0,
+                    owner=f'{socket.gethostname()}:{os.getpid()}', created_at=now, updated_at=now))
+        if self.app.config.get('JOB_WORKERS', 2) <= 0:
+            self._run(job_id, func, args, kwargs)
+        else:
+            self.executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        if has_app_context():
+            return self._execute(job_id, func, args, kwargs)
+        with self.app.app_context():
+            return self._execute(job_id, func, args, kwargs)
+
+    def _execute(self, job_id, func, args, kwargs):
+        self.write(job_id, status='running', started_at=datetime.utcnow())
+        start = time.perf_counter()
+        try:
+            result = func(JobContext(self, job_id), *args, **kwargs)
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"JOBS: {job_id} failed:\n{traceback.format_exc()}")
+            self.write(job_id, status='failed', error=str(e)[:2000], finished_at=datetime.utcnow())
+            return
+        self.write(job_id, status='done', progress=1.0, result=json.dumps(result, default=str),
+                   finished_at=datetime.utcnow())
+        print(f"JOBS: {job_id} done in {time.perf_counter() - start:.1f} s")
+
+    def get(self, job_id):
+        """The job as a dict, or None.  Stale unfinished jobs read as failed."""
+        with self.db.engine.connect() as conn:
+            row = conn.execute(select(self.table).where(self.table.c.id == job_id)).mappings().first()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        stale_after = timedelta(seconds=self.app.config.get('JOB_STALE_AFTER_S', 900))
+        if job['status'] not in FINISHED and job['updated_at'] < datetime.utcnow() - stale_after:
+            job['status'] = 'failed'
+            job['error'] = f"worker {job['owner']} stopped reporting; the job was lost"
+        for key in ('created_at', 'updated_at', 'started_at', 'finished_at'):
+            if job[key] is not None:
+                job[key] = job[key].isoformat()
+        return job
+
+
+jobs = JobRunner()
+
+
+def init_jobs(app, db, model):
+    jobs.init_app(app, db, model)
+    return jobs
@@ -0,0 +1,260 @@
+"""
+Append-only journal of ledger events with periodic balance snapshots.
+
+Every route that changes balances records a domain event in the same
+transaction as the change: a game result, a payment, a transfer between
+two players, an edit of a game result, a game result taken back off the
+ledger (undo), a cleared player, or one player merged into another.  Rows
+are never updated or deleted, so the journal is the audit trail that the
+ledger tables (which are edited in place, and lose a player's rows on
+clear) are not.
+
+Every JOURNAL_SNAPSHOT_EVERY events, a compact snapshot of all player
+balances is written after the commit.  The state at any event, current or
+past, is the latest snapshot at or before it plus the short tail of events
+after it, so a replay never scans the whole journal.  Imports and the first
+boot write a snapshot taken from the ledger tables instead (a rebase).
+
+State per player is [name, game balance, payments, latest game date].
+
+Usage: python journal.py [verify | snapshot]
+"""
+import json
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from sqlite_tuning import serialized_write
+
+SNAPSHOT_LOCK = 7256312  # advisory lock namespace
+
+
+def apply_event(state, kind, player_id, counterparty_id, event_date, amount, data):
+    """Fold one event into ``state`` ({player_id: [name, balance, payments, latest_game]})."""
+    data = data or {}
+    if kind == 'clear':
+        state.pop(player_id, None)
+        return
+    if kind == 'rebase':
+        # Only meaningful with the snapshot written alongside it
+        return
+    player = state.setdefault(player_id, [data.get('name'), 0.0, 0.0, None])
+    if data.get('name'):
+        player[0] = data['name']
+    if kind == 'merge':
+        # The duplicate (counterparty) folds into this player
+        merged = state.pop(counterparty_id, None)
+        if merged:
+            player[1] += merged[1]
+            player[2] += merged[2]
+            if player[3] is None or (merged[3] is not None and merged[3] > player[3]):
+                player[3] = merged[3]
+    elif kind == 'game':
+        player[1] += amount
+        day = event_date.isoformat()
+        if player[3] is None or day > player[3]:
+            player[3] = day
+    elif kind == 'edit':
+        player[1] += amount
+    elif kind == 'undo':
+        # A removed game result; the player's latest game is whatever is left
+        player[1] += amount
+        player[3] = data.get('latest_game')
+    elif kind == 'payment':
+        player[2] += amount
+    elif kind == 'transfer':
+        # The payer's debt goes down by amount, the recipient's credit too
+        player[2] += amount
+        recipient = state.setdefault(counterparty_id, [data.get('counterparty_name'), 0.0, 0.0, None])
+        recipient[2] -= amount
+
+
+class Journal:
+    def __init__(self):
+        self.db = None
+        self.model = None
+        self.events = None
+        self.snapshots = None
+        self.snapshot_every = 500
+        self.postgres = False
+
+    def init_app(self, app, db, event_model, snapshot_model):
+        self.db = db
+        self.model = event_model
+        self.events, self.snapshots = event_model.__table__, snapshot_model.__table__
+        self.snapshot_every = app.config.get('JOURNAL_SNAPSHOT_EVERY', 500)
+        with app.app_context():
+            self.postgres = db.engine.dialect.name == 'postgresql'
+
+        @event.listens_for(db.session, 'after_commit')
+        def _snapshot_when_due(session):
+            if session.info.pop('journal_recorded', False):
+                try:
+                    self.maybe_snapshot()
+                except OperationalError as e:
+                    # Next commit tries again; the tail is just a bit longer
+                    print(f"JOURNAL: snapshot skipped: {str(e).splitlines()[0]}")
+
+        @event.listens_for(db.session, 'after_rollback')
+        def _forget_recorded(session):
+            session.info.pop('journal_recorded', None)
+
+    def _join_transaction(self):
+        session = self.db.session
+        if self.postgres and not session.info.get('journal_recorded'):
+            # Snapshots wait for transactions that are still adding events
+            session.execute(select(func.pg_advisory_xact_lock_shared(SNAPSHOT_LOCK, 0)))
+        session.info['journal_recorded'] = True
+        return session
+
+    def record(self, kind, player_id, event_date, amount=0.0, counterparty_id=None, **data):
+        """Add an event to the current transaction; it commits with the change."""
+        self._join_transaction().add(self.model(
+            kind=kind, player_id=player_id, counterparty_id=counterparty_id,
+            event_date=event_date, amount=amount,
+            data=json.dumps(data, default=str) if data else None,
+            created_at=datetime.utcnow()))
+
+    def record_many(self, events):
+        """
+        Add many events with one batched insert.  Each is a dict of
+        record()'s arguments, with any extra data under 'data'.
+        """
+        if not events:
+            return
+        session = self._join_transaction()
+        # Events added with record() keep their place in the order
+        session.flush()
+        now = datetime.utcnow()
+        session.execute(insert(self.events), [{
+            'kind': e['kind'], 'player_id': e['player_id'], 'counterparty_id': e.get('counterparty_id'),
+            'event_date': e['event_date'], 'amount': e.get('amount', 0.0),
+            'data': json.dumps(e['data'], default=str) if e.get('data') else None, 'created_at': now
+        } for e in events])
+
+    def _latest_snapshot(self, conn, event_id=None):
+        query = select(self.snapshots.c.last_event_id, self.snapshots.c.balances)
+        if event_id is not None:
+            query = query.where(self.snapshots.c.last_event_id <= event_id)
+        row = conn.execute(query.order_by(self.snapshots.c.last_event_id.desc(),
+                                          self.snapshots.c.id.desc()).limit(1)).first()
+        if row is None:
+            return 0, {}
+        return row.last_event_id, {int(pid): player for pid, player in json.loads(row.balances).items()}
+
+    def _replay(self, conn, event_id=None):
+        start, state = self._latest_snapshot(conn, event_id)
+        query = select(self.events.c.kind, self.events.c.player_id, self.events.c.counterparty_id,
+                       self.events.c.event_date, self.events.c.amount, self.events.c.data,
+                       self.events.c.id).where(self.events.c.id > start)
+        if event_id is not None:
+            query = query.where(self.events.c.id <= event_id)
+        last, replayed = start, 0
+        for kind, player_id, counterparty_id, event_date, amount, data, row_id in conn.execute(
+                query.order_by(self.events.c.id)):
+            apply_event(state, kind, player_id, counterparty_id, event_date, amount or 0.0,
+                        json.loads(data) if data else None)
+            last, replayed = row_id, replayed + 1
+        return {'event_id': last, 'snapshot_event_id': start, 'replayed': replayed, 'players': state}
+
+    def state(self, event_id=None, at=None):
+        """Balances after ``event_id`` (or as of datetime ``at``; default now)."""
+        with self.db.engine.connect() as conn:
+            if at is not None:
+                event_id = conn.execute(select(func.max(self.events.c.id))
+                                        .where(self.events.c.created_at <= at)).scalar() or 0
+            return self._replay(conn, event_id)
+
+    def history(self, after=0, limit=100, player_id=None):
+        query = select(self.events).where(self.events.c.id > after)
+        if player_id is not None:
+            query = query.where((self.events.c.player_id == player_id) |
+                                (self.events.c.counterparty_id == player_id))
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(query.order_by(self.events.c.id).limit(limit)).mappings().all()
+        events = []
+        for row in rows:
+            item = dict(row)
+            item['data'] = json.loads(item['data']) if item['data'] else None
+            item['event_date'] = item['event_date'].isoformat() if item['event_date'] else None
+            item['created_at'] = item['created_at'].isoformat()
+            events.append(item)
+        return events
+
+    def _write_snapshot(self, conn, last_event_id, state, source):
+        conn.execute(insert(self.snapshots).values(
+            last_event_id=last_event_id, source=source, created_at=datetime.utcnow(),
+            balances=json.dumps({str(pid): player for pid, player in state.items()}, separators=(',', ':'))))
+
+    def maybe_snapshot(self, force=False):
+        """Write a snapshot if JOURNAL_SNAPSHOT_EVERY events have built up since the last."""
+        with self.db.engine.connect() as conn:
+            start = conn.execute(select(func.max(self.snapshots.c.last_event_id))).scalar() or 0
+            tail = conn.execute(select(func.count()).select_from(self.events)
+                                .where(self.events.c.id > start)).scalar()
+        if not tail or (tail < self.snapshot_every and not force):
+            return None
+        with serialized_write():
+            with self.db.engine.begin() as conn:
+                if self.postgres:
+                    conn.execute(select(func.pg_advisory_xact_lock(SNAPSHOT_LOCK, 0)))
+                replay = self._replay(conn)
+                if replay['replayed'] == 0:
+                    # Another worker got there first
+                    return None
+                self._write_snapshot(conn, replay['event_id'], replay['players'], 'journal')
+        print(f"JOURNAL: snapshot at event {replay['event_id']} ({replay['replayed']} events replayed)")
+        return replay['event_id']
+
+    def rebase(self, state, reason):
+        """Record a rebase event and a snapshot of ``state`` taken from the ledger tables."""
+        self.record('rebase', None, date.today(), reason=reason)
+        self.db.session.flush()
+        last_event_id = self.db.session.execute(select(func.max(self.events.c.id))).scalar()
+        self._write_snapshot(self.db.session, last_event_id, state, 'tables')
+        self.db.session.commit()
+        return last_event_id
+
+
+journal = Journal()
+
+
+def init_journal(app, db, event_model, snapshot_model):
+    journal.init_app(app, db, event_model, snapshot_model)
+    return journal
+
+
+def diff_states(expected, actual, tolerance=0.005):
+    """Players whose journal state differs from the ledger tables."""
+    problems = []
+    for player_id in sorted(set(expected) | set(actual)):
+        want, got = expected.get(player_id), actual.get(player_id)
+        if want is None or got is None:
+            problems.append(f"player {player_id}: {'missing from' if got is None else 'only in'} the journal")
+        elif abs(want[1] - got[1]) > tolerance or abs(want[2] - got[2]) > tolerance or want[3] != got[3]:
+            problems.append(f"player {player_id} ({want[0]}): tables {want[1:]} journal {got[1:]}")
+    return problems
+
+
+if __name__ == '__main__':
+    # The app's instance, not this module's copy run as __main__
+    from app import app, journal, journal_state_from_tables
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    with app.app_context():
+        if command == 'verify':
+            replay = journal.state()
+            problems = diff_states(journal_state_from_tables(), replay['players'])
+            print(f"Replayed {replay['replayed']} events after the snapshot at event {replay['snapshot_event_id']}")
+            for problem in problems:
+                print(f"  {problem}")
+            print('Journal matches the ledger' if not problems else f'{len(problems)} player(s) differ')
+            sys.exit(1 if problems else 0)
+        elif command == 'snapshot':
+            event_id = journal.maybe_snapshot(force=True)
+            print(f"Snapshot at event {event_id}" if event_id else 'Nothing new since the last snapshot')
+        else:
+            print(__doc__)
+            sys.exit(1)
@@ -0,0 +1,73 @@
+"""
+Time-windowed leaderboards answered from monthly rollups.
+
+Monthly per-player totals are laid out as a player x month matrix and turned
+into running (prefix) sums along the month axis, so the total for any range
+of whole months is one subtraction per player.
+"""
+import numpy as np
+
+
+def month_index(d):
+    """Months since year 0 for a date, used as the rollup month key."""
+    return d.year * 12 + d.month - 1
+
+
+class RollupIndex:
+    def __init__(self, rows):
+        """``rows`` is an iterable of (player_id, month_index, net_profit, games)."""
+        rows = list(rows)
+        if not rows:
+            self.player_ids = np.array([], dtype=np.int64)
+            self.first_month = 0
+            self._net = np.zeros((0, 1))
+            self._games = np.zeros((0, 1), dtype=np.int64)
+            return
+
+        player_ids = np.array([r[0] for r in rows])
+        months = np.array([r[1] for r in rows])
+        self.player_ids, rows_idx = np.unique(player_ids, return_inverse=True)
+        self.first_month = int(months.min())
+        num_months = int(months.max()) - self.first_month + 1
+
+        net = np.zeros((len(self.player_ids), num_months + 1))
+        games = np.zeros((len(self.player_ids), num_months + 1), dtype=np.int64)
+        # Column 0 stays zero so prefix[:, m + 1] - prefix[:, start] works at the edge
+        np.add.at(net, (rows_idx, months - self.first_month + 1), [r[2] for r in rows])
+        np.add.at(games, (rows_idx, months - self.first_month + 1), [r[3] for r in rows])
+        self._net = np.cumsum(net, axis=1)
+        self._games = np.cumsum(games, axis=1)
+
+    def _column(self, month):
+        # Clamp to the matrix, months outside the data contribute nothing
+        return min(max(month - self.first_month + 1, 0), self._net.shape[1] - 1)
+
+    def window(self, start_month=None, end_month=None):
+        """
+        Net profit and games per player for months in [start_month, end_month].
+
+        Returns ``(player_ids, net, games)`` arrays; ``None`` bounds are open.
+        """
+        start = 0 if start_month is None else self._column(start_month - 1)
+        end = self._net.shape[1] - 1 if end_month is None else self._column(end_month)
+        if end < start:
+            end = start
+        net = self._net[:, end] - self._net[:, start]
+        games = self._games[:, end] - self._games[:, start]
+        return self.player_ids, net, games
+
+
+def rank(player_ids, net, games, limit=None):
+    """Sort players by net profit (best first), dropping those with no games."""
+    player_ids = np.asarray(player_ids)
+    net = np.asarray(net, dtype=np.float64)
+    games = np.asarray(games)
+    played = games > 0
+    player_ids, net, games = player_ids[played], net[played], games[played]
+    order = np.argsort(-net, kind='stable')
+    if limit:
+        order = order[:limit]
+    return [
+        {'player_id': int(player_ids[i]), 'net_profit': float(net[i]), 'games': int(games[i])}
+        for i in order
+    ]
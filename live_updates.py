@@ -0,0 +1,179 @@
+"""
+Live ledger updates over server-sent events.
+
+Routes that change the ledger call publish() after they commit.  The
+notification is one JSON line appended to a spool file shared by every
+gunicorn worker on the host (next to the SQLite database, or in the temp
+directory).  Each worker tails the file and hands new lines to its /live
+streams, which the ledger and game pages listen on and use to re-fetch just
+the rows that changed.
+
+Every event carries the data version it was published at, used as the SSE
+event id, so a reconnecting browser is sent what it missed.  An open stream
+occupies a request thread, so a worker holds at most LIVE_MAX_STREAMS of
+them (by default one less than its threads) for up to LIVE_STREAM_MAX_S.
+Past that, e.g. on the default single-threaded sync worker, /live answers
+straight away with anything new and tells the browser to reconnect after
+LIVE_RETRY_MS, which is still far cheaper than reloading the page.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import Response, request
+
+
+class LiveUpdates:
+    def __init__(self, history=256):
+        self.path = None
+        self.max_bytes = 256 * 1024
+        self.poll_interval = 0.5
+        self.events = deque(maxlen=history)
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._watcher = None
+        self._streams = None
+        self.closing = False
+
+    def publish(self, kind, version, player_ids=(), game_date=None):
+        event = {'version': version, 'kind': kind, 'player_ids': sorted(set(player_ids)),
+                 'game_date': game_date.isoformat() if game_date else None}
+        line = (json.dumps(event, separators=(',', ':')) + '\n').encode()
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                # Start over; readers notice the new file
+                os.replace(self.path, self.path + '.old')
+        except FileNotFoundError:
+            pass
+        # One write() of a short line with O_APPEND doesn't interleave with
+        # other workers' appends
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def poll(self):
+        """Read notifications other workers appended since the last poll."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._inode, self._offset = stat.st_ino, 0
+            if stat.st_size == self._offset:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(stat.st_size - self._offset)
+            # Leave a partly written last line for the next poll
+            complete = data.rfind(b'\n') + 1
+            self._offset += complete
+            for line in data[:complete].splitlines():
+                try:
+                    self.events.append(json.loads(line))
+                except ValueError:
+                    continue
+            self._changed.notify_all()
+
+    def since(self, version):
+        with self._lock:
+            return [event for event in self.events if event['version'] > version]
+
+    def _watch(self):
+        while True:
+            self.poll()
+            time.sleep(self.poll_interval)
+
+    def _start_watcher(self):
+        # Started on first use, i.e. after gunicorn has forked the worker
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='live-updates', daemon=True)
+                self._watcher.start()
+
+    def wait(self, version, timeout):
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.closing or any(e['version'] > version for e in self.events), timeout)
+
+    def close(self):
+        # End open streams (the browsers reconnect elsewhere) so they don't
+        # hold up a worker's graceful shutdown
+        with self._changed:
+            self.closing = True
+            self._changed.notify_all()
+
+
+live_updates = LiveUpdates()
+
+
+def _format(event):
+    return f"id: {event['version']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+
+
+def _default_path(engine):
+    if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        return f'{os.path.abspath(engine.url.database)}.live'
+    digest = hashlib.sha1(str(engine.url).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'poker-ledger-live-{digest}.jsonl')
+
+
+def init_live_updates(app, db):
+    config = app.config
+    with app.app_context():
+        live_updates.path = config.get('LIVE_UPDATES_PATH') or _default_path(db.engine)
+    live_updates.poll_interval = config.get('LIVE_POLL_INTERVAL_MS', 500) / 1000
+    max_streams = config.get('LIVE_MAX_STREAMS')
+    if max_streams is None:
+        max_streams = max(0, config.get('DB_THREADS', 1) - 1)
+    live_updates._streams = threading.BoundedSemaphore(max_streams) if max_streams > 0 else None
+    stream_seconds = config.get('LIVE_STREAM_MAX_S', 300)
+    retry_ms = config.get('LIVE_RETRY_MS', 5000)
+
+    @app.route('/live')
+    def live():
+        # Browsers resend the last event id when they reconnect
+        last_seen = request.headers.get('Last-Event-ID') or request.args.get('since') or 0
+        try:
+            last_seen = int(last_seen)
+        except ValueError:
+            last_seen = 0
+        streams = live_updates._streams
+        if streams is None or not streams.acquire(blocking=False):
+            # No thread to spare: send what's new and have the browser come back
+            live_updates.poll()
+            body = f'retry: {retry_ms}\n\n' + ''.join(_format(e) for e in live_updates.since(last_seen))
+            return Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+        live_updates._start_watcher()
+
+        def stream():
+            seen = last_seen
+            deadline = time.monotonic() + stream_seconds
+            yield f'retry: 1000\n: connected {datetime.utcnow().isoformat()}\n\n'
+            while time.monotonic() < deadline and not live_updates.closing:
+                live_updates.wait(seen, timeout=min(15, max(0, deadline - time.monotonic())))
+                events = live_updates.since(seen)
+                for event in events:
+                    seen = max(seen, event['version'])
+                    yield _format(event)
+                if not events:
+                    # Also how a closed connection is noticed
+                    yield ': keep-alive\n\n'
+
+        response = Response(stream(), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        # Runs when the server closes the response, even if the browser left early
+        response.call_on_close(streams.release)
+        return response
+
+    return live_updates
@@ -0,0 +1,226 @@
+"""
+Numbered schema migrations.
+
+Each migration is a file in migrations/ named NNNN_description.py that
+defines ``upgrade(op)``.  Applied versions are recorded in the
+schema_migrations table, and run_migrations() applies the missing ones in
+order, each in its own transaction together with its version row.
+Migrations only go forward, and their operations are written to be safe to
+repeat, so a fresh database simply runs them all.  Each migration pins the
+tables and columns it creates in its own file rather than reading the
+models in app.py, so it does the same thing whenever it runs.
+
+On PostgreSQL, migrations that set ``transactional = False`` build their
+indexes CONCURRENTLY so the app keeps writing while they build.  On SQLite,
+changes that ALTER TABLE can't make go through ``op.rebuild_table()``, which
+copies the table in one transaction.
+
+Usage: python migrate.py [status | upgrade [target]]
+"""
+import importlib.util
+import os
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+_MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+_version_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f'migration_{self.version:04d}', self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+        return self._module
+
+    @property
+    def transactional(self):
+        return getattr(self.module, 'transactional', True)
+
+    def __repr__(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f'Duplicate migration numbers in {directory}')
+    return migrations
+
+
+def head_version(migrations=None):
+    migrations = discover() if migrations is None else migrations
+    return max((m.version for m in migrations), default=0)
+
+
+class Operations:
+    """Schema operations available to a migration's upgrade(op)."""
+
+    def __init__(self, engine, connection, autocommit=False):
+        self.engine = engine
+        self.connection = connection
+        self.dialect = engine.dialect.name
+        self.autocommit = autocommit
+
+    def execute(self, sql, params=None):
+        return self.connection.execute(text(sql), params or {})
+
+    def has_table(self, table_name):
+        return inspect(self.connection).has_table(table_name)
+
+    def has_column(self, table_name, column_name):
+        return column_name in {c['name'] for c in inspect(self.connection).get_columns(table_name)}
+
+    def create_table(self, table):
+        # A Table pinned in the migration; skipped if it exists
+        table.create(self.connection, checkfirst=True)
+
+    def add_column(self, table_name, column, server_default=None):
+        # A Column pinned in the migration; skipped if it exists
+        if self.has_column(table_name, column.name):
+            return
+        ddl = f'ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(dialect=self.engine.dialect)}'
+        if server_default is not None:
+            ddl += f' DEFAULT {server_default}'
+        self.execute(ddl)
+
+    def create_index(self, name, table_name, columns, unique=False):
+        unique_sql = 'UNIQUE ' if unique else ''
+        columns_sql = ', '.join(columns)
+        if self.dialect == 'postgresql' and self.autocommit:
+            # A failed concurrent build leaves an INVALID index behind that
+            # IF NOT EXISTS would skip, so drop it and build again
+            valid = self.execute(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name", {'name': name}
+            ).scalar()
+            if valid is False:
+                self.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+            self.execute(f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table_name} ({columns_sql})')
+        else:
+            self.execute(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table_name} ({columns_sql})')
+
+    def drop_index(self, name):
+        if self.dialect == 'postgresql' and self.autocommit:
+            self.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        else:
+            self.execute(f'DROP INDEX IF EXISTS {name}')
+
+    def rebuild_table(self, table):
+        """
+        Recreate a SQLite table from a Table pinned in the migration and
+        copy the rows across, for changes ALTER TABLE can't make there (new
+        constraints, changed or dropped columns).  Follows SQLite's
+        documented copy/drop/rename procedure inside the migration's
+        transaction; indexes are recreated afterwards.  PostgreSQL
+        migrations should ALTER the table instead.
+        """
+        if self.dialect != 'sqlite':
+            raise RuntimeError('rebuild_table() is for SQLite; use ALTER TABLE on other databases')
+        table_name = table.name
+        inspector = inspect(self.connection)
+        old_columns = {c['name'] for c in inspector.get_columns(table_name)}
+        old_indexes = [i for i in inspector.get_indexes(table_name) if i['name']]
+        shared = ', '.join(c.name for c in table.columns if c.name in old_columns)
+
+        temp_name = f'_rebuild_{table_name}'
+        # The copy needs the tables its foreign keys point at to compile, so
+        # the migration declares them (their ids at least) alongside it
+        scratch = MetaData()
+        for fk in table.foreign_keys:
+            if fk.column.table is not table:
+                fk.column.table.to_metadata(scratch)
+        temp = table.to_metadata(scratch, name=temp_name)
+        temp.indexes.clear()
+        temp.create(self.connection)
+        self.execute(f'INSERT INTO {temp_name} ({shared}) SELECT {shared} FROM {table_name}')
+        self.execute(f'DROP TABLE {table_name}')
+        self.execute(f'ALTER TABLE {temp_name} RENAME TO {table_name}')
+
+        for index in table.indexes:
+            index.create(self.connection, checkfirst=True)
+        new_columns = {c.name for c in table.columns}
+        for index in old_indexes:
+            if set(index['column_names']) <= new_columns:
+                self.create_index(index['name'], table_name, index['column_names'], unique=bool(index['unique']))
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def run_migrations(db, target=None):
+    """Apply pending migrations up to ``target`` (default: all). Returns the ones applied."""
+    engine = db.engine
+    migrations = discover()
+    applied = applied_versions(engine)
+    pending = [m for m in migrations
+               if m.version not in applied and (target is None or m.version <= target)]
+
+    for migration in pending:
+        print(f"Applying migration {migration}...")
+        if migration.transactional:
+            with engine.begin() as conn:
+                migration.module.upgrade(Operations(engine, conn))
+                _record(conn, migration)
+        else:
+            # CREATE INDEX CONCURRENTLY refuses to run inside a transaction
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                migration.module.upgrade(Operations(engine, conn, autocommit=True))
+            with engine.begin() as conn:
+                _record(conn, migration)
+    return pending
+
+
+def _record(conn, migration):
+    conn.execute(schema_migrations.insert().values(
+        version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+    ))
+
+
+def status(db):
+    applied = applied_versions(db.engine)
+    for migration in discover():
+        print(f"[{'x' if migration.version in applied else ' '}] {migration}")
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    with app.app_context():
+        if command == 'status':
+            status(db)
+        elif command == 'upgrade':
+            target = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            applied = run_migrations(db, target)
+            print(f"Applied {len(applied)} migration(s)")
+        else:
+            print(__doc__)
+            sys.exit(1)
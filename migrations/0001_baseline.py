@@ -0,0 +1,85 @@
+"""Tables that existed before migrations, as db.create_all() used to make them."""
+from sqlalchemy import (Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table,
+                        UniqueConstraint)
+
+metadata = MetaData()
+
+player = Table(
+    'player', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(100), unique=True, nullable=False),
+    Column('preferred_payment_method', String(50), nullable=True),
+    Column('payment_id', String(100), nullable=True),
+    Column('created_at', DateTime),
+)
+
+ledger_entry = Table(
+    'ledger_entry', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('player_id', Integer, ForeignKey('player.id'), nullable=False),
+    Column('game_date', Date, nullable=False),
+    Column('net_profit', Float),
+    Column('running_balance', Float),
+    Column('created_at', DateTime),
+    UniqueConstraint('player_id', 'game_date', name='_player_game_uc'),
+)
+
+payment = Table(
+    'payment', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('player_id', Integer, ForeignKey('player.id'), nullable=False),
+    Column('amount', Float, nullable=False),
+    Column('payment_date', Date, nullable=False),
+    Column('payment_method', String(50), nullable=True),
+    Column('created_at', DateTime),
+)
+
+player_alias = Table(
+    'player_alias', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('player_id', Integer, ForeignKey('player.id'), nullable=False, index=True),
+    Column('alias', String(100), nullable=False),
+    Column('created_at', DateTime),
+    UniqueConstraint('player_id', 'alias', name='_player_alias_uc'),
+)
+
+ledger_history = Table(
+    'ledger_history', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('player_name', String(100), nullable=False),
+    Column('final_balance', Float, nullable=False),
+    Column('cleared_date', Date, nullable=False),
+    Column('created_at', DateTime),
+)
+
+monthly_rollup = Table(
+    'monthly_rollup', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('player_id', Integer, ForeignKey('player.id'), nullable=False),
+    Column('month', Integer, nullable=False),
+    Column('net_profit', Float, nullable=False),
+    Column('games', Integer, nullable=False),
+    UniqueConstraint('player_id', 'month', name='_player_month_uc'),
+)
+
+data_version = Table(
+    'data_version', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('version', Integer, nullable=False),
+)
+
+schema_state = Table(
+    'schema_state', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('schema_version', String(64), nullable=False),
+    Column('deploy_id', String(100), nullable=True),
+    Column('bootstrapped_at', DateTime),
+)
+
+
+def upgrade(op):
+    for table in metadata.sorted_tables:
+        op.create_table(table)
+    # The single row every write bumps
+    op.execute('INSERT INTO data_version (id, version) SELECT 1, 0 '
+               'WHERE NOT EXISTS (SELECT 1 FROM data_version WHERE id = 1)')
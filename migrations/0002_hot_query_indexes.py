@@ -0,0 +1,15 @@
+"""Indexes for the hot ledger and payment queries in app.py."""
+
+# Build the indexes CONCURRENTLY on PostgreSQL
+transactional = False
+
+
+def upgrade(op):
+    # Latest entry / running balance per player.  The (player_id, game_date)
+    # unique constraint already has an index; carrying running_balance lets
+    # the balance lookups and the get_player_balances() join skip the table.
+    op.create_index('ix_ledger_entry_player_date', 'ledger_entry', ['player_id', 'game_date', 'running_balance'])
+    # Game-date lookups: duplicate-upload check, game detail, game list
+    op.create_index('ix_ledger_entry_game_date', 'ledger_entry', ['game_date'])
+    # Per-player payment totals and payment history ordered by date
+    op.create_index('ix_payment_player_date', 'payment', ['player_id', 'payment_date'])
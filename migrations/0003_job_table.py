@@ -0,0 +1,24 @@
+"""Job table behind the background upload, export and import jobs (jobs.py)."""
+from sqlalchemy import Column, DateTime, Float, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+job = Table(
+    'job', metadata,
+    Column('id', String(32), primary_key=True),
+    Column('kind', String(50), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('progress', Float, nullable=False),
+    Column('message', String(200), nullable=True),
+    Column('result', Text, nullable=True),
+    Column('error', Text, nullable=True),
+    Column('owner', String(100), nullable=True),
+    Column('created_at', DateTime),
+    Column('started_at', DateTime, nullable=True),
+    Column('updated_at', DateTime),
+    Column('finished_at', DateTime, nullable=True),
+)
+
+
+def upgrade(op):
+    op.create_table(job)
@@ -0,0 +1,6 @@
+"""Player.row_version, the data version that keys each cached ledger row."""
+from sqlalchemy import Column, Integer
+
+
+def upgrade(op):
+    op.add_column('player', Column('row_version', Integer, nullable=False), server_default='0')
@@ -0,0 +1,30 @@
+"""Event journal and balance snapshot tables (journal.py)."""
+from sqlalchemy import Column, Date, DateTime, Float, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+journal_event = Table(
+    'journal_event', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('kind', String(20), nullable=False),
+    Column('player_id', Integer, nullable=True, index=True),
+    Column('counterparty_id', Integer, nullable=True),
+    Column('event_date', Date, nullable=True),
+    Column('amount', Float, nullable=False),
+    Column('data', Text, nullable=True),
+    Column('created_at', DateTime, nullable=False, index=True),
+)
+
+journal_snapshot = Table(
+    'journal_snapshot', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('last_event_id', Integer, nullable=False, index=True),
+    Column('balances', Text, nullable=False),
+    Column('source', String(20), nullable=False),
+    Column('created_at', DateTime),
+)
+
+
+def upgrade(op):
+    op.create_table(journal_event)
+    op.create_table(journal_snapshot)
@@ -0,0 +1,25 @@
+"""Compressed archive of cleared players' games and payments (archive.py)."""
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, LargeBinary, MetaData, Table
+
+metadata = MetaData()
+
+# Only referenced here; 0001 created it
+Table('ledger_history', metadata, Column('id', Integer, primary_key=True))
+
+archived_ledger = Table(
+    'archived_ledger', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('history_id', Integer, ForeignKey('ledger_history.id'), nullable=False, unique=True),
+    Column('player_id', Integer, nullable=False),
+    Column('game_count', Integer, nullable=False),
+    Column('payment_count', Integer, nullable=False),
+    Column('first_game', Date, nullable=True),
+    Column('last_game', Date, nullable=True),
+    Column('ledger_entries', LargeBinary, nullable=False),
+    Column('payments', LargeBinary, nullable=False),
+    Column('archived_at', DateTime),
+)
+
+
+def upgrade(op):
+    op.create_table(archived_ledger)
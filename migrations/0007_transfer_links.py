@@ -0,0 +1,73 @@
+"""Transfer table linking the two Payment legs of a player-to-player payment."""
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table
+
+metadata = MetaData()
+
+# Only referenced here; 0001 created it
+Table('player', metadata, Column('id', Integer, primary_key=True))
+
+transfer = Table(
+    'transfer', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('payer_id', Integer, ForeignKey('player.id'), nullable=True),
+    Column('recipient_id', Integer, ForeignKey('player.id'), nullable=True),
+    Column('amount', Float, nullable=False),
+    Column('transfer_date', Date, nullable=False),
+    Column('payment_method', String(50), nullable=True),
+    Column('created_at', DateTime),
+    Index('ix_transfer_payer_recipient', 'payer_id', 'recipient_id', 'amount'),
+    Index('ix_transfer_recipient_payer', 'recipient_id', 'payer_id', 'amount'),
+)
+
+
+def upgrade(op):
+    op.create_table(transfer)
+    op.add_column('payment', Column('transfer_id', Integer, nullable=True))
+    if op.dialect == 'postgresql':
+        op.execute('ALTER TABLE payment DROP CONSTRAINT IF EXISTS payment_transfer_id_fkey')
+        op.execute('ALTER TABLE payment ADD CONSTRAINT payment_transfer_id_fkey '
+                   'FOREIGN KEY (transfer_id) REFERENCES transfer (id)')
+    op.create_index('ix_payment_transfer_id', 'payment', ['transfer_id'])
+
+    # Link transfers recorded before this migration.  Both legs were added
+    # in the same request: same date, method and amount with opposite signs,
+    # created within a couple of seconds of each other.
+    legs = op.execute(
+        'SELECT id, player_id, amount, payment_date, payment_method, created_at FROM payment '
+        'WHERE transfer_id IS NULL AND amount <> 0 ORDER BY created_at, id'
+    ).all()
+    unmatched = {}
+    pairs = []
+    for leg in legs:
+        key = (leg.payment_date, leg.payment_method, round(abs(leg.amount), 2))
+        waiting = unmatched.setdefault(key, [])
+        match = next((other for other in waiting
+                      if (other.amount > 0) != (leg.amount > 0) and other.player_id != leg.player_id
+                      and _seconds_apart(other.created_at, leg.created_at) <= 2), None)
+        if match is None:
+            waiting.append(leg)
+            continue
+        waiting.remove(match)
+        payer, recipient = (match, leg) if match.amount > 0 else (leg, match)
+        pairs.append((payer, recipient))
+
+    for payer, recipient in pairs:
+        transfer_id = op.execute(
+            'INSERT INTO transfer (payer_id, recipient_id, amount, transfer_date, payment_method, created_at) '
+            'VALUES (:payer, :recipient, :amount, :date, :method, :created) RETURNING id',
+            {'payer': payer.player_id, 'recipient': recipient.player_id, 'amount': payer.amount,
+             'date': payer.payment_date, 'method': payer.payment_method, 'created': payer.created_at}
+        ).scalar()
+        op.execute('UPDATE payment SET transfer_id = :transfer WHERE id IN (:payer, :recipient)',
+                   {'transfer': transfer_id, 'payer': payer.id, 'recipient': recipient.id})
+    if pairs:
+        print(f"Linked {len(pairs)} existing transfers")
+
+
+def _seconds_apart(a, b):
+    if a is None or b is None:
+        return 0
+    if isinstance(a, str):
+        from datetime import datetime
+        a, b = datetime.fromisoformat(a), datetime.fromisoformat(b)
+    return abs((a - b).total_seconds())
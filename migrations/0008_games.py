@@ -0,0 +1,80 @@
+"""Game table: one row per uploaded game, referenced by its ledger entries."""
+from sqlalchemy import (Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, Table,
+                        UniqueConstraint)
+
+# Ledger rows backfilled per UPDATE statement
+BATCH_SIZE = 5000
+
+metadata = MetaData()
+
+# Only referenced here; 0001 created it
+Table('player', metadata, Column('id', Integer, primary_key=True))
+
+game = Table(
+    'game', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('game_date', Date, nullable=False),
+    Column('sequence', Integer, nullable=False),
+    Column('session_start_at', DateTime, nullable=True),
+    Column('session_end_at', DateTime, nullable=True),
+    Column('player_count', Integer, nullable=False),
+    Column('total_buy_in', Float, nullable=True),
+    Column('total_buy_out', Float, nullable=True),
+    Column('total_net', Float, nullable=False),
+    Column('created_at', DateTime),
+    UniqueConstraint('game_date', 'sequence', name='_game_date_sequence_uc'),
+)
+
+# ledger_entry as this migration leaves it, for the SQLite rebuild
+ledger_entry = Table(
+    'ledger_entry', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('player_id', Integer, ForeignKey('player.id'), nullable=False),
+    Column('game_id', Integer, ForeignKey('game.id'), nullable=True),
+    Column('game_date', Date, nullable=False),
+    Column('net_profit', Float),
+    Column('running_balance', Float),
+    Column('buy_in', Float, nullable=True),
+    Column('buy_out', Float, nullable=True),
+    Column('stack', Float, nullable=True),
+    Column('created_at', DateTime),
+    UniqueConstraint('player_id', 'game_id', name='_player_game_uc'),
+    Index('ix_ledger_entry_game_id', 'game_id'),
+)
+
+
+def upgrade(op):
+    op.create_table(game)
+    for column in ('game_id', 'buy_in', 'buy_out', 'stack'):
+        op.add_column('ledger_entry', ledger_entry.c[column])
+
+    # Until now a date held one game: one game per date, its totals summed
+    # from the entries.  Session times and buy-ins weren't kept, so stay NULL.
+    op.execute(
+        'INSERT INTO game (game_date, sequence, player_count, total_net, created_at) '
+        'SELECT game_date, 1, COUNT(*), COALESCE(SUM(net_profit), 0), MIN(created_at) FROM ledger_entry '
+        'WHERE game_id IS NULL AND NOT EXISTS (SELECT 1 FROM game WHERE game.game_date = ledger_entry.game_date) '
+        'GROUP BY game_date'
+    )
+    low, high = op.execute('SELECT MIN(id), MAX(id) FROM ledger_entry WHERE game_id IS NULL').one()
+    batches = 0
+    if low is not None:
+        for start in range(low, high + 1, BATCH_SIZE):
+            op.execute(
+                'UPDATE ledger_entry SET game_id = (SELECT game.id FROM game WHERE game.game_date = ledger_entry.game_date '
+                'AND game.sequence = 1) WHERE game_id IS NULL AND id >= :start AND id < :end',
+                {'start': start, 'end': start + BATCH_SIZE}
+            )
+            batches += 1
+        print(f"Linked ledger entries to games in {batches} batch(es)")
+
+    # One entry per player per game, rather than per player per date
+    if op.dialect == 'postgresql':
+        op.execute('ALTER TABLE ledger_entry DROP CONSTRAINT IF EXISTS _player_game_uc')
+        op.execute('ALTER TABLE ledger_entry ADD CONSTRAINT _player_game_uc UNIQUE (player_id, game_id)')
+        op.execute('ALTER TABLE ledger_entry DROP CONSTRAINT IF EXISTS ledger_entry_game_id_fkey')
+        op.execute('ALTER TABLE ledger_entry ADD CONSTRAINT ledger_entry_game_id_fkey '
+                   'FOREIGN KEY (game_id) REFERENCES game (id)')
+    else:
+        op.rebuild_table(ledger_entry)
+    op.create_index('ix_ledger_entry_game_id', 'ledger_entry', ['game_id'])
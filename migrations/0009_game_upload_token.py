@@ -0,0 +1,7 @@
+"""Game.upload_token, the upload review a game was confirmed from."""
+from sqlalchemy import Column, String
+
+
+def upgrade(op):
+    op.add_column('game', Column('upload_token', String(32), nullable=True))
+    op.create_index('ix_game_upload_token', 'game', ['upload_token'], unique=True)
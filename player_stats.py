@@ -0,0 +1,97 @@
+"""
+Per-player game statistics computed for every player at once.
+
+Ledger entries are loaded as flat arrays, sorted by (player, game date) so
+each player's games form one contiguous segment, and every statistic is
+computed with grouped NumPy operations over those segments rather than a
+Python loop per player.
+"""
+import numpy as np
+
+FORM_WINDOW = 10
+
+
+def _segment_starts(groups):
+    """Start offset of each contiguous group in a sorted group-index array."""
+    return np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+
+def _longest_runs(groups, flags, num_groups):
+    """Longest run of consecutive True ``flags`` inside each group."""
+    longest = np.zeros(num_groups, dtype=np.int64)
+    if not flags.any():
+        return longest
+    # A new run starts wherever the flag or the group changes
+    boundary = np.r_[True, (flags[1:] != flags[:-1]) | (groups[1:] != groups[:-1])]
+    run_ids = np.cumsum(boundary) - 1
+    run_lengths = np.bincount(run_ids)
+    run_starts = np.flatnonzero(boundary)
+    is_flag_run = flags[run_starts]
+    np.maximum.at(longest, groups[run_starts][is_flag_run], run_lengths[is_flag_run])
+    return longest
+
+
+def compute_player_stats(player_ids, game_dates, net_profits, window=FORM_WINDOW):
+    """
+    Compute statistics for every player appearing in the input arrays.
+
+    ``player_ids``, ``game_dates`` (anything sortable, e.g. date ordinals) and
+    ``net_profits`` are parallel sequences with one element per ledger entry.
+    Returns a dict keyed by player id.
+    """
+    player_ids = np.asarray(player_ids)
+    game_dates = np.asarray(game_dates)
+    net_profits = np.asarray(net_profits, dtype=np.float64)
+    if len(player_ids) == 0:
+        return {}
+
+    # Chronological order within each player
+    order = np.lexsort((game_dates, player_ids))
+    player_ids = player_ids[order]
+    values = net_profits[order]
+    unique_ids, groups = np.unique(player_ids, return_inverse=True)
+    num_groups = len(unique_ids)
+    starts = _segment_starts(groups)
+    ends = np.r_[starts[1:], len(values)]
+
+    counts = np.bincount(groups, minlength=num_groups)
+    totals = np.bincount(groups, weights=values, minlength=num_groups)
+    means = totals / counts
+    variances = np.bincount(groups, weights=(values - means[groups]) ** 2, minlength=num_groups) / counts
+    wins = np.bincount(groups, weights=(values > 0), minlength=num_groups)
+    best = np.maximum.reduceat(values, starts)
+    worst = np.minimum.reduceat(values, starts)
+
+    # Median: sort values within each group, then pick the middle element(s)
+    by_value = values[np.lexsort((values, groups))]
+    lower_mid = by_value[starts + (counts - 1) // 2]
+    upper_mid = by_value[starts + counts // 2]
+    medians = (lower_mid + upper_mid) / 2.0
+
+    win_streaks = _longest_runs(groups, values > 0, num_groups)
+    loss_streaks = _longest_runs(groups, values < 0, num_groups)
+
+    # Rolling average over the last ``window`` games, restarting at each player
+    cumulative = np.cumsum(values)
+    positions = np.arange(len(values))
+    window_start = np.maximum(positions - window + 1, starts[groups])
+    window_base = np.where(window_start > 0, cumulative[np.maximum(window_start - 1, 0)], 0.0)
+    rolling = (cumulative - window_base) / (positions - window_start + 1)
+
+    stats = {}
+    for g, player_id in enumerate(unique_ids.tolist()):
+        stats[player_id] = {
+            'games_played': int(counts[g]),
+            'total': float(totals[g]),
+            'win_rate': float(wins[g] / counts[g]),
+            'average': float(means[g]),
+            'median': float(medians[g]),
+            'std_dev': float(np.sqrt(variances[g])),
+            'best_night': float(best[g]),
+            'worst_night': float(worst[g]),
+            'longest_win_streak': int(win_streaks[g]),
+            'longest_loss_streak': int(loss_streaks[g]),
+            'recent_form': float(rolling[ends[g] - 1]),
+            'rolling_form': rolling[starts[g]:ends[g]].tolist(),
+        }
+    return stats
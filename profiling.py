@@ -0,0 +1,252 @@
+"""
+Per-request profiling: wall time, SQL query counts and a /metrics endpoint.
+
+SQL statements are counted and timed with SQLAlchemy engine events and
+attributed to the request that issued them; template rendering is timed
+with Flask's render signals.  Requests that cross the query
+threshold, or run the same statement over and over, are reported as likely
+N+1 patterns.  Per-endpoint counters and latency histograms are served in
+Prometheus text format at /metrics.  Metrics are kept per worker process.
+
+Profiling is off unless PROFILING_ENABLED is set.  /metrics is served to
+a logged-in admin, or to a scraper sending PROFILING_METRICS_TOKEN as a
+bearer token; anyone else gets a 404.
+
+With PROFILING_SAMPLER enabled, a background thread samples the request's
+stack while it runs, and requests slower than PROFILING_SLOW_REQUEST_MS have
+their samples written as folded stacks (the input format of flamegraph.pl
+and speedscope).
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import (Response, abort, before_render_template, g, has_request_context, request, session,
+                   template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.n_plus_one = Counter()
+        self.sql_queries = Counter()
+        self.sql_seconds = defaultdict(float)
+        self.render_seconds = defaultdict(float)
+        self.latency = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+        self.queries_per_request = defaultdict(lambda: _Histogram(QUERY_BUCKETS))
+
+    def record(self, endpoint, method, status, seconds, queries, sql_seconds, n_plus_one, render_seconds=0.0):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.sql_queries[endpoint] += queries
+            self.sql_seconds[endpoint] += sql_seconds
+            self.render_seconds[endpoint] += render_seconds
+            self.latency[endpoint].observe(seconds)
+            self.queries_per_request[endpoint].observe(queries)
+            if n_plus_one:
+                self.n_plus_one[endpoint] += 1
+
+    def render(self):
+        lines = []
+
+        def histogram(name, help_text, histograms):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for endpoint, hist in sorted(histograms.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {hist.total}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {hist.count}')
+
+        def counter(name, help_text, values):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, value in sorted(values.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+
+        with self._lock:
+            lines.append('# HELP poker_ledger_requests_total Requests handled, by endpoint, method and status.')
+            lines.append('# TYPE poker_ledger_requests_total counter')
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                lines.append(f'poker_ledger_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {value}')
+            histogram('poker_ledger_request_duration_seconds', 'Request wall time.', self.latency)
+            histogram('poker_ledger_request_sql_queries', 'SQL queries issued per request.', self.queries_per_request)
+            counter('poker_ledger_sql_queries_total', 'SQL queries issued.', self.sql_queries)
+            counter('poker_ledger_sql_seconds_total', 'Time spent executing SQL.', self.sql_seconds)
+            counter('poker_ledger_render_seconds_total', 'Time spent rendering templates.', self.render_seconds)
+            counter('poker_ledger_n_plus_one_total', 'Requests flagged as likely N+1 query patterns.', self.n_plus_one)
+        return '\n'.join(lines) + '\n'
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def init_profiling(app):
+    config = app.config
+    if not config.get('PROFILING_ENABLED', False):
+        return None
+
+    metrics = RequestMetrics()
+    query_threshold = config.get('PROFILING_QUERY_THRESHOLD', 50)
+    repeat_threshold = config.get('PROFILING_REPEAT_THRESHOLD', 20)
+    sampler_enabled = config.get('PROFILING_SAMPLER', False)
+    sample_interval = config.get('PROFILING_SAMPLE_INTERVAL_MS', 5) / 1000.0
+    slow_request = config.get('PROFILING_SLOW_REQUEST_MS', 500) / 1000.0
+    dump_dir = config.get('PROFILING_DUMP_DIR', 'profiles')
+    metrics_token = config.get('PROFILING_METRICS_TOKEN')
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        stats = g.get('sql_stats') if has_request_context() else None
+        if stats is not None:
+            stats['count'] += 1
+            stats['seconds'] += elapsed
+            stats['statements'][statement] += 1
+
+    @event.listens_for(Engine, 'handle_error')
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+    @before_render_template.connect_via(app)
+    def _start_render(sender, template, context, **extra):
+        stats = g.get('render_stats') if has_request_context() else None
+        if stats is not None:
+            # Templates rendered while rendering another count once
+            if stats['depth'] == 0:
+                stats['start'] = time.perf_counter()
+            stats['depth'] += 1
+
+    @template_rendered.connect_via(app)
+    def _finish_render(sender, template, context, **extra):
+        stats = g.get('render_stats') if has_request_context() else None
+        if stats is not None and stats['depth'] > 0:
+            stats['depth'] -= 1
+            stats['count'] += 1
+            if stats['depth'] == 0:
+                stats['seconds'] += time.perf_counter() - stats['start']
+
+    @app.before_request
+    def _start_request_profile():
+        g.request_start = time.perf_counter()
+        g.sql_stats = {'count': 0, 'seconds': 0.0, 'statements': Counter()}
+        g.render_stats = {'count': 0, 'seconds': 0.0, 'depth': 0, 'start': 0.0}
+        if sampler_enabled:
+            g.stack_sampler = _StackSampler(threading.get_ident(), sample_interval)
+            g.stack_sampler.start()
+
+    @app.after_request
+    def _finish_request_profile(response):
+        start = g.pop('request_start', None)
+        stats = g.pop('sql_stats', None)
+        render = g.pop('render_stats', None) or {'count': 0, 'seconds': 0.0}
+        if start is None or stats is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unknown'
+
+        statement, repeats = (stats['statements'].most_common(1) or [(None, 0)])[0]
+        n_plus_one = stats['count'] >= query_threshold or repeats >= repeat_threshold
+        if n_plus_one:
+            print(f"PROFILING: possible N+1 in {endpoint}: {stats['count']} queries, "
+                  f"most repeated ({repeats}x): {' '.join(statement.split())[:200]}")
+
+        metrics.record(endpoint, request.method, response.status_code,
+                       elapsed, stats['count'], stats['seconds'], n_plus_one, render['seconds'])
+        response.headers['Server-Timing'] = (
+            f"app;dur={elapsed * 1000:.1f}, sql;dur={stats['seconds'] * 1000:.1f};desc=\"{stats['count']} queries\", "
+            f"tpl;dur={render['seconds'] * 1000:.1f};desc=\"{render['count']} templates\""
+        )
+
+        sampler = g.pop('stack_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            if elapsed >= slow_request and sampler.samples:
+                _dump_samples(dump_dir, endpoint, elapsed, sampler.samples)
+        return response
+
+    @app.teardown_request
+    def _stop_sampler(exc):
+        sampler = g.pop('stack_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        # Endpoint names and timings are not for the public
+        if not session.get('is_admin') and not _has_token(metrics_token):
+            abort(404)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
+
+
+def _has_token(token):
+    if not token:
+        return False
+    scheme, _, sent = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(sent.strip().encode(), token.encode())
+
+
+def _dump_samples(dump_dir, endpoint, elapsed, samples):
+    os.makedirs(dump_dir, exist_ok=True)
+    filename = f"{endpoint}_{time.strftime('%Y%m%d_%H%M%S')}_{int(elapsed * 1000)}ms.folded"
+    path = os.path.join(dump_dir, filename)
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    print(f"PROFILING: slow request to {endpoint} ({int(elapsed * 1000)} ms), stacks written to {path}")
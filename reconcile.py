@@ -0,0 +1,181 @@
+"""
+Bulk payment import: read a payment statement and match it to players.
+
+Accepts two CSV shapes.  A plain payment list has a ``player`` column (a
+player's name or payment ID), an ``amount`` in dollars signed the way the
+ledger records payments, and optionally a ``recipient`` for player-to-player
+transfers.  A Venmo/Zelle style statement export has ``from`` and ``to``
+columns and amounts signed from the account holder's side: money in (+) is
+a payment by the sender, money out (-) a payout to the recipient.
+
+Matching is a handful of DataFrame merges against a directory of every
+player's payment ID, name and recorded aliases, so a statement of any
+length costs the same few passes.  Rows that match a payment already in the
+ledger (same player, date and amount) are flagged as recorded, which makes
+re-importing an overlapping statement safe.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+COLUMN_ALIASES = {
+    'player': ('player', 'player_name', 'name', 'payee', 'payment_id', 'player_nickname'),
+    'recipient': ('recipient', 'recipient_name', 'transfer_to'),
+    'from': ('from', 'sender'),
+    'to': ('to',),
+    'amount': ('amount', 'amount (total)', 'amount_total', 'total'),
+    'date': ('date', 'payment_date', 'datetime', 'transaction date', 'date posted'),
+    'method': ('method', 'payment_method'),
+    'note': ('note', 'memo', 'description'),
+}
+
+# Earlier sources win when one key names different players
+MATCH_PRIORITY = ('payment_id', 'name', 'alias')
+
+STATUSES = ('ready', 'unmatched', 'recorded', 'invalid')
+
+
+def match_key(values):
+    """Lowercased, without a leading @ and whitespace ('@Jane Doe ' -> 'janedoe')."""
+    return values.fillna('').astype(str).str.lower().str.replace(r'^@|\s+', '', regex=True)
+
+
+def _parse_amounts(values):
+    # '$1,234.50', '+ $25.00', '- $25.00', '(25.00)'
+    text = values.fillna('').astype(str).str.replace(r'[\s$,+]', '', regex=True)
+    text = text.str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+    return pd.to_numeric(text, errors='coerce')
+
+
+def _rename_columns(df):
+    lookup = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    renamed = {}
+    for original in df.columns:
+        column = lookup.get(re.sub(r'\s+', ' ', str(original).strip().lower()))
+        if column and column not in renamed.values():
+            renamed[original] = column
+    return df[list(renamed)].rename(columns=renamed)
+
+
+def read_statement(source, default_date=None, default_method=None):
+    """
+    Normalize a statement CSV to one row per payment: row, name, recipient,
+    amount, date, method, note, status.  ``source`` is a path or file.
+    """
+    raw = pd.read_csv(source, dtype=str, skip_blank_lines=True)
+    df = _rename_columns(raw)
+    if 'amount' not in df.columns:
+        raise ValueError('CSV must contain an amount column')
+    if 'player' not in df.columns and not {'from', 'to'} <= set(df.columns):
+        raise ValueError('CSV must contain a player column, or from and to columns')
+    if 'date' not in df.columns and default_date is None:
+        raise ValueError('CSV has no date column; choose a payment date')
+
+    rows = pd.DataFrame({'row': range(1, len(df) + 1)})
+    amount = _parse_amounts(df['amount']).to_numpy()
+    if 'player' in df.columns:
+        rows['name'] = df['player'].to_numpy()
+        rows['recipient'] = df['recipient'].to_numpy() if 'recipient' in df.columns else None
+        rows['amount'] = amount
+    else:
+        # Statement export: the player is whoever isn't the account holder
+        incoming = amount >= 0
+        rows['name'] = df['from'].where(incoming, df['to']).to_numpy()
+        rows['recipient'] = None
+        rows['amount'] = amount
+    rows['name'] = rows['name'].fillna('').astype(str).str.strip()
+
+    if 'date' in df.columns:
+        # Wall-clock date as written; a trailing UTC offset would shift late payments a day
+        local = df['date'].str.strip().str.replace(r'(Z|[+-]\d\d:?\d\d)$', '', regex=True)
+        rows['date'] = pd.to_datetime(local, errors='coerce', format='mixed').dt.date.to_numpy()
+        if default_date is not None:
+            rows['date'] = rows['date'].fillna(default_date)
+    else:
+        rows['date'] = default_date
+    if 'method' in df.columns:
+        rows['method'] = df['method'].fillna(default_method or '').astype(str).str.strip().to_numpy()
+    else:
+        rows['method'] = default_method or ''
+    rows['note'] = df['note'].fillna('').astype(str).to_numpy() if 'note' in df.columns else ''
+
+    invalid = (~np.isfinite(rows['amount']) | (rows['amount'].round(2) == 0) | rows['date'].isna()
+               | (rows['name'] == ''))
+    rows['status'] = 'ready'
+    rows.loc[invalid, 'status'] = 'invalid'
+    return rows
+
+
+def player_directory(players, aliases=()):
+    """
+    One row per match key: key, player_id, matched_by.  ``players`` holds
+    (id, name, payment_id) and ``aliases`` (player_id, alias).  Keys that
+    name two players at the same priority are dropped as ambiguous.
+    """
+    players = pd.DataFrame(list(players), columns=['player_id', 'name', 'payment_id'])
+    aliases = pd.DataFrame(list(aliases), columns=['player_id', 'alias'])
+    directory = pd.concat([
+        pd.DataFrame({'key': match_key(players['payment_id']), 'player_id': players['player_id'],
+                      'matched_by': 'payment_id'}),
+        pd.DataFrame({'key': match_key(players['name']), 'player_id': players['player_id'],
+                      'matched_by': 'name'}),
+        pd.DataFrame({'key': match_key(aliases['alias']), 'player_id': aliases['player_id'],
+                      'matched_by': 'alias'}),
+    ], ignore_index=True)
+    directory = directory[directory['key'] != ''].drop_duplicates(['key', 'player_id', 'matched_by'])
+    directory['priority'] = directory['matched_by'].map({source: i for i, source in enumerate(MATCH_PRIORITY)})
+    best = directory.groupby('key')['priority'].transform('min')
+    directory = directory[directory['priority'] == best]
+    ambiguous = directory.groupby('key')['player_id'].transform('nunique') > 1
+    return directory[~ambiguous].drop_duplicates('key')[['key', 'player_id', 'matched_by']]
+
+
+def match_statement(rows, directory, existing=()):
+    """
+    Fill in player_id, matched_by and recipient_id for statement ``rows``,
+    and mark the ones already in ``existing`` payments as recorded.
+    """
+    rows = rows.copy()
+    rows['key'] = match_key(rows['name'])
+    rows = rows.merge(directory, on='key', how='left')
+    recipient_keys = pd.DataFrame({'recipient_key': match_key(rows['recipient'])})
+    rows['recipient_id'] = recipient_keys.merge(
+        directory.rename(columns={'key': 'recipient_key', 'player_id': 'recipient_id'}),
+        on='recipient_key', how='left')['recipient_id'].to_numpy()
+    has_recipient = rows['recipient'].fillna('').astype(str).str.strip() != ''
+
+    unmatched = (rows['status'] == 'ready') & (rows['player_id'].isna() | (has_recipient & rows['recipient_id'].isna()))
+    rows.loc[unmatched, 'status'] = 'unmatched'
+
+    rows = mark_recorded(rows, existing)
+    return rows.drop(columns=['key']).sort_values('row').reset_index(drop=True)
+
+
+def mark_recorded(rows, existing):
+    """
+    Set status 'recorded' on ready rows matching an ``existing`` payment
+    (player_id, date, amount).  The n-th identical row pairs with the n-th
+    identical payment, so a statement's genuine repeats still go through.
+    """
+    existing = pd.DataFrame(list(existing), columns=['player_id', 'date', 'amount'])
+    candidates = rows[rows['status'] == 'ready'].copy()
+    if not len(existing) or not len(candidates):
+        return rows
+    keys = ['player_id', 'date', 'cents', 'occurrence']
+    for frame in (existing, candidates):
+        frame['player_id'] = frame['player_id'].astype('int64')
+        frame['cents'] = (frame['amount'] * 100).round().astype('int64')
+        frame['occurrence'] = frame.groupby(keys[:3]).cumcount()
+    recorded = candidates.merge(existing[keys], on=keys)['row']
+    rows = rows.copy()
+    rows.loc[rows['row'].isin(recorded), 'status'] = 'recorded'
+    return rows
+
+
+def summarize(rows):
+    """Row counts and dollar totals per status."""
+    summary = {status: {'rows': 0, 'total': 0.0} for status in STATUSES}
+    for status, group in rows.groupby('status'):
+        summary[status] = {'rows': int(len(group)), 'total': float(group['amount'].fillna(0).sum())}
+    return summary
@@ -0,0 +1,164 @@
+"""
+Settlement planning: who should pay whom to zero out the ledger.
+
+Balances follow the ledger's sign convention for ``remaining_payment``:
+negative means the player owes money, positive means they are owed.  All
+arithmetic is done in integer cents so amounts settle exactly.
+"""
+import heapq
+from collections import defaultdict, namedtuple
+
+Transfer = namedtuple('Transfer', ['payer_id', 'recipient_id', 'amount', 'method'])
+
+# Above this many non-zero balances the exact search is too slow and the
+# heap-based greedy is used instead
+EXACT_LIMIT = 12
+
+
+def to_cents(amount):
+    return int(round(amount * 100))
+
+
+def _greedy(balances):
+    """Settle largest debtor against largest creditor until one side runs out."""
+    transfers = []
+
+    # Pair off exact opposites first, each one saves a transfer
+    creditors_by_amount = defaultdict(list)
+    for player_id, cents in balances.items():
+        if cents > 0:
+            creditors_by_amount[cents].append(player_id)
+    remaining = dict(balances)
+    for player_id, cents in balances.items():
+        if cents < 0 and creditors_by_amount.get(-cents):
+            recipient_id = creditors_by_amount[-cents].pop()
+            transfers.append((player_id, recipient_id, -cents))
+            remaining[player_id] = 0
+            remaining[recipient_id] = 0
+
+    debtors = [(cents, player_id) for player_id, cents in remaining.items() if cents < 0]
+    creditors = [(-cents, player_id) for player_id, cents in remaining.items() if cents > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+
+    while debtors and creditors:
+        owed, payer_id = heapq.heappop(debtors)
+        due, recipient_id = heapq.heappop(creditors)
+        amount = min(-owed, -due)
+        transfers.append((payer_id, recipient_id, amount))
+        if owed + amount < 0:
+            heapq.heappush(debtors, (owed + amount, payer_id))
+        if due + amount < 0:
+            heapq.heappush(creditors, (due + amount, recipient_id))
+
+    return transfers
+
+
+def _exact(balances):
+    """
+    Minimum number of transfers for a small group.
+
+    n balances that sum to zero need n - k transfers, where k is the largest
+    number of disjoint zero-sum subgroups they can be split into.  dp[mask] is
+    that k for the players in ``mask``; each subgroup is then settled greedily.
+    """
+    ids = list(balances)
+    amounts = [balances[i] for i in ids]
+    n = len(ids)
+    full = (1 << n) - 1
+
+    sums = [0] * (1 << n)
+    for mask in range(1, 1 << n):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + amounts[low.bit_length() - 1]
+
+    # dp[mask] = most zero-sum groups among mask's players (only meaningful
+    # when sums[mask] == 0), choice[mask] = the last group peeled off
+    dp = [-1] * (1 << n)
+    choice = [0] * (1 << n)
+    dp[0] = 0
+    for mask in range(1, 1 << n):
+        if sums[mask] != 0:
+            continue
+        # Fix the lowest player in the group to avoid enumerating each split twice
+        low = mask & -mask
+        rest = mask ^ low
+        sub = rest
+        while True:
+            group = sub | low
+            if sums[group] == 0 and dp[mask ^ group] >= 0 and dp[mask ^ group] + 1 > dp[mask]:
+                dp[mask] = dp[mask ^ group] + 1
+                choice[mask] = group
+            if sub == 0:
+                break
+            sub = (sub - 1) & rest
+
+    transfers = []
+    mask = full
+    while mask:
+        group = choice[mask]
+        transfers.extend(_greedy({ids[i]: amounts[i] for i in range(n) if group >> i & 1}))
+        mask ^= group
+    return transfers
+
+
+def _settle_cents(balances, exact_limit):
+    balances = {player_id: cents for player_id, cents in balances.items() if cents}
+    total = sum(balances.values())
+    if total == 0 and len(balances) <= exact_limit:
+        return _exact(balances)
+    return _greedy(balances)
+
+
+def plan_settlement(remaining, methods=None, respect_methods=False, exact_limit=EXACT_LIMIT):
+    """
+    Build a near-minimal list of transfers that settles ``remaining``.
+
+    ``remaining`` maps player id to remaining_payment in dollars.  ``methods``
+    maps player id to preferred payment method.  With ``respect_methods``,
+    players who share a method are settled among themselves first and only the
+    leftovers are settled across methods.
+
+    Returns ``(transfers, unsettled)`` where ``unsettled`` is the net dollar
+    amount that cannot be settled between players (e.g. owed to the bank).
+    """
+    methods = methods or {}
+    balances = {player_id: to_cents(amount) for player_id, amount in remaining.items()}
+    balances = {player_id: cents for player_id, cents in balances.items() if cents}
+
+    raw_transfers = []
+    if respect_methods and methods:
+        by_method = defaultdict(dict)
+        for player_id, cents in balances.items():
+            by_method[methods.get(player_id)][player_id] = cents
+        leftovers = {}
+        for method, group in by_method.items():
+            if method is None:
+                leftovers.update(group)
+                continue
+            # Settle only the amount that balances out within the method group
+            # and pass the rest on
+            group_transfers = _greedy(group)
+            raw_transfers.extend(group_transfers)
+            paid = defaultdict(int)
+            for payer_id, recipient_id, amount in group_transfers:
+                paid[payer_id] += amount
+                paid[recipient_id] -= amount
+            for player_id, cents in group.items():
+                left = cents + paid[player_id]
+                if left:
+                    leftovers[player_id] = left
+        balances = leftovers
+
+    raw_transfers.extend(_settle_cents(balances, exact_limit))
+
+    transfers = []
+    for payer_id, recipient_id, cents in raw_transfers:
+        payer_method = methods.get(payer_id)
+        recipient_method = methods.get(recipient_id)
+        # The recipient's preferred method is what matters for receiving money
+        method = recipient_method or payer_method
+        transfers.append(Transfer(payer_id, recipient_id, cents / 100.0, method))
+
+    unsettled = sum(to_cents(amount) for amount in remaining.values()) / 100.0
+    return transfers, unsettled
@@ -0,0 +1,118 @@
+"""
+SQLite production mode: per-connection pragmas and a single writer.
+
+Every connection switches the database to WAL and sets busy_timeout,
+synchronous=NORMAL, mmap_size and cache_size.  In WAL mode readers never
+block the writer or each other, but SQLite still allows only one writer at
+a time, and with several gunicorn workers competing for it uploads fail with
+"database is locked".  So every request that can write (anything but
+GET/HEAD/OPTIONS) first takes an exclusive lock on a file next to the
+database, which lines the writers up one at a time across all workers and
+threads, while reads go straight through.  Code that writes outside a
+request uses the same lane with ``serialized_write()``.
+
+Does nothing unless the database is SQLite and SQLITE_TUNING is on.
+"""
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+from flask import abort, g, has_app_context, request
+from sqlalchemy import event
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = {'lock_path': None, 'timeout': 30.0}
+
+
+class WriteLockTimeout(Exception):
+    pass
+
+
+def _acquire(lock_path, timeout):
+    lock_file = open(lock_path, 'w')
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                lock_file.close()
+                raise WriteLockTimeout(f'timed out after {timeout:.0f} s waiting for the SQLite writer')
+            time.sleep(0.005)
+
+
+def _release(lock_file):
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+
+@contextmanager
+def serialized_write():
+    """Run a block of writes in the single-writer lane (no-op unless enabled)."""
+    if _state['lock_path'] is None or (has_app_context() and g.get('sqlite_write_lock') is not None):
+        yield
+        return
+    lock_file = _acquire(_state['lock_path'], _state['timeout'])
+    if has_app_context():
+        # Nested serialized_write() blocks in this context reuse the lock
+        g.sqlite_write_lock = lock_file
+    try:
+        yield
+    finally:
+        if has_app_context() and g.get('sqlite_write_lock') is lock_file:
+            g.pop('sqlite_write_lock')
+        _release(lock_file)
+
+
+def init_sqlite_tuning(app, db):
+    config = app.config
+    if not config.get('SQLITE_TUNING', True):
+        return False
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    database = engine.url.database
+    if not database or database == ':memory:':
+        return False
+
+    busy_timeout = config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    mmap_size = config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    cache_size_kb = config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)
+    _state['lock_path'] = f'{os.path.abspath(database)}.write.lock'
+    _state['timeout'] = config.get('SQLITE_WRITE_LOCK_TIMEOUT_S', 30.0)
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f'PRAGMA cache_size=-{int(cache_size_kb)}')
+        cursor.close()
+
+    @app.before_request
+    def _take_write_lock():
+        if request.method in READ_METHODS:
+            return None
+        try:
+            g.sqlite_write_lock = _acquire(_state['lock_path'], _state['timeout'])
+        except WriteLockTimeout as e:
+            print(f"SQLITE: {e} ({request.method} {request.path})")
+            abort(503)
+        return None
+
+    @app.teardown_appcontext
+    def _release_write_lock(exc):
+        lock_file = g.pop('sqlite_write_lock', None)
+        if lock_file is not None:
+            # End the request's transaction before the next writer starts
+            db.session.remove()
+            _release(lock_file)
+
+    return True
@@ -1,9 +1,21 @@
 import os
-from app import app, db
+import fcntl
+import hashlib
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from app import app, db, ensure_journal, ensure_rollups, SchemaState
+from migrate import head_version, run_migrations
 from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Arbitrary key for the Postgres advisory lock that serializes bootstrap
+BOOTSTRAP_LOCK_KEY = 7256310
 
 def fix_sequences():
     """Fix PostgreSQL sequences to match current data"""
+    if db.engine.dialect.name != 'postgresql':
+        return
     try:
         # Fix player sequence
         result = db.session.execute(text("SELECT MAX(id) FROM player"))
@@ -11,33 +23,100 @@ def fix_sequences():
         if max_player_id:
             db.session.execute(text(f"SELECT setval('player_id_seq', {max_player_id})"))
             print(f"Fixed player sequence to start from {max_player_id + 1}")
-        
+
         # Fix ledger_entry sequence
         result = db.session.execute(text("SELECT MAX(id) FROM ledger_entry"))
         max_ledger_id = result.scalar()
         if max_ledger_id:
             db.session.execute(text(f"SELECT setval('ledger_entry_id_seq', {max_ledger_id})"))
             print(f"Fixed ledger_entry sequence to start from {max_ledger_id + 1}")
-        
+
         # Fix payment sequence
         result = db.session.execute(text("SELECT MAX(id) FROM payment"))
         max_payment_id = result.scalar()
         if max_payment_id:
             db.session.execute(text(f"SELECT setval('payment_id_seq', {max_payment_id})"))
             print(f"Fixed payment sequence to start from {max_payment_id + 1}")
-        
+
         db.session.commit()
         print("All sequences fixed successfully!")
-        
+
     except Exception as e:
         print(f"Error fixing sequences: {e}")
         db.session.rollback()
 
-# Initialize database tables
-with app.app_context():
-    db.create_all()
+def schema_version():
+    """Hash of the model schema and latest migration, so a deploy that changes either bootstraps again"""
+    parts = [f'migrations:{head_version()}']
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f'{c.name}:{c.type}:{c.nullable}' for c in table.columns)
+        parts.extend(sorted(c.name or '' for c in table.constraints))
+        parts.extend(sorted(i.name or '' for i in table.indexes))
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+def bootstrap_needed(version, deploy_id):
+    if app.config['SCHEMA_BOOTSTRAP'] == 'always':
+        return True
+    try:
+        state = db.session.get(SchemaState, 1)
+    except SQLAlchemyError:
+        # No schema_state table yet: first boot against this database
+        db.session.rollback()
+        return True
+    return state is None or (state.schema_version, state.deploy_id) != (version, deploy_id)
+
+@contextmanager
+def bootstrap_lock():
+    # Workers booting at the same time take turns
+    if db.engine.dialect.name == 'sqlite':
+        database = db.engine.url.database
+        if not database or database == ':memory:':
+            yield
+            return
+        with open(f'{database}.bootstrap.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    with db.engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': BOOTSTRAP_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': BOOTSTRAP_LOCK_KEY})
+
+def bootstrap(version, deploy_id):
+    start = time.perf_counter()
+    run_migrations(db)
     # Fix sequences to prevent duplicate key errors
     fix_sequences()
+    # Backfill leaderboard rollups on first deploy
+    ensure_rollups()
+    # Baseline snapshot for the event journal
+    ensure_journal()
+
+    state = db.session.get(SchemaState, 1) or SchemaState(id=1)
+    state.schema_version = version
+    state.deploy_id = deploy_id
+    state.bootstrapped_at = datetime.utcnow()
+    db.session.add(state)
+    db.session.commit()
+    print(f"Schema bootstrap finished in {(time.perf_counter() - start) * 1000:.0f} ms (pid {os.getpid()})")
+
+# Initialize the database once per schema version and deploy rather than on
+# every worker boot.  Under `gunicorn --preload` this runs once in the master.
+with app.app_context():
+    version = schema_version()
+    deploy_id = app.config['DEPLOY_ID']
+    if bootstrap_needed(version, deploy_id):
+        with bootstrap_lock():
+            # Another worker may have finished it while we waited for the lock
+            if bootstrap_needed(version, deploy_id):
+                bootstrap(version, deploy_id)
+    db.session.remove()
 
 # For Gunicorn
 application = app
@@ -72,10 +72,11 @@ class LedgerHistory(db.Model):
 
 # Import routes from app.py
 from app import *
+from migrate import run_migrations
 
 # Initialize database tables
 with app.app_context():
-    db.create_all()
+    run_migrations(db)
 
 # For Gunicorn
 application = app